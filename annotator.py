@@ -1,48 +1,65 @@
+import asyncio
 import csv
 import sys
-from typing import Dict, List, Optional
+from itertools import islice
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from vcf_parser import parse_header, parse_variants, calculate_read_statistics, determine_variant_type
+from vcf_parser import READ_STAT_INFO_KEYS, parse_header, parse_variants_parallel, read_variants
+from batch_sizing import AdaptiveBatchSizer
+from batch_stats import calculate_read_statistics_batch, determine_variant_types_batch
+from records import AnnotationRecord, VariantRecord
+from journal import Journal
+from local_engine import LocalEngine
+from maf_index import MafIndex
+from metrics import EXPORT_SECONDS, MAF_SECONDS, PARSE_SECONDS, PREVIOUS_ROWS_REUSED, VARIANTS_PARSED, VEP_SECONDS
+from previous_output import PreviousOutput
+from async_vep_client import AsyncEnsemblClient, get_variant_effects_batch_async, enrich_with_population_maf_async
+from vep_cache import VEPCache
 from vep_client import get_variant_effects_batch, enrich_with_population_maf
 
 
-FIELDNAMES = [
-    'depth',  # Depth of sequence coverage
-    'variant_reads',  # Number of reads supporting variant
-    'variant_percentage', 'reference_percentage',  # Percentage of reads
-    'gene_id', 'gene_symbol', 'variant_type', 'consequence_terms',  # Gene, type, effect
-    'maf',  # Minor allele frequency
-    # Additional annotations
-    'chromosome', 'position', 'variant_id', 'reference', 'alternate',
-    'quality', 'reference_reads', 'allele_frequency', 'rsid'
-]
+# TSV columns, in the field order of AnnotationRecord
+FIELDNAMES = list(AnnotationRecord.__slots__)
 
+# Variants held in memory at once when streaming
+DEFAULT_WINDOW = 1000
 
-def annotate_vcf(vcf_file: str, limit: Optional[int] = None) -> List[Dict]:
-    """Annotate variants from a VCF file using Ensembl VEP API."""
-    # Parse header to get samples
-    _, samples = parse_header(vcf_file)
-    
-    # Collect all variants first
-    variants = []
-    for variant in parse_variants(vcf_file, samples):
-        if limit and len(variants) >= limit:
-            break
-        variants.append(variant)
-    
-    if not variants:
-        return []
-    
-    print(f"Processing {len(variants)} variants...", file=sys.stderr)
+
+def iter_variants(
+    vcf_file: str,
+    limit: Optional[int] = None,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    parse_workers: int = 1,
+    use_mmap: bool = False
+) -> Iterator[VariantRecord]:
+    """Yield parsed variants from a VCF file, stopping after `limit` variants.
     
-    variant_tuples = [(v['chrom'], v['pos'], v['ref'], v['alt']) for v in variants]
-    vep_results = get_variant_effects_batch(variant_tuples)
+    A single-process parse reads the header and the records in one pass,
+    memory-mapping an uncompressed file with `use_mmap`.
+    """
+    # Only the INFO keys behind the read statistics are parsed eagerly
+    if parse_workers > 1:
+        _, samples = parse_header(vcf_file)
+        variants = parse_variants_parallel(
+            vcf_file, samples, workers=parse_workers, regions=regions, info_keys=READ_STAT_INFO_KEYS
+        )
+    else:
+        variants = read_variants(vcf_file, regions=regions, info_keys=READ_STAT_INFO_KEYS, use_mmap=use_mmap)
+    if limit:
+        variants = islice(variants, limit)
+    return variants
+
+
+def build_annotations(variants: List[Mapping], vep_results: List[Dict]) -> List[AnnotationRecord]:
+    """Combine parsed variants with their VEP annotations into output rows."""
+    variants = variants[:len(vep_results)]
+    # Read statistics and variant types are computed for the whole chunk at once
+    all_stats = calculate_read_statistics_batch(variants)
+    variant_types = determine_variant_types_batch([v['ref'] for v in variants], [v['alt'] for v in variants])
     
-    # Combine variant data with VEP annotations
     annotations = []
-    for variant, vep_data in zip(variants, vep_results):
-        stats = calculate_read_statistics(variant)
-        variant_type = determine_variant_type(variant['ref'], variant['alt'])
+    for variant, vep_data, stats, variant_type in zip(variants, vep_results, all_stats, variant_types):
         
         # Use VCF ID column as rsID if it starts with 'rs', otherwise use VEP rsID
         vcf_id = variant['id'] if variant['id'] != '.' else None
@@ -51,43 +68,264 @@ def annotate_vcf(vcf_file: str, limit: Optional[int] = None) -> List[Dict]:
         if vcf_id and vcf_id.startswith('rs') and rsid_from_vep == 'N/A':
             final_rsid = vcf_id
         
-        annotation = {
-            'chromosome': variant['chrom'],
-            'position': variant['pos'],
-            'variant_id': variant['id'] if variant['id'] != '.' else f"{variant['chrom']}:{variant['pos']}",
-            'reference': variant['ref'],
-            'alternate': variant['alt'],
-            'quality': variant['qual'],
-            'variant_type': variant_type,
-            **stats,
-            **vep_data,
-            'rsid': final_rsid
-        }
-        # Remove fields we don't want in output
-        annotation.pop('filter', None)
-        annotation.pop('biotype', None)
-        annotation.pop('impact', None)
-        annotation.pop('strand', None)
-        annotations.append(annotation)
+        # Only output columns are kept; VEP extras such as biotype, impact and strand are dropped
+        annotations.append(AnnotationRecord(
+            depth=stats['depth'],
+            variant_reads=stats['variant_reads'],
+            variant_percentage=stats['variant_percentage'],
+            reference_percentage=stats['reference_percentage'],
+            gene_id=vep_data.get('gene_id', ''),
+            gene_symbol=vep_data.get('gene_symbol', ''),
+            variant_type=variant_type,
+            consequence_terms=vep_data.get('consequence_terms', ''),
+            maf=vep_data.get('maf', ''),
+            chromosome=variant['chrom'],
+            position=variant['pos'],
+            variant_id=variant['id'] if variant['id'] != '.' else f"{variant['chrom']}:{variant['pos']}",
+            reference=variant['ref'],
+            alternate=variant['alt'],
+            quality=variant['qual'],
+            reference_reads=stats['reference_reads'],
+            allele_frequency=stats['allele_frequency'],
+            rsid=final_rsid
+        ))
+    
+    return annotations
+
+
+def annotate_variants(
+    variants: List[Mapping],
+    cache: Optional[VEPCache] = None,
+    workers: int = 1,
+    batch_size: int = 200,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    journal: Optional[Journal] = None,
+    engine: Optional[LocalEngine] = None,
+    maf_index: Optional[MafIndex] = None,
+    maf_cache: Optional[VEPCache] = None,
+    previous: Optional[PreviousOutput] = None
+) -> List[AnnotationRecord]:
+    """Annotate parsed variants with VEP effects and population MAF.
+    
+    With a LocalEngine, gene and consequence annotation happens offline
+    instead of through the VEP API; with a MafIndex, so does the MAF lookup.
+    Variation API results are reused from and stored in `maf_cache`.
+    Variants found in a `previous` output reuse its API columns and are
+    not looked up at all.
+    """
+    if not variants:
+        return []
+    
+    if previous is not None:
+        reused, to_fetch = previous.partition(variants)
+        PREVIOUS_ROWS_REUSED.inc(len(reused))
+        print(f"Reusing {len(reused)} rows from {previous.path}; {len(to_fetch)} variants to fetch", file=sys.stderr)
+        fetched = annotate_variants(
+            [variants[i] for i in to_fetch],
+            cache=cache,
+            workers=workers,
+            batch_size=batch_size,
+            batch_sizer=batch_sizer,
+            journal=journal,
+            engine=engine,
+            maf_index=maf_index,
+            maf_cache=maf_cache
+        )
+        annotations = [None] * len(variants)
+        for i, annotation in zip(reused, build_annotations([variants[i] for i in reused], list(reused.values()))):
+            annotations[i] = annotation
+        for i, annotation in zip(to_fetch, fetched):
+            annotations[i] = annotation
+        return annotations
+    
+    print(f"Processing {len(variants)} variants...", file=sys.stderr)
+    
+    variant_tuples = [(v['chrom'], v['pos'], v['ref'], v['alt']) for v in variants]
+    with VEP_SECONDS.time():
+        if engine is not None:
+            vep_results = engine.annotate_batch(variant_tuples)
+        else:
+            vep_results = get_variant_effects_batch(
+                variant_tuples,
+                batch_size=batch_size,
+                cache=cache,
+                workers=workers,
+                batch_sizer=batch_sizer,
+                journal=journal
+            )
+    
+    # Combine variant data with VEP annotations
+    annotations = build_annotations(variants, vep_results)
     
     print(f"Total variants annotated: {len(annotations)}", file=sys.stderr)
     
     # Enrich with MAF from Variation API for variants with rsIDs
-    annotations = enrich_with_population_maf(annotations)
+    with MAF_SECONDS.time():
+        annotations = enrich_with_population_maf(annotations, journal=journal, maf_index=maf_index, cache=maf_cache)
     
     return annotations
 
 
-def export_to_tsv(annotations: List[Dict], output_file: str) -> None:
+def annotate_vcf(
+    vcf_file: str,
+    limit: Optional[int] = None,
+    cache: Optional[VEPCache] = None,
+    workers: int = 1,
+    batch_size: int = 200,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    journal: Optional[Journal] = None,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    parse_workers: int = 1,
+    engine: Optional[LocalEngine] = None,
+    maf_index: Optional[MafIndex] = None,
+    maf_cache: Optional[VEPCache] = None,
+    use_mmap: bool = False,
+    previous: Optional[PreviousOutput] = None
+) -> List[AnnotationRecord]:
+    """Annotate variants from a VCF file using Ensembl VEP API."""
+    with PARSE_SECONDS.time():
+        variants = list(iter_variants(vcf_file, limit, regions, parse_workers, use_mmap))
+    VARIANTS_PARSED.inc(len(variants))
+    return annotate_variants(
+        variants,
+        cache=cache,
+        workers=workers,
+        batch_size=batch_size,
+        batch_sizer=batch_sizer,
+        journal=journal,
+        engine=engine,
+        maf_index=maf_index,
+        maf_cache=maf_cache,
+        previous=previous
+    )
+
+
+async def annotate_vcf_async(
+    vcf_file: str,
+    limit: Optional[int] = None,
+    cache: Optional[VEPCache] = None,
+    client: Optional[AsyncEnsemblClient] = None,
+    regions: Optional[List[Tuple[str, int, int]]] = None
+) -> List[AnnotationRecord]:
+    """Annotate variants from a VCF file without blocking the event loop.
+    
+    Pass a long-lived AsyncEnsemblClient to share its connections and
+    concurrency bound across calls.
+    """
+    with PARSE_SECONDS.time():
+        variants = await asyncio.to_thread(lambda: list(iter_variants(vcf_file, limit, regions)))
+    VARIANTS_PARSED.inc(len(variants))
+    if not variants:
+        return []
+    
+    if client is None:
+        async with AsyncEnsemblClient() as owned_client:
+            return await _annotate_variants_async(variants, cache, owned_client)
+    return await _annotate_variants_async(variants, cache, client)
+
+
+async def _annotate_variants_async(
+    variants: List[VariantRecord],
+    cache: Optional[VEPCache],
+    client: AsyncEnsemblClient
+) -> List[AnnotationRecord]:
+    print(f"Processing {len(variants)} variants...", file=sys.stderr)
+    
+    variant_tuples = [(v['chrom'], v['pos'], v['ref'], v['alt']) for v in variants]
+    with VEP_SECONDS.time():
+        vep_results = await get_variant_effects_batch_async(variant_tuples, cache=cache, client=client)
+    
+    annotations = build_annotations(variants, vep_results)
+    
+    print(f"Total variants annotated: {len(annotations)}", file=sys.stderr)
+    
+    with MAF_SECONDS.time():
+        return await enrich_with_population_maf_async(annotations, client=client)
+
+
+def iter_annotation_windows(
+    vcf_file: str,
+    window: int = DEFAULT_WINDOW,
+    limit: Optional[int] = None,
+    cache: Optional[VEPCache] = None,
+    workers: int = 1,
+    batch_size: int = 200,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    journal: Optional[Journal] = None,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    parse_workers: int = 1,
+    engine: Optional[LocalEngine] = None,
+    maf_index: Optional[MafIndex] = None,
+    maf_cache: Optional[VEPCache] = None,
+    use_mmap: bool = False,
+    previous: Optional[PreviousOutput] = None
+) -> Iterator[List[AnnotationRecord]]:
+    """Stream annotations from a VCF file, holding at most `window` variants at a time."""
+    variants = iter_variants(vcf_file, limit, regions, parse_workers, use_mmap)
+    while True:
+        with PARSE_SECONDS.time():
+            chunk = list(islice(variants, window))
+        if not chunk:
+            return
+        VARIANTS_PARSED.inc(len(chunk))
+        yield annotate_variants(
+            chunk,
+            cache=cache,
+            workers=workers,
+            batch_size=batch_size,
+            batch_sizer=batch_sizer,
+            journal=journal,
+            engine=engine,
+            maf_index=maf_index,
+            maf_cache=maf_cache,
+            previous=previous
+        )
+
+
+def annotation_row(annotation: Mapping) -> Tuple:
+    """TSV column values for an AnnotationRecord or an equivalent dict."""
+    if isinstance(annotation, AnnotationRecord):
+        return annotation.as_tuple()
+    return tuple(annotation.get(field, '') for field in FIELDNAMES)
+
+
+def export_to_tsv(annotations: List[Mapping], output_file: str) -> None:
     """Export annotations to a TSV file."""
     if not annotations:
         print("No annotations to export", file=sys.stderr)
         return
     
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=FIELDNAMES, delimiter='\t')
-        writer.writeheader()
-        writer.writerows(annotations)
+    with EXPORT_SECONDS.time(), open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(FIELDNAMES)
+        writer.writerows(map(annotation_row, annotations))
     
     print(f"Annotations exported to {output_file}", file=sys.stderr)
 
+
+def export_stream_to_tsv(annotation_windows: Iterable[List[Mapping]], output_file: str) -> int:
+    """Append each window of annotations to a TSV file as it arrives, returning the row count."""
+    rows = 0
+    f = None
+    try:
+        for annotations in annotation_windows:
+            if not annotations:
+                continue
+            with EXPORT_SECONDS.time():
+                if f is None:
+                    f = open(output_file, 'w', newline='')
+                    writer = csv.writer(f, delimiter='\t')
+                    writer.writerow(FIELDNAMES)
+                writer.writerows(map(annotation_row, annotations))
+                f.flush()
+            rows += len(annotations)
+    finally:
+        if f is not None:
+            f.close()
+    
+    if not rows:
+        print("No annotations to export", file=sys.stderr)
+        return 0
+    
+    print(f"Annotations exported to {output_file}", file=sys.stderr)
+    return rows
@@ -0,0 +1,497 @@
+import asyncio
+import json
+import ssl
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+import vep_client
+from ensembl_client import (
+    DEFAULT_BACKOFF_BASE,
+    DEFAULT_BACKOFF_MAX,
+    DEFAULT_MAX_RETRIES,
+    RETRY_STATUSES,
+    backoff_delay,
+    rate_limit_pause,
+    retry_delay
+)
+from metrics import (
+    CACHE_HITS,
+    CACHE_MISSES,
+    HTTP_BYTES_RECEIVED,
+    HTTP_BYTES_SENT,
+    HTTP_REQUESTS,
+    HTTP_RETRIES,
+    MAF_REQUESTS,
+    MAF_RSIDS,
+    VEP_BATCH_LATENCY,
+    VEP_BATCHES,
+    VEP_FALLBACK_VARIANTS
+)
+from rate_limiter import RateLimiter
+from vep_cache import VEPCache
+from vep_client import (
+    build_vcf_variant_string,
+    create_error_response,
+    fan_out_results,
+    format_maf,
+    group_variants_by_hgvs,
+    handle_vep_error,
+    is_cacheable_result,
+    is_valid_rsid,
+    map_batch_response,
+    map_region_response
+)
+
+
+DEFAULT_CONCURRENCY = 100
+
+
+class AsyncHTTPError(Exception):
+    """Raised for transport failures and error statuses in the async client."""
+
+
+class AsyncResponse:
+    """Minimal HTTP response returned by AsyncEnsemblClient."""
+
+    def __init__(self, status_code: int, headers: CaseInsensitiveDict, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        """Decode the response body as JSON."""
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        """Raise AsyncHTTPError for 4xx/5xx responses."""
+        if self.status_code >= 400:
+            raise AsyncHTTPError(f"HTTP {self.status_code}")
+
+
+class AsyncEnsemblClient:
+    """asyncio HTTP/1.1 client for the Ensembl REST API built on stdlib streams.
+
+    Keeps idle keep-alive connections per host, bounds in-flight requests with
+    a semaphore, shares the token-bucket rate limiter with the blocking client
+    and retries like EnsemblClient.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        rate_limiter: Optional[RateLimiter] = vep_client.rate_limiter
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.retries = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle: Dict[Tuple[str, str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self._ssl = ssl.create_default_context()
+        self._paused_until = 0.0
+
+    async def __aenter__(self) -> 'AsyncEnsemblClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close all idle pooled connections."""
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
+        """Send a GET request, retrying transient failures."""
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
+        """Send a POST request, retrying transient failures."""
+        return await self.request('POST', url, **kwargs)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        json_body=None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 60
+    ) -> AsyncResponse:
+        """Send a request, retrying on connection errors, timeouts and retryable statuses.
+
+        The last response is returned once retries are exhausted; transport
+        failures on the final attempt raise AsyncHTTPError.
+        """
+        body = json.dumps(json_body).encode() if json_body is not None else b''
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_pause()
+            await self._acquire_rate_limit()
+
+            HTTP_REQUESTS.inc()
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(self._send(method, url, body, headers or {}), timeout)
+            except (OSError, EOFError, asyncio.TimeoutError, AsyncHTTPError) as e:
+                if attempt == self.max_retries:
+                    raise AsyncHTTPError(f"{type(e).__name__} from {method} {url}: {e}") from e
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                reason = type(e).__name__
+            else:
+                HTTP_BYTES_SENT.inc(len(body))
+                HTTP_BYTES_RECEIVED.inc(len(response.content))
+                pause = rate_limit_pause(response.headers)
+                if pause is not None:
+                    self._paused_until = max(self._paused_until, time.monotonic() + min(self.backoff_max, pause))
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = retry_delay(response.headers, attempt, self.backoff_base, self.backoff_max)
+                reason = f"HTTP {response.status_code}"
+
+            self.retries += 1
+            HTTP_RETRIES.inc()
+            print(f"  {reason} from {method} {url}, retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{self.max_retries})...", file=sys.stderr)
+            await asyncio.sleep(delay)
+
+    async def _acquire_rate_limit(self) -> None:
+        if self.rate_limiter is None:
+            return
+        while True:
+            wait = self.rate_limiter.try_acquire()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def _wait_for_pause(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send(self, method: str, url: str, body: bytes, headers: Dict[str, str]) -> AsyncResponse:
+        parts = urlsplit(url)
+        https = parts.scheme == 'https'
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+        request_headers = {
+            'Host': parts.netloc,
+            'Accept': 'application/json',
+            'Accept-Encoding': 'identity',
+            'Connection': 'keep-alive',
+            **headers
+        }
+        if body:
+            request_headers.setdefault('Content-Type', 'application/json')
+            request_headers['Content-Length'] = str(len(body))
+        head = f"{method} {path} HTTP/1.1\r\n" + ''.join(f"{k}: {v}\r\n" for k, v in request_headers.items()) + "\r\n"
+        payload = head.encode('latin-1') + body
+
+        # A pooled connection may have been closed by the server; fall through to a fresh one
+        while True:
+            idle = self._idle.get(key)
+            reused = bool(idle)
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(key[1], key[2], ssl=self._ssl if https else None)
+            try:
+                writer.write(payload)
+                await writer.drain()
+                status, response_headers, content, keep_alive = await self._read_response(reader)
+            except (OSError, EOFError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            break
+
+        if keep_alive:
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+        return AsyncResponse(status, response_headers, content)
+
+    async def _read_response(self, reader: asyncio.StreamReader) -> Tuple[int, CaseInsensitiveDict, bytes, bool]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise EOFError("Connection closed before response")
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise AsyncHTTPError(f"Malformed status line: {status_line!r}")
+        version, status = parts[0], int(parts[1])
+
+        headers = CaseInsensitiveDict()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('Connection', '').lower() != 'close'
+        if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b''.join(chunks)
+        elif 'Content-Length' in headers:
+            content = await reader.readexactly(int(headers['Content-Length']))
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        return status, headers, content, keep_alive
+
+
+async def _process_batch_async(
+    client: AsyncEnsemblClient,
+    batch_idx: int,
+    total_batches: int,
+    batch_indices: List[int],
+    hgvs_list: List[str]
+) -> Tuple[Dict[int, Dict], List[int]]:
+    """Annotate one batch via the VEP batch API without blocking the event loop."""
+    endpoint = f"{vep_client.BASE_URL}/vep/human/hgvs"
+    batch_hgvs = [hgvs_list[i] for i in batch_indices]
+    started = time.monotonic()
+
+    try:
+        print(f"Batch {batch_idx}/{total_batches}: Processing {len(batch_hgvs)} variants...", file=sys.stderr)
+        response = await client.post(endpoint, json_body={"hgvs_notations": batch_hgvs}, timeout=120)
+        response.raise_for_status()
+        results, failed_variants = map_batch_response(batch_indices, batch_hgvs, response.json())
+        print(f"Batch {batch_idx}/{total_batches} completed", file=sys.stderr)
+
+    except (AsyncHTTPError, ValueError) as e:
+        print(f"Error: Batch API request failed: {e}", file=sys.stderr)
+        results = {variant_idx: create_error_response('API_ERROR') for variant_idx in batch_indices}
+        failed_variants = []
+
+    VEP_BATCHES.inc()
+    VEP_BATCH_LATENCY.observe(time.monotonic() - started)
+    return results, failed_variants
+
+
+async def _fetch_region_chunk_async(
+    client: AsyncEnsemblClient,
+    chunk: List[Tuple[int, str, int, str, str]]
+) -> Dict[int, Dict]:
+    """Annotate a chunk of variants via the VEP region POST API, splitting the chunk on failure."""
+    endpoint = f"{vep_client.BASE_URL}/vep/human/region"
+    variant_strings = [build_vcf_variant_string(chrom, pos, ref, alt) for _, chrom, pos, ref, alt in chunk]
+
+    try:
+        response = await client.post(endpoint, json_body={"variants": variant_strings}, timeout=60)
+
+        if len(chunk) == 1 and response.status_code == 400:
+            try:
+                error_msg = response.json().get('error', '')
+            except ValueError:
+                error_msg = ''
+            variant_idx, chrom, pos, ref, alt = chunk[0]
+            return {variant_idx: handle_vep_error(error_msg, variant_strings[0], chrom, pos, ref, alt)}
+
+        response.raise_for_status()
+        return map_region_response(chunk, variant_strings, response.json())
+
+    except (AsyncHTTPError, ValueError) as e:
+        if len(chunk) == 1:
+            return {chunk[0][0]: create_error_response('API_ERROR')}
+
+        mid = len(chunk) // 2
+        print(f"  Region request for {len(chunk)} variants failed ({e}), retrying as two halves...", file=sys.stderr)
+        first, second = await asyncio.gather(
+            _fetch_region_chunk_async(client, chunk[:mid]),
+            _fetch_region_chunk_async(client, chunk[mid:])
+        )
+        return {**first, **second}
+
+
+async def get_variant_effects_region_batch_async(
+    client: AsyncEnsemblClient,
+    variants: List[Tuple[int, str, int, str, str]],
+    batch_size: int = 200
+) -> Dict[int, Dict]:
+    """Async equivalent of vep_client.get_variant_effects_region_batch."""
+    chunks = [variants[i:i + batch_size] for i in range(0, len(variants), batch_size)]
+    results = {}
+    for chunk_results in await asyncio.gather(*(_fetch_region_chunk_async(client, chunk) for chunk in chunks)):
+        results.update(chunk_results)
+    return results
+
+
+async def get_variant_effects_batch_async(
+    variants: List[Tuple[str, int, str, str]],
+    batch_size: int = 200,
+    cache: Optional[VEPCache] = None,
+    client: Optional[AsyncEnsemblClient] = None
+) -> List[Dict]:
+    """Async equivalent of vep_client.get_variant_effects_batch.
+
+    All batches are dispatched at once; the client's semaphore bounds how
+    many requests are actually in flight.
+    """
+    total = len(variants)
+    if total == 0:
+        return []
+
+    if client is None:
+        async with AsyncEnsemblClient() as owned_client:
+            return await get_variant_effects_batch_async(variants, batch_size, cache, owned_client)
+
+    endpoint = f"{vep_client.BASE_URL}/vep/human/hgvs"
+
+    # Collapse identical HGVS keys so each unique variant is queried once
+    hgvs_list, hgvs_to_variant_indices = group_variants_by_hgvs(variants)
+    unique_variants = [variants[indices[0]] for indices in hgvs_to_variant_indices.values()]
+    unique_total = len(hgvs_list)
+    if unique_total < total:
+        print(f"Deduplication: {total} variants -> {unique_total} unique HGVS keys "
+              f"({total - unique_total} lookups saved)", file=sys.stderr)
+    all_results: List[Optional[Dict]] = [None] * unique_total
+
+    # Serve what we can from the caches so only misses reach the network
+    cached = await asyncio.to_thread(cache.get_many, endpoint, hgvs_list) if cache is not None else {}
+    pending = []
+    for idx, hgvs in enumerate(hgvs_list):
+        result = cached.get(hgvs) or vep_client.negative_cache.get(hgvs)
+        if result is not None:
+            all_results[idx] = result
+        else:
+            pending.append(idx)
+    CACHE_HITS.inc(unique_total - len(pending))
+    CACHE_MISSES.inc(len(pending))
+    if cache is not None:
+        print(f"Cache: {unique_total - len(pending)} hits, {len(pending)} misses", file=sys.stderr)
+
+    print(f"Processing {len(pending)} variants (batches of {batch_size}, async)...", file=sys.stderr)
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    batch_outputs = await asyncio.gather(*(
+        _process_batch_async(client, batch_idx, len(batches), batch_indices, hgvs_list)
+        for batch_idx, batch_indices in enumerate(batches, start=1)
+    ))
+
+    failed_variants = []
+    to_cache = {}
+    for batch_results, batch_failed in batch_outputs:
+        failed = set(batch_failed)
+        for variant_idx, result in batch_results.items():
+            all_results[variant_idx] = result
+            if variant_idx not in failed and is_cacheable_result(result):
+                to_cache[hgvs_list[variant_idx]] = result
+        failed_variants.extend(batch_failed)
+
+    # Fall back to the region API in bulk for failed variants (complex variants)
+    if failed_variants:
+        failed_variants.sort()
+        VEP_FALLBACK_VARIANTS.inc(len(failed_variants))
+        print(f"  Falling back to region API for {len(failed_variants)} failed variants...", file=sys.stderr)
+        fallback_results = await get_variant_effects_region_batch_async(
+            client, [(idx, *unique_variants[idx]) for idx in failed_variants]
+        )
+        for variant_idx, result in fallback_results.items():
+            all_results[variant_idx] = result
+            if result.get('gene_id') == 'REF_MISMATCH':
+                vep_client.negative_cache[hgvs_list[variant_idx]] = result
+            if is_cacheable_result(result):
+                to_cache[hgvs_list[variant_idx]] = result
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put_many, endpoint, to_cache)
+
+    print(f"Completed processing {total}/{total} variants", file=sys.stderr)
+    print(f"Fallback path used for {len(failed_variants)}/{len(pending)} variants sent to the batch API", file=sys.stderr)
+    return fan_out_results(all_results, hgvs_to_variant_indices, total)
+
+
+async def _fetch_maf_chunk_async(client: AsyncEnsemblClient, rsids: List[str]) -> Dict[str, Optional[str]]:
+    """Fetch MAF for a chunk of rsIDs, splitting the chunk in half on failure.
+
+    rsIDs whose lookup failed map to None, unlike 'N/A' for an rsID without MAF.
+    """
+    endpoint = f"{vep_client.BASE_URL}/variation/human"
+    MAF_REQUESTS.inc()
+    MAF_RSIDS.inc(len(rsids))
+
+    try:
+        response = await client.post(endpoint, json_body={"ids": rsids}, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+
+        return {rsid: format_maf(data.get(rsid) or {}) for rsid in rsids}
+
+    except (AsyncHTTPError, ValueError) as e:
+        if len(rsids) == 1:
+            return {rsids[0]: None}
+
+        mid = len(rsids) // 2
+        print(f"  Variation request for {len(rsids)} rsIDs failed ({e}), retrying as two halves...", file=sys.stderr)
+        first, second = await asyncio.gather(
+            _fetch_maf_chunk_async(client, rsids[:mid]),
+            _fetch_maf_chunk_async(client, rsids[mid:])
+        )
+        return {**first, **second}
+
+
+async def fetch_maf_batch_async(
+    client: AsyncEnsemblClient,
+    rsids: List[str],
+    batch_size: int = 200
+) -> Dict[str, str]:
+    """Async equivalent of vep_client.fetch_maf_batch; rsIDs whose lookup failed are left out."""
+    unique_rsids = [rsid for rsid in dict.fromkeys(rsids) if is_valid_rsid(rsid)]
+    chunks = [unique_rsids[i:i + batch_size] for i in range(0, len(unique_rsids), batch_size)]
+
+    mafs = {}
+    for chunk_mafs in await asyncio.gather(*(_fetch_maf_chunk_async(client, chunk) for chunk in chunks)):
+        mafs.update((rsid, maf) for rsid, maf in chunk_mafs.items() if maf is not None)
+    return mafs
+
+
+async def enrich_with_population_maf_async(
+    annotations: List[Dict],
+    client: Optional[AsyncEnsemblClient] = None
+) -> List[Dict]:
+    """Async equivalent of vep_client.enrich_with_population_maf."""
+    to_fetch = [(i, ann['rsid']) for i, ann in enumerate(annotations)
+                if ann.get('rsid') and ann.get('rsid') != 'N/A' and ann.get('maf') == 'N/A']
+    if not to_fetch:
+        return annotations
+
+    if client is None:
+        async with AsyncEnsemblClient() as owned_client:
+            return await enrich_with_population_maf_async(annotations, owned_client)
+
+    print(f"\nFetching MAF from Variation API for {len(to_fetch)} variants with rsIDs...", file=sys.stderr)
+    unique_rsids = len({rsid for _, rsid in to_fetch})
+    if unique_rsids < len(to_fetch):
+        print(f"Deduplication: {len(to_fetch)} MAF lookups -> {unique_rsids} unique rsIDs "
+              f"({len(to_fetch) - unique_rsids} lookups saved)", file=sys.stderr)
+
+    mafs = await fetch_maf_batch_async(client, [rsid for _, rsid in to_fetch])
+    for ann_idx, rsid in to_fetch:
+        maf = mafs.get(rsid, 'N/A')
+        if maf != 'N/A':
+            annotations[ann_idx]['maf'] = maf
+
+    return annotations
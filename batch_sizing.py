@@ -0,0 +1,69 @@
+import sys
+import threading
+
+
+DEFAULT_MIN_BATCH_SIZE = 25
+# Ensembl rejects POST bodies with more than 300 HGVS notations
+DEFAULT_MAX_BATCH_SIZE = 300
+DEFAULT_TARGET_LATENCY = 30.0
+DEFAULT_INCREASE_STEP = 25
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_MAX_ERROR_FRACTION = 0.2
+
+
+class AdaptiveBatchSizer:
+    """AIMD controller for the VEP batch size.
+
+    The size grows additively after each healthy batch and shrinks
+    multiplicatively after a timeout, a batch slower than the target latency,
+    or a batch whose per-entry error fraction is too high.
+    """
+
+    def __init__(
+        self,
+        initial: int = 200,
+        min_size: int = DEFAULT_MIN_BATCH_SIZE,
+        max_size: int = DEFAULT_MAX_BATCH_SIZE,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        increase_step: int = DEFAULT_INCREASE_STEP,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        max_error_fraction: float = DEFAULT_MAX_ERROR_FRACTION
+    ):
+        if not 1 <= min_size <= max_size:
+            raise ValueError(f"Invalid batch size bounds: {min_size}..{max_size}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.max_error_fraction = max_error_fraction
+        self._size = min(max_size, max(min_size, initial))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Batch size to use for the next batch."""
+        return self._size
+
+    def record(self, batch_size: int, latency: float, timed_out: bool = False, error_fraction: float = 0.0) -> int:
+        """Feed back the outcome of a batch and return the adjusted batch size."""
+        with self._lock:
+            old_size = self._size
+            if timed_out:
+                reason = "timeout"
+            elif error_fraction > self.max_error_fraction:
+                reason = f"error fraction {error_fraction:.0%}"
+            elif latency > self.target_latency:
+                reason = f"latency above {self.target_latency:.0f}s target"
+            else:
+                reason = None
+
+            if reason is None:
+                self._size = min(self.max_size, old_size + self.increase_step)
+                reason = "healthy"
+            else:
+                self._size = max(self.min_size, int(old_size * self.decrease_factor))
+
+            print(f"  Batch size {old_size} -> {self._size} ({reason}; "
+                  f"{batch_size} variants in {latency:.1f}s, {error_fraction:.0%} errors)", file=sys.stderr)
+            return self._size
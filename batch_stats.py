@@ -0,0 +1,134 @@
+from collections.abc import Mapping
+from typing import Dict, List, Sequence
+
+from vcf_parser import calculate_read_statistics, determine_variant_type
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the scalar functions are used instead
+    np = None
+
+
+# Integers above this lose precision as float64, so rows holding them stay scalar
+MAX_EXACT_INT = 2 ** 53
+# Values whose scaled fraction lies this close to .5 are re-rounded with round()
+HALFWAY_TOLERANCE = 1e-9
+
+VARIANT_TYPE_LABELS = ("SNP (substitution)", "Insertion", "Deletion")
+
+
+def _is_plain_number(value) -> bool:
+    return (type(value) is float) or (type(value) is int and -MAX_EXACT_INT <= value <= MAX_EXACT_INT)
+
+
+def _is_plain_column(values: List) -> bool:
+    types = set(map(type, values))
+    if not types <= {int, float}:
+        return False
+    return int not in types or all(-MAX_EXACT_INT <= value <= MAX_EXACT_INT for value in values if type(value) is int)
+
+
+def round_like_python(values, ndigits: int) -> List[float]:
+    """Round a float array exactly as the builtin round() rounds each element.
+
+    NumPy rounds x * 10**ndigits to the nearest integer, which only differs
+    from round() when the scaled value sits on (or within float error of) a
+    .5 boundary; those elements are rounded individually.
+    """
+    scaled = values * 10.0 ** ndigits
+    rounded = np.round(values, ndigits).tolist()
+    distance = np.abs(scaled - np.floor(scaled) - 0.5)
+    halfway = distance <= HALFWAY_TOLERANCE * np.maximum(1.0, np.abs(scaled))
+    for i in np.flatnonzero(halfway).tolist():
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+def read_statistics_columns(depth: Sequence, ref_reads: Sequence, alt_reads: Sequence) -> Dict[str, List]:
+    """Vectorized variant and reference percentages for columns of DP, RO and AO.
+
+    Values match calculate_read_statistics, including the integer 0 it
+    returns when the depth is not positive or the read count is zero.
+    """
+    depth = np.asarray(depth, dtype=np.float64)
+    positive = depth > 0
+    safe_depth = np.where(positive, depth, 1.0)
+
+    columns = {}
+    for name, reads in (('variant_percentage', alt_reads), ('reference_percentage', ref_reads)):
+        reads = np.asarray(reads, dtype=np.float64)
+        computed = positive & (reads != 0)
+        percentages = round_like_python((reads / safe_depth) * 100, 2)
+        columns[name] = percentages if computed.all() else [
+            pct if keep else 0 for pct, keep in zip(percentages, computed.tolist())
+        ]
+    return columns
+
+
+def allele_frequency_column(af: Sequence) -> List:
+    """Vectorized allele_frequency rounding; integers pass through as round(int, 4) would."""
+    rounded = round_like_python(np.asarray(af, dtype=np.float64), 4)
+    return [value if type(value) is int else rounded_value for value, rounded_value in zip(af, rounded)]
+
+
+def calculate_read_statistics_batch(variants: Sequence[Mapping]) -> List[Dict]:
+    """calculate_read_statistics for a chunk of variants in one vectorized pass.
+
+    Rows with non-numeric INFO values (or without NumPy installed) use the
+    scalar function, so results are always identical to it.
+    """
+    if np is None or not variants:
+        return [calculate_read_statistics(variant) for variant in variants]
+
+    infos = [variant['info'] for variant in variants]
+    depth = [info.get('DP', 0) for info in infos]
+    ref_reads = [info.get('RO', 0) for info in infos]
+    alt_reads = [info.get('AO', 0) for info in infos]
+    af = [info.get('AF', 0) for info in infos]
+
+    if not all(_is_plain_column(column) for column in (depth, ref_reads, alt_reads, af)):
+        numeric = [
+            i for i, row in enumerate(zip(depth, ref_reads, alt_reads, af))
+            if all(_is_plain_number(value) for value in row)
+        ]
+        results = [calculate_read_statistics(variant) for variant in variants]
+        for i, stats in zip(numeric, calculate_read_statistics_batch([variants[i] for i in numeric])):
+            results[i] = stats
+        return results
+
+    columns = read_statistics_columns(depth, ref_reads, alt_reads)
+    return [
+        {
+            'depth': row[0],
+            'variant_reads': row[1],
+            'reference_reads': row[2],
+            'variant_percentage': row[3],
+            'reference_percentage': row[4],
+            'allele_frequency': row[5]
+        }
+        for row in zip(depth, alt_reads, ref_reads, columns['variant_percentage'],
+                       columns['reference_percentage'], allele_frequency_column(af))
+    ]
+
+
+def variant_type_codes(ref_lengths: Sequence[int], alt_lengths: Sequence[int]):
+    """Index into VARIANT_TYPE_LABELS per variant, or -1 where the alleles themselves must be inspected."""
+    ref_lengths = np.asarray(ref_lengths)
+    alt_lengths = np.asarray(alt_lengths)
+    return np.select(
+        [(ref_lengths == 1) & (alt_lengths == 1), alt_lengths > ref_lengths, ref_lengths > alt_lengths],
+        [0, 1, 2],
+        default=-1
+    )
+
+
+def determine_variant_types_batch(refs: Sequence[str], alts: Sequence[str]) -> List[str]:
+    """determine_variant_type for a chunk of REF/ALT pairs, classified by allele length with NumPy."""
+    if np is None or not refs:
+        return [determine_variant_type(ref, alt) for ref, alt in zip(refs, alts)]
+
+    codes = variant_type_codes([len(ref) for ref in refs], [len(alt) for alt in alts]).tolist()
+    return [
+        VARIANT_TYPE_LABELS[code] if code >= 0 else determine_variant_type(ref, alt)
+        for code, ref, alt in zip(codes, refs, alts)
+    ]
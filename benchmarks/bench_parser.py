@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks of the per-variant hot paths, gated against stored baselines.
+
+Each case is timed on synthetic freebayes-style rows at several sizes and
+reported as microseconds per row. Cases slower than their baseline by more
+than the threshold fail the run:
+
+    python -m benchmarks.bench_parser --sizes 10000,100000 --threshold 0.4
+    python -m benchmarks.bench_parser --update-baseline
+
+Each timing round of a case is paired with a round of a fixed calibration
+workload, and cases are compared to their baseline relative to it, which
+cancels most of the drift in host speed between and within runs. The
+median round is gated rather than the fastest, and 1k rows are too few to
+gate reliably, so they are only timed when asked for with --sizes.
+Baselines are still best recorded with --update-baseline on the benchmark
+host.
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+
+from annotator import build_annotations, export_to_tsv
+from benchmarks.bench_throughput import synthetic_variant_lines
+from vcf_parser import READ_STAT_INFO_KEYS, calculate_read_statistics, determine_variant_type, parse_info, parse_variant_line
+from vep_client import build_hgvs_notation
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_baselines.json')
+# Gated row counts; smaller sizes vary too much between runs to gate on
+DEFAULT_SIZES = (10000, 100000)
+# Fractional slowdown over the baseline that fails the run; medians at 10k+ rows vary up to ~22% between runs
+DEFAULT_THRESHOLD = 0.4
+DEFAULT_REPEAT = 9
+# Pure-Python string and dict work resembling the parser, timed to normalize host speed
+CALIBRATION_STMT = "dict(item.split('=', 1) for item in 'AB=0.5;AF=0.25;AO=12;DP=48;RO=36'.split(';'))"
+
+VEP_RESULT = {
+    'gene_id': 'ENSG00000141510',
+    'gene_symbol': 'TP53',
+    'consequence_terms': 'missense_variant',
+    'rsid': 'N/A',
+    'maf': '0.0123'
+}
+
+
+class Inputs:
+    """Synthetic rows in the forms each hot path consumes, built once per size."""
+
+    def __init__(self, size: int, output_dir: str):
+        self.lines = list(synthetic_variant_lines(size))
+        self.fields = [line.split('\t') for line in self.lines]
+        self.infos = [fields[7] for fields in self.fields]
+        self.variants = [parse_variant_line(line, []) for line in self.lines]
+        self.output_dir = output_dir
+
+
+def _export(inputs: Inputs) -> Callable[[], None]:
+    annotations = build_annotations(inputs.variants, [VEP_RESULT] * len(inputs.variants))
+    output_file = os.path.join(inputs.output_dir, 'output.tsv')
+
+    def run():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+            export_to_tsv(annotations, output_file)
+    return run
+
+
+# Case name -> factory returning a zero-argument callable that processes every row once
+CASES: Dict[str, Callable[[Inputs], Callable[[], object]]] = {
+    'parse_info': lambda inputs: lambda: [parse_info(info) for info in inputs.infos],
+    'parse_info_projected': lambda inputs: lambda: [parse_info(info, READ_STAT_INFO_KEYS) for info in inputs.infos],
+    'parse_variant_line': lambda inputs: lambda: [parse_variant_line(line, []) for line in inputs.lines],
+    'calculate_read_statistics': lambda inputs: lambda: [calculate_read_statistics(v) for v in inputs.variants],
+    'determine_variant_type': lambda inputs: lambda: [determine_variant_type(f[3], f[4]) for f in inputs.fields],
+    'build_hgvs_notation': lambda inputs: lambda: [
+        build_hgvs_notation(f[0], int(f[1]), f[3], f[4]) for f in inputs.fields
+    ],
+    'export_to_tsv': _export
+}
+
+
+def time_case(run: Callable[[], object], repeat: int = DEFAULT_REPEAT) -> Tuple[float, float]:
+    """Median seconds for one call of run, and median microseconds for the calibration workload.
+
+    The two are timed in alternating rounds so both see the same host load.
+    """
+    timer, calibration = timeit.Timer(run), timeit.Timer(CALIBRATION_STMT)
+    # Short workloads are looped so each round takes at least 0.2s
+    number, _ = timer.autorange()
+    calibration_number, _ = calibration.autorange()
+    rounds, calibration_rounds = [], []
+    for _ in range(repeat):
+        rounds.append(timer.timeit(number) / number)
+        calibration_rounds.append(calibration.timeit(calibration_number) / calibration_number)
+    return statistics.median(rounds), statistics.median(calibration_rounds) * 1e6
+
+
+def run_benchmarks(sizes: List[int], cases: Optional[List[str]] = None, repeat: int = DEFAULT_REPEAT) -> Dict[str, Dict]:
+    """Time each case at each size, keyed by "<case>[<size>]"."""
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for size in sizes:
+            inputs = Inputs(size, output_dir)
+            for name in cases or CASES:
+                seconds, calibration_us = time_case(CASES[name](inputs), repeat)
+                results[f"{name}[{size}]"] = {
+                    'seconds': seconds,
+                    'us_per_row': seconds / size * 1e6,
+                    'calibration_us': calibration_us
+                }
+                print(f"{name}[{size}]: {seconds * 1000:.2f} ms ({seconds / size * 1e6:.3f} us/row)", file=sys.stderr)
+    return results
+
+
+def relative_cost(result: Dict) -> float:
+    """Per-row time in units of the calibration workload."""
+    return result['us_per_row'] / result['calibration_us']
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Messages for every case slower than its baseline by more than `threshold`, relative to calibration."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = relative_cost(result) / relative_cost(baseline[key])
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{key}: {relative_cost(result):.2f}x calibration per row vs baseline {relative_cost(baseline[key]):.2f}x "
+                f"({(ratio - 1) * 100:+.0f}%, threshold {threshold * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parser hot paths against stored baselines')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help=f"Comma-separated row counts (default: {','.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument('--case', action='append', choices=list(CASES), help='Only run this case (repeatable)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help=f'Timing rounds per case (default: {DEFAULT_REPEAT})')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Fractional slowdown over baseline that fails the run (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='Record these timings as the new baseline')
+    parser.add_argument('--output', help='Also write the timings as JSON here')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run_benchmarks(sizes, args.case, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"Baseline updated in {args.baseline}", file=sys.stderr)
+        return
+
+    missing = [key for key in results if key not in baseline]
+    if missing:
+        print(f"No baseline for {', '.join(missing)}; run with --update-baseline to record one", file=sys.stderr)
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    if regressions:
+        print('Regressions:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold * 100:.0f}% across {len(results) - len(missing)} cases", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
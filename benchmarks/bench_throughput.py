@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark of annotate_vcf against the mock Ensembl server.
+
+Each input runs in a fresh process so its peak RSS is measured on its own.
+Results are printed (or written) as JSON for tracking regressions:
+
+    python -m benchmarks.bench_throughput --synthetic 10000 --latency 0.05 --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List
+
+from benchmarks.mock_ensembl import MockEnsemblServer
+
+
+DEFAULT_VCF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'input.vcf')
+BASES = 'ACGT'
+SYNTHETIC_HEADER = '##fileformat=VCFv4.1\n##source=synthetic\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+
+
+def synthetic_variant_lines(count: int, seed: int = 0) -> Iterator[str]:
+    """Sorted freebayes-style VCF data lines with `count` SNPs and short indels."""
+    rng = random.Random(seed)
+    per_chrom = max(1, count // 22 + 1)
+    for i in range(count):
+        chrom = str(i // per_chrom + 1)
+        pos = 10000 + (i % per_chrom) * 150 + rng.randint(0, 100)
+        ref = rng.choice(BASES)
+        kind = rng.random()
+        if kind < 0.8:
+            alt = rng.choice([b for b in BASES if b != ref])
+        elif kind < 0.9:
+            alt = ref + ''.join(rng.choice(BASES) for _ in range(rng.randint(1, 4)))
+        else:
+            ref, alt = ref + ''.join(rng.choice(BASES) for _ in range(rng.randint(1, 4))), ref
+        depth = rng.randint(10, 2000)
+        alt_reads = rng.randint(0, depth)
+        vid = f'rs{rng.randint(1, 10**8)}' if rng.random() < 0.3 else '.'
+        yield (f'{chrom}\t{pos}\t{vid}\t{ref}\t{alt}\t{rng.uniform(0, 5000):.2f}\t.\t'
+               f'AB=0.5;ABP=3.0103;AC=1;AF={alt_reads / depth:.4f};AN=2;AO={alt_reads};DP={depth};'
+               f'DPB={depth};MQM=60;NS=1;RO={depth - alt_reads};TYPE=snp\n')
+
+
+def write_synthetic_vcf(path: str, count: int, seed: int = 0) -> str:
+    """Write a VCF of synthetic_variant_lines."""
+    with open(path, 'w') as f:
+        f.write(SYNTHETIC_HEADER)
+        f.writelines(synthetic_variant_lines(count, seed))
+    return path
+
+
+def run_case(vcf_file: str, base_url: str, workers: int, batch_size: int, limit, unthrottled: bool, verbose: bool) -> Dict:
+    """Annotate one VCF against base_url in this process and measure it."""
+    import vep_client
+    from annotator import annotate_vcf
+
+    vep_client.BASE_URL = base_url
+    if unthrottled:
+        vep_client.client.rate_limiter = None
+
+    with contextlib.redirect_stderr(sys.stderr if verbose else open(os.devnull, 'w')):
+        start = time.perf_counter()
+        annotations = annotate_vcf(vcf_file, limit=limit, workers=workers, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+
+    return {
+        'variants': len(annotations),
+        'seconds': round(elapsed, 3),
+        'variants_per_sec': round(len(annotations) / elapsed, 1) if elapsed else None,
+        'client_retries': vep_client.client.retries,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def benchmark(inputs: List[str], args: argparse.Namespace) -> List[Dict]:
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for vcf_file in inputs:
+        server = MockEnsemblServer(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            entry_error_rate=args.entry_error_rate,
+            rate_limit=args.rate_limit
+        )
+        with server, ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(
+                run_case, vcf_file, server.url, args.workers, args.batch_size, args.limit,
+                args.unthrottled, args.verbose
+            ).result()
+            results.append({'input': vcf_file, **result, **server.stats()})
+        print(f"{vcf_file}: {result['variants']} variants in {result['seconds']}s "
+              f"({result['variants_per_sec']}/s)", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark annotate_vcf against a mock Ensembl server')
+    parser.add_argument('--vcf', action='append', help=f'VCF to annotate (repeatable; default: {DEFAULT_VCF})')
+    parser.add_argument('--synthetic', type=int, action='append', default=[],
+                        help='Also benchmark a synthetic VCF with N variants (repeatable)')
+    parser.add_argument('--limit', type=int, help='Limit variants per input')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock server seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock requests answered with 503')
+    parser.add_argument('--entry-error-rate', type=float, default=0.0,
+                        help='Fraction of HGVS entries the mock returns as errors')
+    parser.add_argument('--rate-limit', type=float, help='Mock server requests per second before 429')
+    parser.add_argument('--unthrottled', action='store_true',
+                        help="Disable the client's Ensembl rate limiter to measure raw pipeline throughput")
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='Show annotator progress output')
+    args = parser.parse_args()
+
+    inputs = list(args.vcf or [DEFAULT_VCF])
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.synthetic:
+            inputs.append(write_synthetic_vcf(os.path.join(tmp, f'synthetic_{count}.vcf'), count))
+        report = {
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+            'cases': benchmark(inputs, args)
+        }
+        for case in report['cases']:
+            if case['input'].startswith(tmp):
+                case['input'] = os.path.basename(case['input'])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
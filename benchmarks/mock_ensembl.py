@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Ensembl REST endpoints used by the annotator.
+
+Serves POST /vep/human/hgvs, /vep/human/region and /variation/human with
+deterministic fake annotations, and can add latency, server errors,
+per-entry VEP errors and 429 rate limiting so benchmarks exercise the
+same retry and fallback paths as a real run.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from rate_limiter import TokenBucket
+
+
+def _stable_int(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=4).digest(), 'little')
+
+
+def fake_consequence(key: str) -> Dict:
+    """Deterministic VEP-style entry for a variant key."""
+    n = _stable_int(key)
+    entry = {
+        'input': key,
+        'transcript_consequences': [{
+            'gene_id': f'ENSG{n % 20000:011d}',
+            'gene_symbol': f'GENE{n % 20000}',
+            'consequence_terms': [('missense_variant', 'intron_variant', 'synonymous_variant')[n % 3]]
+        }]
+    }
+    if n % 2:
+        entry['colocated_variants'] = [{'id': f'rs{n % 10000000}'}]
+    return entry
+
+
+class MockEnsemblServer:
+    """Threaded HTTP server imitating the Ensembl REST API.
+
+    latency: seconds added to every response.
+    error_rate: fraction of requests answered with 503.
+    entry_error_rate: fraction of HGVS entries returned as errors, which sends them to the region fallback.
+    rate_limit: requests per second allowed before answering 429 with Retry-After.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        entry_error_rate: float = 0.0,
+        rate_limit: Optional[float] = None,
+        seed: int = 0,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.entry_error_rate = entry_error_rate
+        self.requests = Counter()
+        self.throttled = 0
+        self.server_errors = 0
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._bucket = TokenBucket(rate_limit, 1.0) if rate_limit else None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockEnsemblServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockEnsemblServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def stats(self) -> Dict:
+        """Request counts by path plus throttled, failed and byte totals."""
+        with self._lock:
+            return {
+                'requests': dict(self.requests),
+                'throttled': self.throttled,
+                'server_errors': self.server_errors,
+                'bytes_sent': self.bytes_sent
+            }
+
+    def _admit(self, path: str) -> Optional[int]:
+        """Record a request and return an error status to send instead of a normal response, if any."""
+        with self._lock:
+            self.requests[path] += 1
+            if self._bucket is not None:
+                self._bucket.refill(time.monotonic())
+                if self._bucket.tokens < 1:
+                    self.throttled += 1
+                    return 429
+                self._bucket.tokens -= 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.server_errors += 1
+                return 503
+        return None
+
+    def _entry_fails(self) -> bool:
+        with self._lock:
+            return bool(self.entry_error_rate) and self._random.random() < self.entry_error_rate
+
+    def _respond(self, path: str, body: Dict):
+        if path == '/vep/human/hgvs':
+            return 200, [
+                {'input': hgvs, 'error': 'Unable to parse HGVS notation'} if self._entry_fails() else fake_consequence(hgvs)
+                for hgvs in body.get('hgvs_notations', [])
+            ]
+        if path == '/vep/human/region':
+            return 200, [fake_consequence(variant) for variant in body.get('variants', [])]
+        if path == '/variation/human':
+            return 200, {
+                rsid: {'name': rsid, 'MAF': (_stable_int(rsid) % 5000) / 10000}
+                for rsid in body.get('ids', [])
+            }
+        return 404, {'error': f'Unknown path {path}'}
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if mock.latency:
+                    time.sleep(mock.latency)
+
+                status = mock._admit(self.path)
+                if status == 429:
+                    return self._send(429, {'error': 'Too many requests'}, {
+                        'Retry-After': '1', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '1'
+                    })
+                if status == 503:
+                    return self._send(503, {'error': 'Service unavailable'})
+                self._send(*mock._respond(self.path, body))
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                with mock._lock:
+                    mock.bytes_sent += len(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a mock Ensembl REST server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--entry-error-rate', type=float, default=0.0, help='Fraction of HGVS entries returned as errors')
+    parser.add_argument('--rate-limit', type=float, help='Requests per second before answering 429')
+    args = parser.parse_args()
+
+    server = MockEnsemblServer(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        entry_error_rate=args.entry_error_rate,
+        rate_limit=args.rate_limit,
+        port=args.port
+    ).start()
+    print(f'Mock Ensembl listening on {server.url}; set ENSEMBL_REST_URL={server.url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+import gzip
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+# Uncompressed bytes per block; keeps within-block offsets below 2**16
+BGZF_BLOCK_SIZE = 0xff00
+
+TABIX_MAGIC = b'TBI\x01'
+TABIX_SUFFIX = '.tbi'
+TABIX_FORMAT_VCF = 2
+TABIX_MIN_SHIFT = 14
+# htslib stores per-reference metadata in this pseudo-bin
+TABIX_PSEUDO_BIN = 37450
+
+
+def reg2bin(beg: int, end: int) -> int:
+    """Smallest UCSC bin containing the zero-based, half-open interval [beg, end)."""
+    end -= 1
+    if beg >> 14 == end >> 14:
+        return ((1 << 15) - 1) // 7 + (beg >> 14)
+    if beg >> 17 == end >> 17:
+        return ((1 << 12) - 1) // 7 + (beg >> 17)
+    if beg >> 20 == end >> 20:
+        return ((1 << 9) - 1) // 7 + (beg >> 20)
+    if beg >> 23 == end >> 23:
+        return ((1 << 6) - 1) // 7 + (beg >> 23)
+    if beg >> 26 == end >> 26:
+        return ((1 << 3) - 1) // 7 + (beg >> 26)
+    return 0
+
+
+def reg2bins(beg: int, end: int) -> List[int]:
+    """All UCSC bins that may hold records overlapping [beg, end)."""
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+class BgzfReader:
+    """Random-access reader for BGZF files addressed by virtual offsets."""
+
+    def __init__(self, path: str):
+        self._f = open(path, 'rb')
+        self._block_offset = 0
+        self._next_block_offset = 0
+        self._buffer = b''
+        self._within = 0
+        self._load_block(0)
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> 'BgzfReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def tell(self) -> int:
+        """Virtual offset of the next byte to be read."""
+        return (self._block_offset << 16) | self._within
+
+    def seek(self, virtual_offset: int) -> None:
+        """Move to a virtual offset (compressed block offset << 16 | offset within block)."""
+        self._load_block(virtual_offset >> 16)
+        self._within = virtual_offset & 0xffff
+        self._skip_exhausted_blocks()
+
+    def readline(self) -> bytes:
+        """Read one line, including its trailing newline; b'' at end of file."""
+        parts = []
+        while self._buffer:
+            newline = self._buffer.find(b'\n', self._within)
+            if newline >= 0:
+                parts.append(self._buffer[self._within:newline + 1])
+                self._within = newline + 1
+                self._skip_exhausted_blocks()
+                break
+            parts.append(self._buffer[self._within:])
+            self._load_block(self._next_block_offset)
+        return b''.join(parts)
+
+    def _skip_exhausted_blocks(self) -> None:
+        # Normalize so tell() at a block boundary points at the start of the next block
+        while self._buffer and self._within >= len(self._buffer):
+            self._load_block(self._next_block_offset)
+
+    def _load_block(self, offset: int) -> None:
+        self._f.seek(offset)
+        header = self._f.read(12)
+        self._block_offset = offset
+        self._within = 0
+        if len(header) < 12:
+            self._buffer = b''
+            self._next_block_offset = offset
+            return
+        if header[:4] != BGZF_MAGIC:
+            raise ValueError(f"Not a BGZF block at offset {offset}")
+
+        xlen = struct.unpack('<H', header[10:12])[0]
+        extra = self._f.read(xlen)
+        block_size = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            subfield_len = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b'BC' and subfield_len == 2:
+                block_size = struct.unpack('<H', extra[pos + 4:pos + 6])[0] + 1
+            pos += 4 + subfield_len
+        if block_size is None:
+            raise ValueError(f"Missing BGZF block size at offset {offset}")
+
+        compressed = self._f.read(block_size - 12 - xlen)
+        self._buffer = zlib.decompress(compressed[:-8], -15)
+        self._next_block_offset = offset + block_size
+        if not self._buffer and compressed:
+            # Empty (e.g. EOF marker) block: move straight on to the next one
+            if self._f.read(1):
+                self._load_block(self._next_block_offset)
+
+
+class BgzfWriter:
+    """Writer for BGZF files that reports virtual offsets for indexing."""
+
+    def __init__(self, path: str, level: int = 6):
+        self._f = open(path, 'wb')
+        self._level = level
+        self._buffer = bytearray()
+        self._block_offset = 0
+
+    def __enter__(self) -> 'BgzfWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def tell(self) -> int:
+        """Virtual offset at which the next write will start."""
+        return (self._block_offset << 16) | len(self._buffer)
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._flush_block(bytes(self._buffer[:BGZF_BLOCK_SIZE]))
+            del self._buffer[:BGZF_BLOCK_SIZE]
+
+    def close(self) -> None:
+        """Flush buffered data, append the BGZF EOF marker and close the file."""
+        if self._buffer:
+            self._flush_block(bytes(self._buffer))
+            self._buffer.clear()
+        self._f.write(BGZF_EOF)
+        self._f.close()
+
+    def _flush_block(self, data: bytes) -> None:
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        block_size = 18 + len(compressed) + 8
+        header = BGZF_MAGIC + b'\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack('<H', block_size - 1)
+        self._f.write(header + compressed + struct.pack('<II', zlib.crc32(data), len(data)))
+        self._block_offset += block_size
+
+
+class TabixIndex:
+    """Binning and linear index from a tabix (.tbi) file."""
+
+    def __init__(self, names: List[str], bins: List[Dict[int, List[Tuple[int, int]]]], linear: List[List[int]]):
+        self.names = names
+        self.bins = bins
+        self.linear = linear
+        self._ref_ids = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def load(cls, path: str) -> 'TabixIndex':
+        """Read a .tbi file."""
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != TABIX_MAGIC:
+            raise ValueError(f"Not a tabix index: {path}")
+
+        n_ref, _, _, _, _, _, _, l_nm = struct.unpack_from('<8i', data, 4)
+        offset = 36
+        names = [name.decode() for name in data[offset:offset + l_nm].split(b'\x00') if name]
+        offset += l_nm
+
+        bins, linear = [], []
+        for _ in range(n_ref):
+            ref_bins = {}
+            (n_bin,) = struct.unpack_from('<i', data, offset)
+            offset += 4
+            for _ in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from('<Ii', data, offset)
+                offset += 8
+                chunks = struct.unpack_from(f'<{2 * n_chunk}Q', data, offset)
+                offset += 16 * n_chunk
+                if bin_id != TABIX_PSEUDO_BIN:
+                    ref_bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+            (n_intv,) = struct.unpack_from('<i', data, offset)
+            offset += 4
+            linear.append(list(struct.unpack_from(f'<{n_intv}Q', data, offset)))
+            offset += 8 * n_intv
+            bins.append(ref_bins)
+
+        return cls(names, bins, linear)
+
+    def resolve_name(self, chrom: str) -> Optional[str]:
+        """Sequence name as stored in the index, tolerating a 'chr' prefix mismatch."""
+        for candidate in (chrom, chrom[3:] if chrom.startswith('chr') else f"chr{chrom}"):
+            if candidate in self._ref_ids:
+                return candidate
+        return None
+
+    def chunks(self, chrom: str, beg: int, end: int) -> List[Tuple[int, int]]:
+        """Merged virtual-offset chunks that may hold records overlapping [beg, end) on chrom."""
+        ref_id = self._ref_ids.get(chrom)
+        if ref_id is None:
+            return []
+
+        linear = self.linear[ref_id]
+        min_offset = linear[min(beg >> TABIX_MIN_SHIFT, len(linear) - 1)] if linear else 0
+
+        candidates = sorted(
+            chunk
+            for bin_id in reg2bins(beg, end)
+            for chunk in self.bins[ref_id].get(bin_id, [])
+            if chunk[1] > min_offset
+        )
+        merged: List[List[int]] = []
+        for chunk_beg, chunk_end in candidates:
+            if merged and chunk_beg <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], chunk_end)
+            else:
+                merged.append([max(chunk_beg, min_offset), chunk_end])
+        return [(chunk_beg, chunk_end) for chunk_beg, chunk_end in merged]
+
+
+def tabix_index_path(vcf_file: str) -> str:
+    return vcf_file + TABIX_SUFFIX
+
+
+def has_tabix_index(vcf_file: str) -> bool:
+    return os.path.exists(tabix_index_path(vcf_file))
+
+
+def tabix_fetch(vcf_file: str, regions: List[Tuple[str, int, int]]) -> Iterator[str]:
+    """Yield VCF data lines overlapping any of the 1-based inclusive regions, using the tabix index.
+
+    Only the BGZF blocks listed in the index for each region are decompressed.
+    Lines come out in file order and at most once.
+    """
+    index = TabixIndex.load(tabix_index_path(vcf_file))
+
+    by_chrom: Dict[str, List[Tuple[int, int]]] = {}
+    for chrom, start, end in regions:
+        name = index.resolve_name(chrom)
+        if name is not None:
+            by_chrom.setdefault(name, []).append((start, end))
+
+    with BgzfReader(vcf_file) as reader:
+        for name in index.names:
+            if name not in by_chrom:
+                continue
+            seen = set()
+            for start, end in merge_intervals(by_chrom[name]):
+                for chunk_beg, chunk_end in index.chunks(name, start - 1, end):
+                    reader.seek(chunk_beg)
+                    while reader.tell() < chunk_end:
+                        line_offset = reader.tell()
+                        line = reader.readline()
+                        if not line:
+                            break
+                        fields = line.split(b'\t', 4)
+                        if fields[0].decode() != name:
+                            continue
+                        pos = int(fields[1])
+                        if pos > end:
+                            break
+                        if pos + len(fields[3]) - 1 >= start and line_offset not in seen:
+                            seen.add(line_offset)
+                            yield line.decode().rstrip('\r\n')
+
+
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort and merge overlapping or adjacent closed intervals."""
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def bgzip_and_index(vcf_file: str, output_file: str) -> str:
+    """Compress a sorted plain-text VCF to BGZF and write its tabix index, returning the index path."""
+    names: List[str] = []
+    bins: List[Dict[int, List[List[int]]]] = []
+    linear: List[List[int]] = []
+
+    with open(vcf_file, 'rb') as src, BgzfWriter(output_file) as writer:
+        for line in src:
+            start_offset = writer.tell()
+            writer.write(line)
+            if line.startswith(b'#') or not line.strip():
+                continue
+            end_offset = writer.tell()
+
+            fields = line.split(b'\t', 4)
+            chrom = fields[0].decode()
+            beg = int(fields[1]) - 1
+            end = beg + max(1, len(fields[3]))
+            if not names or names[-1] != chrom:
+                names.append(chrom)
+                bins.append({})
+                linear.append([])
+
+            chunks = bins[-1].setdefault(reg2bin(beg, end), [])
+            if chunks and chunks[-1][1] == start_offset:
+                chunks[-1][1] = end_offset
+            else:
+                chunks.append([start_offset, end_offset])
+
+            windows = linear[-1]
+            last_window = (end - 1) >> TABIX_MIN_SHIFT
+            if len(windows) <= last_window:
+                windows.extend([0] * (last_window + 1 - len(windows)))
+            for window in range(beg >> TABIX_MIN_SHIFT, last_window + 1):
+                if windows[window] == 0:
+                    windows[window] = start_offset
+
+    encoded_names = b''.join(name.encode() + b'\x00' for name in names)
+    index = bytearray(TABIX_MAGIC)
+    # n_ref, format, col_seq, col_beg, col_end, meta char, skip, l_nm
+    index += struct.pack('<8i', len(names), TABIX_FORMAT_VCF, 1, 2, 0, ord('#'), 0, len(encoded_names))
+    index += encoded_names
+    for ref_bins, windows in zip(bins, linear):
+        index += struct.pack('<i', len(ref_bins))
+        for bin_id, chunks in sorted(ref_bins.items()):
+            index += struct.pack('<Ii', bin_id, len(chunks))
+            for chunk_beg, chunk_end in chunks:
+                index += struct.pack('<QQ', chunk_beg, chunk_end)
+        for i in range(1, len(windows)):
+            if windows[i] == 0:
+                windows[i] = windows[i - 1]
+        index += struct.pack('<i', len(windows))
+        index += struct.pack(f'<{len(windows)}Q', *windows)
+
+    index_file = tabix_index_path(output_file)
+    with BgzfWriter(index_file) as writer:
+        writer.write(bytes(index))
+    return index_file
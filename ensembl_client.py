@@ -0,0 +1,157 @@
+import random
+import sys
+import threading
+import time
+from typing import Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import HTTP_BYTES_RECEIVED, HTTP_BYTES_SENT, HTTP_REQUESTS, HTTP_RETRIES
+from rate_limiter import RateLimiter
+
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 60.0
+
+# Transient statuses worth retrying; other errors are returned to the caller as-is
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+def parse_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a header value holding a number of seconds, or None if absent or malformed."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BACKOFF_BASE, cap: float = DEFAULT_BACKOFF_MAX) -> float:
+    """Exponential backoff with full jitter for the given zero-based attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_delay(
+    headers: Mapping[str, str],
+    attempt: int,
+    base: float = DEFAULT_BACKOFF_BASE,
+    cap: float = DEFAULT_BACKOFF_MAX
+) -> float:
+    """Delay before retrying a response, preferring the server's Retry-After hint."""
+    retry_after = parse_seconds(headers.get('Retry-After'))
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return backoff_delay(attempt, base, cap)
+
+
+def rate_limit_pause(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to pause when X-RateLimit-* headers report an exhausted quota, else None."""
+    # Ensembl reports the remaining quota and the seconds until it resets
+    remaining = headers.get('X-RateLimit-Remaining')
+    reset = parse_seconds(headers.get('X-RateLimit-Reset'))
+    if remaining is not None and reset is not None and remaining.strip() == '0':
+        return reset
+    return None
+
+
+class EnsemblClient:
+    """HTTP client for the Ensembl REST API.
+
+    Owns a pooled keep-alive Session and retries throttled or transient
+    failures with exponential backoff and jitter, honoring Retry-After and
+    X-RateLimit-* headers.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.retries = 0
+        self._paused_until = 0.0
+        self._attempts = threading.local()
+
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request, retrying transient failures."""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request, retrying transient failures."""
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, retry_timeouts: bool = True, **kwargs) -> requests.Response:
+        """Send a request, retrying on connection errors, timeouts and retryable statuses.
+
+        The last response is returned (or the last exception re-raised) once
+        retries are exhausted. With `retry_timeouts=False` a timeout is
+        raised at once, for callers that react to slow responses themselves.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_pause()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            HTTP_REQUESTS.inc()
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._attempts.seconds = time.monotonic() - started
+                if attempt == self.max_retries or (not retry_timeouts and isinstance(e, requests.exceptions.Timeout)):
+                    raise
+                delay = self.backoff_delay(attempt)
+                reason = type(e).__name__
+            else:
+                self._attempts.seconds = time.monotonic() - started
+                HTTP_BYTES_SENT.inc(len(response.request.body or b'') if response.request is not None else 0)
+                HTTP_BYTES_RECEIVED.inc(len(response.content))
+                self._update_pause(response)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = self.retry_delay(response, attempt)
+                reason = f"HTTP {response.status_code}"
+
+            self.retries += 1
+            HTTP_RETRIES.inc()
+            print(f"  {reason} from {method} {url}, retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{self.max_retries})...", file=sys.stderr)
+            time.sleep(delay)
+
+    def last_attempt_seconds(self) -> float:
+        """Duration of the calling thread's latest HTTP attempt, excluding rate-limit, pause and backoff waits."""
+        return getattr(self._attempts, 'seconds', 0.0)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter for the given zero-based attempt."""
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max)
+
+    def retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """Delay before retrying a response, preferring the server's Retry-After hint."""
+        return retry_delay(response.headers, attempt, self.backoff_base, self.backoff_max)
+
+    def _update_pause(self, response: requests.Response) -> None:
+        pause = rate_limit_pause(response.headers)
+        if pause is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + min(self.backoff_max, pause))
+
+    def _wait_for_pause(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
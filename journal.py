@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from typing import Dict
+
+
+JOURNAL_SUFFIX = '.journal'
+
+
+def journal_path_for(output_file: str) -> str:
+    """Journal file kept next to the given output file."""
+    return output_file + JOURNAL_SUFFIX
+
+
+class Journal:
+    """Append-only JSON-lines journal of completed VEP results and MAF lookups.
+
+    Each completed batch is appended as one line and flushed, so an
+    interrupted run can be resumed without repeating finished API calls.
+    `vep` and `maf` hold only the records loaded on resume; new records
+    go to disk only, so memory does not grow with the run.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.vep: Dict[str, Dict] = {}
+        self.maf: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, 'a')
+        else:
+            self._file = open(path, 'w')
+
+    def record_vep(self, results: Dict[str, Dict]) -> None:
+        """Append VEP results keyed by HGVS notation."""
+        if results:
+            self._append({'type': 'vep', 'results': results})
+
+    def record_maf(self, mafs: Dict[str, str]) -> None:
+        """Append MAF values keyed by rsID."""
+        if mafs:
+            self._append({'type': 'maf', 'mafs': mafs})
+
+    def flush(self) -> None:
+        """Flush buffered records to disk."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Flush and close the journal, keeping it on disk for --resume."""
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+    def remove(self) -> None:
+        """Close and delete the journal once the run has completed."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _append(self, record: Dict) -> None:
+        # One write per record so an interrupt never leaves half a line behind
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def _load(self) -> None:
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for raw_line in f:
+                try:
+                    record = json.loads(raw_line)
+                except ValueError:
+                    break
+                if not raw_line.endswith(b'\n'):
+                    break
+                if record.get('type') == 'vep':
+                    self.vep.update(record['results'])
+                elif record.get('type') == 'maf':
+                    self.maf.update(record['mafs'])
+                valid_bytes += len(raw_line)
+
+        # Drop a torn trailing record left by a crash so new records start on a fresh line
+        if valid_bytes != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
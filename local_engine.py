@@ -0,0 +1,259 @@
+import gzip
+import json
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from vcf_parser import is_gzipped, normalize_chrom
+
+
+INDEX_MAGIC = b'VAGTF\x01'
+INDEX_SUFFIX = '.idx'
+# VEP's default distance for upstream/downstream gene variants
+FLANK_DISTANCE = 5000
+
+# Per-chromosome transcript columns, stored in this order in the index file
+TRANSCRIPT_COLUMNS = ('starts', 'ends', 'strands', 'genes', 'cds_starts', 'cds_ends', 'exon_offsets', 'exon_counts')
+EXON_COLUMNS = ('exon_starts', 'exon_ends')
+
+# Consequence classes from most to least severe
+CONSEQUENCE_RANKS = {
+    'coding_sequence_variant': 0,
+    '5_prime_UTR_variant': 1,
+    '3_prime_UTR_variant': 2,
+    'non_coding_transcript_exon_variant': 3,
+    'intron_variant': 4,
+    'upstream_gene_variant': 5,
+    'downstream_gene_variant': 6
+}
+
+GTF_ATTRIBUTE = re.compile(r'(\w+) "([^"]*)"')
+
+
+def variant_span(pos: int, ref: str, alt: str) -> Tuple[int, int]:
+    """Reference bases affected by a variant once the shared anchor base is dropped.
+
+    Insertions cover the two bases flanking the insertion point.
+    """
+    prefix = 0
+    while prefix < min(len(ref), len(alt)) and ref[prefix] == alt[prefix]:
+        prefix += 1
+    start = pos + prefix
+    end = pos + len(ref) - 1
+    return (end, start) if end < start else (start, end)
+
+
+class ChromIndex:
+    """Transcripts of one chromosome as parallel arrays sorted by start."""
+
+    def __init__(self, columns: Dict[str, array], max_length: int):
+        self.columns = columns
+        self.max_length = max_length
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+
+class GeneIndex:
+    """Interval index of Ensembl transcripts, loaded from a GTF or a saved binary index."""
+
+    def __init__(self, genes: List[Tuple[str, str]], chroms: Dict[str, ChromIndex]):
+        self.genes = genes
+        self.chroms = chroms
+
+    @classmethod
+    def from_gtf(cls, gtf_file: str) -> 'GeneIndex':
+        """Parse transcripts, exons and CDS extents from an Ensembl GTF (plain or gzipped)."""
+        transcripts: Dict[str, Dict] = {}
+        gene_ids: Dict[str, int] = {}
+        genes: List[Tuple[str, str]] = []
+
+        with (gzip.open(gtf_file, 'rt') if is_gzipped(gtf_file) else open(gtf_file, 'r')) as f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 9 or fields[2] not in ('transcript', 'exon', 'CDS', 'stop_codon'):
+                    continue
+                attributes = dict(GTF_ATTRIBUTE.findall(fields[8]))
+                transcript_id = attributes.get('transcript_id')
+                gene_id = attributes.get('gene_id')
+                if not transcript_id or not gene_id:
+                    continue
+
+                if gene_id not in gene_ids:
+                    gene_ids[gene_id] = len(genes)
+                    genes.append((gene_id, attributes.get('gene_name', 'N/A')))
+                start, end = int(fields[3]), int(fields[4])
+                transcript = transcripts.setdefault(transcript_id, {
+                    'chrom': normalize_chrom(fields[0]),
+                    'strand': -1 if fields[6] == '-' else 1,
+                    'gene': gene_ids[gene_id],
+                    'start': start,
+                    'end': end,
+                    'cds': None,
+                    'exons': []
+                })
+                transcript['start'] = min(transcript['start'], start)
+                transcript['end'] = max(transcript['end'], end)
+                if fields[2] == 'exon':
+                    transcript['exons'].append((start, end))
+                elif fields[2] in ('CDS', 'stop_codon'):
+                    cds = transcript['cds']
+                    transcript['cds'] = (start, end) if cds is None else (min(cds[0], start), max(cds[1], end))
+
+        by_chrom: Dict[str, List[Dict]] = {}
+        for transcript in transcripts.values():
+            by_chrom.setdefault(transcript['chrom'], []).append(transcript)
+
+        chroms = {}
+        for chrom, chrom_transcripts in by_chrom.items():
+            chrom_transcripts.sort(key=lambda t: (t['start'], t['end']))
+            columns = {name: array('q') for name in TRANSCRIPT_COLUMNS + EXON_COLUMNS}
+            for transcript in chrom_transcripts:
+                cds_start, cds_end = transcript['cds'] or (0, 0)
+                exons = sorted(transcript['exons'])
+                for name, value in zip(TRANSCRIPT_COLUMNS, (
+                    transcript['start'], transcript['end'], transcript['strand'], transcript['gene'],
+                    cds_start, cds_end, len(columns['exon_starts']), len(exons)
+                )):
+                    columns[name].append(value)
+                for exon_start, exon_end in exons:
+                    columns['exon_starts'].append(exon_start)
+                    columns['exon_ends'].append(exon_end)
+            max_length = max(t['end'] - t['start'] + 1 for t in chrom_transcripts)
+            chroms[chrom] = ChromIndex(columns, max_length)
+
+        return cls(genes, chroms)
+
+    def save(self, index_file: str) -> None:
+        """Write the index as a JSON header followed by the raw transcript and exon arrays."""
+        header = json.dumps({
+            'genes': self.genes,
+            'chroms': [
+                [chrom, len(index.starts), len(index.exon_starts), index.max_length]
+                for chrom, index in self.chroms.items()
+            ]
+        }).encode()
+        with open(index_file, 'wb') as f:
+            f.write(INDEX_MAGIC + struct.pack('<I', len(header)) + header)
+            for index in self.chroms.values():
+                for name in TRANSCRIPT_COLUMNS + EXON_COLUMNS:
+                    index.columns[name].tofile(f)
+
+    @classmethod
+    def load(cls, index_file: str) -> 'GeneIndex':
+        """Read an index written by save()."""
+        with open(index_file, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"Not a gene index: {index_file}")
+            (header_length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_length))
+            chroms = {}
+            for chrom, n_transcripts, n_exons, max_length in header['chroms']:
+                columns = {}
+                for name in TRANSCRIPT_COLUMNS + EXON_COLUMNS:
+                    columns[name] = array('q')
+                    columns[name].fromfile(f, n_exons if name in EXON_COLUMNS else n_transcripts)
+                chroms[chrom] = ChromIndex(columns, max_length)
+        return cls([tuple(gene) for gene in header['genes']], chroms)
+
+    def consequences(self, chrom: str, start: int, end: int) -> List[Tuple[int, int, str]]:
+        """(rank, transcript row, consequence term) for every transcript near [start, end]."""
+        index = self.chroms.get(normalize_chrom(chrom))
+        if index is None:
+            return []
+
+        lo = bisect_left(index.starts, start - index.max_length - FLANK_DISTANCE)
+        hi = bisect_right(index.starts, end + FLANK_DISTANCE)
+        hits = []
+        for row in range(lo, hi):
+            if index.ends[row] + FLANK_DISTANCE < start:
+                continue
+            term = self._classify(index, row, start, end)
+            if term is not None:
+                hits.append((CONSEQUENCE_RANKS[term], row, term))
+        return hits
+
+    @staticmethod
+    def _classify(index: ChromIndex, row: int, start: int, end: int) -> Optional[str]:
+        tx_start, tx_end, strand = index.starts[row], index.ends[row], index.strands[row]
+        if end < tx_start or start > tx_end:
+            before = end < tx_start
+            distance = tx_start - end if before else start - tx_end
+            if distance > FLANK_DISTANCE:
+                return None
+            # Upstream is 5' of the transcript, which depends on the strand
+            return 'upstream_gene_variant' if before == (strand == 1) else 'downstream_gene_variant'
+
+        cds_start, cds_end = index.cds_starts[row], index.cds_ends[row]
+        exonic = None
+        offset = index.exon_offsets[row]
+        for exon in range(offset, offset + index.exon_counts[row]):
+            exon_start, exon_end = index.exon_starts[exon], index.exon_ends[exon]
+            if start > exon_end or end < exon_start:
+                continue
+            if not cds_end:
+                return 'non_coding_transcript_exon_variant'
+            # The CDS extent spans introns, so coding means overlapping the CDS within an exon
+            if start <= min(exon_end, cds_end) and end >= max(exon_start, cds_start):
+                return 'coding_sequence_variant'
+            five_prime = end < cds_start if strand == 1 else start > cds_end
+            exonic = '5_prime_UTR_variant' if five_prime else '3_prime_UTR_variant'
+        if exonic is not None:
+            return exonic
+        return 'intron_variant'
+
+
+def load_or_build_index(gtf_file: str, index_file: Optional[str] = None) -> GeneIndex:
+    """Load the binary index for a GTF, building and saving it first if missing or stale."""
+    index_file = index_file or gtf_file + INDEX_SUFFIX
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(gtf_file):
+        return GeneIndex.load(index_file)
+
+    print(f"Building gene index from {gtf_file}...", file=sys.stderr)
+    index = GeneIndex.from_gtf(gtf_file)
+    index.save(index_file)
+    print(f"Gene index saved to {index_file}", file=sys.stderr)
+    return index
+
+
+class LocalEngine:
+    """Offline replacement for the VEP API backed by a GTF gene index."""
+
+    def __init__(self, index: GeneIndex):
+        self.index = index
+
+    @classmethod
+    def from_gtf(cls, gtf_file: str, index_file: Optional[str] = None) -> 'LocalEngine':
+        return cls(load_or_build_index(gtf_file, index_file))
+
+    def annotate(self, chrom: str, pos: int, ref: str, alt: str) -> Dict:
+        """Annotation with the fields parse_batch_vep_response fills in, for the most severe transcript hit."""
+        start, end = variant_span(pos, ref, alt)
+        hits = self.index.consequences(chrom, start, end)
+        if not hits:
+            return {
+                'gene_id': 'N/A',
+                'gene_symbol': 'N/A',
+                'consequence_terms': 'N/A',
+                'rsid': 'N/A',
+                'maf': 'N/A'
+            }
+
+        _, row, term = min(hits)
+        gene_id, gene_symbol = self.index.genes[self.index.chroms[normalize_chrom(chrom)].genes[row]]
+        return {
+            'gene_id': gene_id,
+            'gene_symbol': gene_symbol,
+            'consequence_terms': term,
+            'rsid': 'N/A',
+            'maf': 'N/A'
+        }
+
+    def annotate_batch(self, variants: List[Tuple[str, int, str, str]]) -> List[Dict]:
+        """Annotate (chrom, pos, ref, alt) tuples in order without any network calls."""
+        return [self.annotate(chrom, pos, ref, alt) for chrom, pos, ref, alt in variants]
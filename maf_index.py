@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+from vcf_parser import normalize_chrom, open_vcf
+
+
+INDEX_MAGIC = b'VAMAF\x01\x00\x00'
+# magic, JSON header length, variant record count, rsID record count
+HEADER = struct.Struct('<8sIQQ')
+# chrom id, position, allele hash, MAF x 10^4
+VARIANT_RECORD = struct.Struct('<IIQH')
+VARIANT_KEY = struct.Struct('<IIQ')
+# rsIDs are stored as (rs number << RSID_SHIFT) | MAF x 10^4 in one sorted uint64 array
+RSID_SHIFT = 14
+
+
+def allele_hash(ref: str, alt: str) -> int:
+    """Stable 64-bit hash of a REF/ALT pair."""
+    return int.from_bytes(hashlib.blake2b(f"{ref}>{alt}".encode(), digest_size=8).digest(), 'little')
+
+
+def encode_maf(maf: float) -> int:
+    """MAF as an integer count of 10^-4, matching the digits format_maf would print."""
+    return int(f"{maf:.4f}".replace('.', ''))
+
+
+def decode_maf(code: int) -> str:
+    return f"{code // 10000}.{code % 10000:04d}"
+
+
+def site_maf(allele_frequencies: List[float]) -> float:
+    """Minor allele frequency of a site: the frequency of its second most common allele."""
+    frequencies = sorted([max(0.0, 1.0 - sum(allele_frequencies))] + allele_frequencies, reverse=True)
+    return frequencies[1]
+
+
+def build_index(sites_vcf: str, index_file: str, af_key: str = 'AF') -> Dict[str, int]:
+    """Build a MAF index from a sorted sites VCF (plain or gzipped), returning record counts.
+
+    Variant records are written as the VCF is streamed, so only the rsID
+    keys are held in memory for sorting.
+    """
+    chroms: Dict[str, int] = {}
+    rsid_keys = array('Q')
+    variant_count = 0
+    skipped = 0
+    last_key = None
+
+    with open(index_file + '.tmp', 'wb') as records:
+        pending = []
+        with open_vcf(sites_vcf) as f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                fields = line.split('\t', 8)
+                info = fields[7] if len(fields) > 7 else ''
+                raw_af = next((item[len(af_key) + 1:] for item in info.split(';') if item.startswith(af_key + '=')), None)
+                try:
+                    allele_frequencies = [float(af) for af in raw_af.split(',')]
+                except (AttributeError, ValueError):
+                    skipped += 1
+                    continue
+
+                chrom = normalize_chrom(fields[0])
+                pos = int(fields[1])
+                if chrom not in chroms:
+                    chroms[chrom] = len(chroms)
+                site_key = (chroms[chrom], pos)
+                if last_key is not None and site_key < last_key:
+                    raise ValueError(f"Sites VCF must be sorted by chromosome and position: {fields[0]}:{pos}")
+                if site_key != last_key:
+                    # Records at one position are sorted by allele hash before writing
+                    for record in sorted(pending):
+                        records.write(VARIANT_RECORD.pack(*record))
+                    variant_count += len(pending)
+                    pending = []
+                    last_key = site_key
+
+                maf_code = encode_maf(site_maf(allele_frequencies))
+                for alt in fields[4].split(','):
+                    pending.append((chroms[chrom], pos, allele_hash(fields[3], alt), maf_code))
+                for rsid in fields[2].split(';'):
+                    if rsid.startswith('rs') and rsid[2:].isdigit():
+                        rsid_keys.append((int(rsid[2:]) << RSID_SHIFT) | maf_code)
+
+            for record in sorted(pending):
+                records.write(VARIANT_RECORD.pack(*record))
+            variant_count += len(pending)
+
+    rsid_keys = array('Q', sorted(rsid_keys))
+    header = json.dumps({'chroms': list(chroms)}).encode()
+    with open(index_file, 'wb') as out, open(index_file + '.tmp', 'rb') as records:
+        out.write(HEADER.pack(INDEX_MAGIC, len(header), variant_count, len(rsid_keys)) + header)
+        # Pad so the uint64 rsID array after the variant records stays aligned
+        padding = -(out.tell() + variant_count * VARIANT_RECORD.size) % 8
+        while chunk := records.read(1 << 20):
+            out.write(chunk)
+        out.write(b'\x00' * padding)
+        rsid_keys.tofile(out)
+    os.remove(index_file + '.tmp')
+
+    return {'variants': variant_count, 'rsids': len(rsid_keys), 'skipped': skipped}
+
+
+class MafIndex:
+    """Memory-mapped MAF index queried by binary search."""
+
+    def __init__(self, index_file: str):
+        self.path = index_file
+        self._file = open(index_file, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length, self.variant_count, self.rsid_count = HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Not a MAF index: {index_file}")
+        header = json.loads(self._map[HEADER.size:HEADER.size + header_length])
+        self._chroms = {chrom: i for i, chrom in enumerate(header['chroms'])}
+        self._variants_offset = HEADER.size + header_length
+        variants_end = self._variants_offset + self.variant_count * VARIANT_RECORD.size
+        self._rsids = memoryview(self._map)[variants_end + (-variants_end % 8):].cast('Q')[:self.rsid_count]
+
+    def close(self) -> None:
+        self._rsids.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'MafIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def lookup_variant(self, chrom: str, pos: int, ref: str, alt: str) -> Optional[str]:
+        """MAF of the site holding this REF/ALT allele, or None if absent."""
+        chrom_id = self._chroms.get(normalize_chrom(chrom))
+        if chrom_id is None:
+            return None
+        key = (chrom_id, pos, allele_hash(ref, alt))
+        lo, hi = 0, self.variant_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = VARIANT_KEY.unpack_from(self._map, self._variants_offset + mid * VARIANT_RECORD.size)
+            if probe < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.variant_count:
+            return None
+        record = VARIANT_RECORD.unpack_from(self._map, self._variants_offset + lo * VARIANT_RECORD.size)
+        return decode_maf(record[3]) if record[:3] == key else None
+
+    def lookup_rsid(self, rsid: str) -> Optional[str]:
+        """MAF recorded for an rsID, or None if absent."""
+        if not (rsid.startswith('rs') and rsid[2:].isdigit()):
+            return None
+        number = int(rsid[2:])
+        lo, hi = 0, self.rsid_count
+        target = number << RSID_SHIFT
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._rsids[mid] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.rsid_count and self._rsids[lo] >> RSID_SHIFT == number:
+            return decode_maf(self._rsids[lo] & ((1 << RSID_SHIFT) - 1))
+        return None
+
+    def lookup(self, chrom: str, pos: int, ref: str, alt: str, rsid: Optional[str] = None) -> Optional[str]:
+        """MAF by allele, falling back to the rsID."""
+        maf = self.lookup_variant(chrom, pos, ref, alt)
+        if maf is None and rsid:
+            maf = self.lookup_rsid(rsid)
+        return maf
+
+
+def main():
+    """Build a MAF index from a sites VCF."""
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mapped population MAF index from a sorted sites VCF "
+                    "(e.g. 1000 Genomes or gnomAD) for --maf-source local:PATH"
+    )
+    parser.add_argument('sites_vcf', help='Sorted sites VCF (plain, gzip or bgzip) with an AF INFO field')
+    parser.add_argument('index_file', help='Output index path')
+    parser.add_argument('--af-key', default='AF', help='INFO key holding per-ALT allele frequencies (default: AF)')
+    args = parser.parse_args()
+
+    counts = build_index(args.sites_vcf, args.index_file, af_key=args.af_key)
+    print(f"Indexed {counts['variants']} alleles and {counts['rsids']} rsIDs "
+          f"({counts['skipped']} sites without {args.af_key} skipped) into {args.index_file}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+
+METRIC_PREFIX = 'variant_annotator_'
+# Upper bounds in seconds for request latency histograms
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DEFAULT_WRITE_INTERVAL = 30.0
+
+
+class Counter:
+    """Monotonically increasing total."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Add the wall-clock seconds spent in the block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc(time.perf_counter() - started)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.value = 0.0
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class Histogram:
+    """Distribution of observations over fixed upper-bound buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def reset(self) -> None:
+        with self._lock:
+            self.count = 0
+            self.sum = 0.0
+            self.bucket_counts = [0] * len(self.buckets)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self.bucket_counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets['+Inf'] = self.count
+            return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms for one process."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, buckets)
+
+    def _register(self, cls, name: str, help_text: str, *args):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help_text, *args)
+            return self._metrics[name]
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def reset(self) -> None:
+        """Zero every metric, e.g. between runs in one process."""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def snapshot(self) -> Dict:
+        """All metric values plus the derived cache hit ratio."""
+        values = {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+        hits, misses = values.get('cache_hits_total', 0), values.get('cache_misses_total', 0)
+        values['cache_hit_ratio'] = hits / (hits + misses) if hits + misses else None
+        return values
+
+    def to_json(self) -> str:
+        return json.dumps({'timestamp': time.time(), 'metrics': self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format, for the node_exporter textfile collector."""
+        lines: List[str] = []
+        for name, metric in sorted(self._metrics.items()):
+            full_name = METRIC_PREFIX + name
+            lines.append(f"# HELP {full_name} {metric.help}")
+            lines.append(f"# TYPE {full_name} {metric.kind}")
+            snapshot = metric.snapshot()
+            if metric.kind == 'histogram':
+                for bound, count in snapshot['buckets'].items():
+                    lines.append(f'{full_name}_bucket{{le="{bound}"}} {count}')
+                lines.append(f"{full_name}_sum {snapshot['sum']}")
+                lines.append(f"{full_name}_count {snapshot['count']}")
+            else:
+                lines.append(f"{full_name} {snapshot}")
+        ratio = self.snapshot()['cache_hit_ratio']
+        if ratio is not None:
+            lines.append(f"# HELP {METRIC_PREFIX}cache_hit_ratio Fraction of VEP lookups served from cache or journal")
+            lines.append(f"# TYPE {METRIC_PREFIX}cache_hit_ratio gauge")
+            lines.append(f"{METRIC_PREFIX}cache_hit_ratio {ratio}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Atomically write metrics to path: Prometheus text for .prom files, JSON otherwise."""
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json() + '\n'
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class PeriodicWriter:
+    """Background thread writing the registry to a file every `interval` seconds until stopped."""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = DEFAULT_WRITE_INTERVAL):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'PeriodicWriter':
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the thread and write the final values."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.registry.write(self.path)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.registry.write(self.path)
+
+
+# Process-wide registry shared by the client, annotator and CLI
+metrics = MetricsRegistry()
+
+PARSE_SECONDS = metrics.counter('parse_seconds_total', 'Seconds spent reading and parsing VCF records')
+VEP_SECONDS = metrics.counter('vep_seconds_total', 'Seconds spent obtaining VEP annotations')
+MAF_SECONDS = metrics.counter('maf_seconds_total', 'Seconds spent obtaining population MAF')
+EXPORT_SECONDS = metrics.counter('export_seconds_total', 'Seconds spent writing TSV output')
+VARIANTS_PARSED = metrics.counter('variants_parsed_total', 'VCF records parsed')
+VEP_BATCH_LATENCY = metrics.histogram('vep_batch_latency_seconds', 'Latency of VEP batch requests')
+VEP_BATCHES = metrics.counter('vep_batches_total', 'VEP batch requests sent')
+VEP_BATCH_SIZE = metrics.gauge('vep_batch_size', 'Target size of the VEP batch most recently dispatched')
+VEP_FALLBACK_VARIANTS = metrics.counter('vep_fallback_variants_total', 'Variants sent to the region fallback')
+MAF_REQUESTS = metrics.counter('maf_requests_total', 'Variation API MAF requests sent')
+MAF_RSIDS = metrics.counter('maf_rsids_requested_total', 'rsIDs requested from the Variation API')
+HTTP_REQUESTS = metrics.counter('http_requests_total', 'HTTP requests sent to Ensembl, including retries')
+HTTP_RETRIES = metrics.counter('http_retries_total', 'HTTP requests retried after throttling or transient errors')
+HTTP_BYTES_SENT = metrics.counter('http_bytes_sent_total', 'Request body bytes sent to Ensembl')
+HTTP_BYTES_RECEIVED = metrics.counter('http_bytes_received_total', 'Response body bytes received from Ensembl')
+CACHE_HITS = metrics.counter('cache_hits_total', 'VEP lookups served from the cache or journal')
+CACHE_MISSES = metrics.counter('cache_misses_total', 'VEP lookups that needed an API request')
+PREVIOUS_ROWS_REUSED = metrics.counter('previous_rows_reused_total', 'Rows reused from a previous output instead of fetched')
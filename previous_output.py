@@ -0,0 +1,59 @@
+import csv
+import sys
+from typing import Dict, List, Mapping, Tuple
+
+from vep_client import is_cacheable_result
+
+
+# Output columns that identify a variant
+KEY_FIELDS = ('chromosome', 'position', 'reference', 'alternate')
+# Output columns that come from the VEP and Variation APIs rather than the VCF
+REUSED_FIELDS = ('gene_id', 'gene_symbol', 'consequence_terms', 'rsid', 'maf')
+
+
+class PreviousOutput:
+    """API results from a previous output TSV, keyed by chromosome, position, reference and alternate.
+
+    Only the API-derived columns are kept; read statistics, quality and the
+    other VCF columns are recomputed from the current VCF. Rows whose VEP
+    lookup failed (API_ERROR) are left out so those variants are fetched
+    again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.results: Dict[Tuple[str, int, str, str], Dict[str, str]] = {}
+        self.reused = 0
+        self.fetched = 0
+        self.skipped_errors = 0
+        self._load()
+
+    def _load(self) -> None:
+        with open(self.path, newline='') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            missing = [field for field in KEY_FIELDS + REUSED_FIELDS if field not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"{self.path} is not an annotation TSV (missing columns: {', '.join(missing)})")
+            for row in reader:
+                result = {field: row[field] for field in REUSED_FIELDS}
+                if not is_cacheable_result(result):
+                    self.skipped_errors += 1
+                    continue
+                self.results[(row['chromosome'], int(row['position']), row['reference'], row['alternate'])] = result
+
+        print(f"Loaded {len(self.results)} annotated rows from {self.path} "
+              f"({self.skipped_errors} API_ERROR rows will be fetched again)", file=sys.stderr)
+
+    def partition(self, variants: List[Mapping]) -> Tuple[Dict[int, Dict[str, str]], List[int]]:
+        """Previous results by variant index, and the indices of variants that still need fetching."""
+        reused = {}
+        to_fetch = []
+        for i, variant in enumerate(variants):
+            result = self.results.get((variant['chrom'], variant['pos'], variant['ref'], variant['alt']))
+            if result is None:
+                to_fetch.append(i)
+            else:
+                reused[i] = result
+        self.reused += len(reused)
+        self.fetched += len(to_fetch)
+        return reused, to_fetch
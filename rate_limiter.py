@@ -0,0 +1,56 @@
+import threading
+import time
+from typing import List, Tuple
+
+
+# Ensembl REST limits: 15 requests per second and 54,000 per hour
+ENSEMBL_RATE_LIMITS = [(15, 1.0), (54000, 3600.0)]
+
+
+class TokenBucket:
+    """Token bucket allowing `capacity` requests per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add tokens accrued since the last refill, up to capacity."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Thread-safe rate limiter enforcing several token buckets at once."""
+
+    def __init__(self, limits: List[Tuple[float, float]] = ENSEMBL_RATE_LIMITS):
+        self.buckets = [TokenBucket(capacity, period) for capacity, period in limits]
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Consume a token from every bucket if all have one, otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self.buckets:
+                bucket.refill(now)
+            wait = max(bucket.wait_time() for bucket in self.buckets)
+            if wait == 0:
+                for bucket in self.buckets:
+                    bucket.tokens -= 1
+            return wait
+
+    def acquire(self) -> None:
+        """Block until a request is allowed by every bucket, then consume a token from each."""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            time.sleep(wait)
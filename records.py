@@ -0,0 +1,72 @@
+from collections.abc import Mapping
+from typing import Dict, Tuple
+
+
+class Record(Mapping):
+    """Fixed-field record stored in __slots__ with a read/write dict-style view.
+
+    Subclasses list their fields in __slots__; `record['field']`, `get`,
+    `keys`, `items` and comparison with plain dicts behave as for the dicts
+    these records replace, without a per-row hash table.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values, **fields):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values):]:
+            setattr(self, name, fields.pop(name, ''))
+        if fields:
+            raise TypeError(f"Unknown {type(self).__name__} fields: {', '.join(fields)}")
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__slots__
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+    def as_tuple(self) -> Tuple:
+        """Field values in declaration order."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_dict(self) -> Dict:
+        """Plain dict copy of the record."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class VariantRecord(Record):
+    """One parsed VCF data line."""
+
+    __slots__ = ('chrom', 'pos', 'id', 'ref', 'alt', 'qual', 'filter', 'info')
+
+
+class AnnotationRecord(Record):
+    """One output row; fields are in TSV column order."""
+
+    __slots__ = (
+        'depth',  # Depth of sequence coverage
+        'variant_reads',  # Number of reads supporting variant
+        'variant_percentage', 'reference_percentage',  # Percentage of reads
+        'gene_id', 'gene_symbol', 'variant_type', 'consequence_terms',  # Gene, type, effect
+        'maf',  # Minor allele frequency
+        # Additional annotations
+        'chromosome', 'position', 'variant_id', 'reference', 'alternate',
+        'quality', 'reference_reads', 'allele_frequency', 'rsid'
+    )
@@ -0,0 +1,326 @@
+import csv
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from annotator import FIELDNAMES, annotate_vcf, annotation_row
+from local_engine import LocalEngine
+from maf_index import MafIndex
+from metrics import metrics
+from records import AnnotationRecord
+from vcf_parser import GZIP_MAGIC, parse_region
+from vep_cache import VEPCache
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_MEMORY_ENTRIES = 500_000
+# Seconds a job waits for another job's in-flight lookup before fetching the key itself
+DEFAULT_WAIT_TIMEOUT = 300.0
+
+
+class CoalescingCache:
+    """In-memory LRU cache with the VEPCache interface that lets one caller at a time fetch each miss.
+
+    get_many claims the keys it misses for the calling thread, and callers
+    asking for a key another thread has claimed wait for that thread's
+    put_many instead of fetching it again. A claim that ends without a
+    result (e.g. an API error) is dropped by release(), and waiters then
+    fetch the key themselves. Misses fall through to an optional persistent
+    `backing` cache, and stored results are written through to it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MEMORY_ENTRIES,
+        backing: Optional[VEPCache] = None,
+        wait_timeout: float = DEFAULT_WAIT_TIMEOUT
+    ):
+        self.max_entries = max_entries
+        self.backing = backing
+        self.wait_timeout = wait_timeout
+        self.coalesced = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], threading.Event] = {}
+        self._claims = threading.local()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _claimed(self) -> Dict[Tuple[str, str], threading.Event]:
+        if not hasattr(self._claims, 'events'):
+            self._claims.events = {}
+        return self._claims.events
+
+    def get_many(self, endpoint: str, keys: Iterable[str]) -> Dict[str, Dict]:
+        """Cached values for keys, waiting for any that another caller is already fetching."""
+        claimed = self._claimed()
+        found = {}
+        waits = []
+        to_claim = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry_key = (endpoint, key)
+                if entry_key in self._entries:
+                    self._entries.move_to_end(entry_key)
+                    found[key] = self._entries[entry_key]
+                elif entry_key in claimed:
+                    continue
+                elif entry_key in self._in_flight:
+                    waits.append((key, self._in_flight[entry_key]))
+                else:
+                    claimed[entry_key] = self._in_flight[entry_key] = threading.Event()
+                    to_claim.append(key)
+
+        if to_claim and self.backing is not None:
+            stored = self.backing.get_many(endpoint, to_claim)
+            self._store(endpoint, stored)
+            found.update(stored)
+
+        # Waits only ever target keys claimed before this call, so jobs cannot wait on each other in a cycle
+        for key, event in waits:
+            if not event.wait(self.wait_timeout):
+                continue
+            with self._lock:
+                value = self._entries.get((endpoint, key))
+            if value is not None:
+                found[key] = value
+                self.coalesced += 1
+        return found
+
+    def put_many(self, endpoint: str, values: Dict[str, Dict]) -> None:
+        """Store results, waking callers waiting for them, and write them through to the backing cache.
+
+        Callers pass only successful lookups; failed keys stay claimed until
+        release() so waiters fetch them again instead of sharing the failure.
+        """
+        self._store(endpoint, values)
+        if self.backing is not None and values:
+            self.backing.put_many(endpoint, values)
+
+    def _store(self, endpoint: str, values: Dict[str, Dict]) -> None:
+        with self._lock:
+            for key, value in values.items():
+                entry_key = (endpoint, key)
+                self._entries[entry_key] = value
+                self._entries.move_to_end(entry_key)
+                event = self._in_flight.pop(entry_key, None)
+                if event is not None:
+                    event.set()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def release(self) -> None:
+        """Drop the calling thread's unfulfilled claims so waiters fetch those keys themselves."""
+        claimed = self._claimed()
+        with self._lock:
+            for entry_key, event in claimed.items():
+                if self._in_flight.get(entry_key) is event:
+                    del self._in_flight[entry_key]
+                event.set()
+        claimed.clear()
+
+    def close(self) -> None:
+        if self.backing is not None:
+            self.backing.close()
+
+
+class AnnotationService:
+    """Runs annotation jobs in one process, sharing the cache, HTTP session and engines between them."""
+
+    def __init__(
+        self,
+        cache: CoalescingCache,
+        workers: int = 4,
+        batch_size: int = 200,
+        engine: Optional[LocalEngine] = None,
+        maf_index: Optional[MafIndex] = None
+    ):
+        self.cache = cache
+        self.workers = workers
+        self.batch_size = batch_size
+        self.engine = engine
+        self.maf_index = maf_index
+        self.jobs = 0
+        self.started = time.time()
+
+    def annotate(self, vcf_file: str, limit: Optional[int] = None, regions: Optional[List[str]] = None) -> List[AnnotationRecord]:
+        """Annotate a VCF on disk; raises ValueError for invalid regions."""
+        parsed_regions = [parse_region(region) for region in regions] if regions else None
+        try:
+            return annotate_vcf(
+                vcf_file,
+                limit=limit,
+                cache=self.cache,
+                workers=self.workers,
+                batch_size=self.batch_size,
+                regions=parsed_regions,
+                engine=self.engine,
+                maf_index=self.maf_index,
+                maf_cache=self.cache
+            )
+        finally:
+            self.cache.release()
+            self.jobs += 1
+
+    def status(self) -> Dict:
+        return {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'jobs': self.jobs,
+            'cached_entries': len(self.cache),
+            'coalesced_lookups': self.cache.coalesced
+        }
+
+
+def annotations_to_tsv(annotations: List[AnnotationRecord]) -> str:
+    """TSV text with the same header and rows as export_to_tsv."""
+    buffer = io.StringIO(newline='')
+    writer = csv.writer(buffer, delimiter='\t')
+    writer.writerow(FIELDNAMES)
+    writer.writerows(map(annotation_row, annotations))
+    return buffer.getvalue()
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_handler(service: AnnotationService):
+    """Request handler class bound to a service.
+
+    POST /annotate takes either a VCF as the request body or JSON with
+    "vcf" (VCF text) or "vcf_path" (a file readable by the server), plus
+    optional "limit" and "regions". It answers with TSV, or JSON rows when
+    the Accept header asks for application/json. GET /health reports job
+    and cache counts and GET /metrics serves Prometheus metrics.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def address_string(self) -> str:
+            # Unix socket peers have no address
+            return self.client_address[0] if self.client_address else 'unix'
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == '/health':
+                return self._send(200, json.dumps(service.status()), 'application/json')
+            if path == '/metrics':
+                return self._send(200, metrics.to_prometheus(), 'text/plain; version=0.0.4')
+            self._send(404, json.dumps({'error': f'Unknown path {path}'}), 'application/json')
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            if path != '/annotate':
+                return self._send(404, json.dumps({'error': f'Unknown path {path}'}), 'application/json')
+
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            started = time.perf_counter()
+            vcf_text = None
+            try:
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    job = json.loads(body or b'{}')
+                    vcf_path = job.get('vcf_path')
+                    if vcf_path is None:
+                        vcf_text = job.get('vcf')
+                        if not vcf_text:
+                            raise ValueError('Request needs "vcf" or "vcf_path"')
+                        vcf_text = vcf_text.encode()
+                    elif not os.path.isfile(vcf_path):
+                        raise ValueError(f'No such file: {vcf_path}')
+                    limit, regions = job.get('limit'), job.get('regions')
+                else:
+                    vcf_text, limit, regions, vcf_path = body, None, None, None
+                    if not vcf_text:
+                        raise ValueError('Empty request body')
+                annotations = self._annotate(vcf_path, vcf_text, limit, regions)
+            except ValueError as e:
+                return self._send(400, json.dumps({'error': str(e)}), 'application/json')
+            except Exception as e:
+                print(f"Job failed: {type(e).__name__}: {e}", file=sys.stderr)
+                return self._send(500, json.dumps({'error': f'{type(e).__name__}: {e}'}), 'application/json')
+
+            print(f"Annotated {len(annotations)} variants in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+            if 'application/json' in self.headers.get('Accept', ''):
+                rows = [annotation.as_dict() for annotation in annotations]
+                self._send(200, json.dumps({'annotations': rows}), 'application/json')
+            else:
+                self._send(200, annotations_to_tsv(annotations), 'text/tab-separated-values')
+
+        def _annotate(self, vcf_path, vcf_text, limit, regions) -> List[AnnotationRecord]:
+            if vcf_path is not None:
+                return service.annotate(vcf_path, limit, regions)
+            suffix = '.vcf.gz' if vcf_text[:2] == GZIP_MAGIC else '.vcf'
+            with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+                f.write(vcf_text)
+                f.flush()
+                return service.annotate(f.name, limit, regions)
+
+        def _send(self, status: int, content: str, content_type: str) -> None:
+            data = content.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+    return Handler
+
+
+def create_server(service: AnnotationService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: Optional[str] = None):
+    """HTTP server for the service on a TCP port, or on a Unix socket when socket_path is given."""
+    handler = make_handler(service)
+    if socket_path is None:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        return server
+    if os.path.exists(socket_path):
+        # Refuse to replace a socket another server is still listening on
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+        else:
+            raise OSError(f"{socket_path} is in use by another server")
+        finally:
+            probe.close()
+    return ThreadingUnixHTTPServer(socket_path, handler)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(service: AnnotationService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: Optional[str] = None) -> None:
+    """Serve annotation jobs until interrupted or terminated."""
+    server = create_server(service, host, port, socket_path)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _interrupt)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"
+    print(f"Annotation server listening on {where}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down", file=sys.stderr)
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
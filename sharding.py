@@ -0,0 +1,126 @@
+import csv
+import hashlib
+import heapq
+import sys
+from contextlib import ExitStack
+from itertools import islice
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from annotator import DEFAULT_WINDOW, FIELDNAMES, annotate_variants, annotation_row, iter_variants
+from metrics import EXPORT_SECONDS, PARSE_SECONDS, VARIANTS_PARSED
+from records import AnnotationRecord
+from vcf_parser import normalize_chrom
+from vep_client import build_hgvs_notation
+
+
+PARTITIONS = ('hash', 'region')
+# Genomic bins assigned to shards as a unit by the region partition
+REGION_BIN_SIZE = 1_000_000
+# Leading column of shard TSVs: the variant's position in the (filtered, limited) VCF
+RECORD_INDEX_COLUMN = 'record_index'
+
+
+def stable_hash(text: str) -> int:
+    """64-bit hash that is the same on every node and Python process."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+
+def shard_of(variant: Mapping, shards: int, partition: str = 'hash') -> int:
+    """Shard number in [0, shards) that owns a variant.
+
+    'hash' spreads variants evenly by HGVS key, so duplicates of one key
+    land on the same shard; 'region' keeps each 1 Mb bin of a chromosome
+    together.
+    """
+    if partition == 'hash':
+        key = build_hgvs_notation(variant['chrom'], variant['pos'], variant['ref'], variant['alt'])
+    elif partition == 'region':
+        key = f"{normalize_chrom(variant['chrom'])}:{variant['pos'] // REGION_BIN_SIZE}"
+    else:
+        raise ValueError(f"Unknown partition: {partition}")
+    return stable_hash(key) % shards
+
+
+def iter_shard_windows(
+    vcf_file: str,
+    shards: int,
+    index: int,
+    partition: str = 'hash',
+    window: int = DEFAULT_WINDOW,
+    limit: Optional[int] = None,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    parse_workers: int = 1,
+    use_mmap: bool = False,
+    **options
+) -> Iterator[List[Tuple[int, AnnotationRecord]]]:
+    """Stream (record index, annotation) pairs for the variants of one shard, `window` at a time.
+
+    Every node reads the whole VCF so record indices agree; `limit` and
+    `regions` must match across shards. Remaining options are passed to
+    annotate_variants.
+    """
+    if not 0 <= index < shards:
+        raise ValueError(f"Shard index {index} out of range for {shards} shards")
+
+    variants = iter_variants(vcf_file, limit, regions, parse_workers, use_mmap)
+    selected = ((i, v) for i, v in enumerate(variants) if shard_of(v, shards, partition) == index)
+    while True:
+        with PARSE_SECONDS.time():
+            chunk = list(islice(selected, window))
+        if not chunk:
+            return
+        VARIANTS_PARSED.inc(len(chunk))
+        annotations = annotate_variants([variant for _, variant in chunk], **options)
+        yield [(record_index, annotation) for (record_index, _), annotation in zip(chunk, annotations)]
+
+
+def export_shard_tsv(windows: Iterable[List[Tuple[int, Mapping]]], output_file: str) -> int:
+    """Write a shard TSV with a leading record index column, returning the row count.
+
+    The header is written even for an empty shard so merge can tell it
+    apart from a missing one.
+    """
+    rows = 0
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow([RECORD_INDEX_COLUMN] + FIELDNAMES)
+        for pairs in windows:
+            with EXPORT_SECONDS.time():
+                writer.writerows((record_index, *annotation_row(annotation)) for record_index, annotation in pairs)
+                f.flush()
+            rows += len(pairs)
+
+    print(f"Shard annotations exported to {output_file} ({rows} rows)", file=sys.stderr)
+    return rows
+
+
+def merge_shard_tsvs(shard_files: List[str], output_file: str) -> int:
+    """K-way merge shard TSVs into one TSV in original VCF order, returning the row count.
+
+    Each shard is already in record index order, so only one row per shard
+    is held in memory.
+    """
+    expected_header = [RECORD_INDEX_COLUMN] + FIELDNAMES
+    with ExitStack() as stack:
+        readers = []
+        for shard_file in shard_files:
+            reader = csv.reader(stack.enter_context(open(shard_file, newline='')), delimiter='\t')
+            if next(reader, None) != expected_header:
+                raise ValueError(f"{shard_file} is not a shard TSV written by this version")
+            readers.append(reader)
+
+        rows = 0
+        last_index = -1
+        with open(output_file, 'w', newline='') as out:
+            writer = csv.writer(out, delimiter='\t')
+            writer.writerow(FIELDNAMES)
+            for row in heapq.merge(*readers, key=lambda row: int(row[0])):
+                record_index = int(row[0])
+                if record_index == last_index:
+                    raise ValueError(f"Record {record_index} appears in more than one shard")
+                last_index = record_index
+                writer.writerow(row[1:])
+                rows += 1
+
+    print(f"Merged {rows} rows from {len(shard_files)} shards into {output_file}", file=sys.stderr)
+    return rows
@@ -1,6 +1,6 @@
 import csv
 import os
-from annotator import annotate_vcf, export_to_tsv, FIELDNAMES
+from annotator import annotate_vcf, export_to_tsv, export_stream_to_tsv, iter_annotation_windows, FIELDNAMES
 
 
 def test_annotate_vcf_basic(tmp_path, mocker):
@@ -25,7 +25,7 @@ def test_annotate_vcf_basic(tmp_path, mocker):
     }]
     
     mocker.patch('annotator.get_variant_effects_batch', return_value=mock_batch_result)
-    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x: x)
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
     
     annotations = annotate_vcf(str(vcf_file))
     
@@ -56,7 +56,7 @@ def test_annotate_vcf_with_limit(tmp_path, mocker):
     ]
     
     mocker.patch('annotator.get_variant_effects_batch', return_value=mock_batch_results)
-    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x: x)
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
     
     annotations = annotate_vcf(str(vcf_file), limit=2)
     
@@ -84,7 +84,7 @@ def test_annotate_vcf_combines_variant_data(tmp_path, mocker):
     }]
     
     mocker.patch('annotator.get_variant_effects_batch', return_value=mock_batch_result)
-    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x: x)
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
     
     annotations = annotate_vcf(str(vcf_file))
     
@@ -146,3 +146,47 @@ def test_export_empty_annotations(tmp_path):
     
     # File should not be created or should be empty
     assert not output_file.exists() or output_file.stat().st_size == 0
+
+
+def test_streaming_export_matches_batch_export(tmp_path, mocker):
+    """Test streaming windows produce byte-identical output to a full run"""
+    vcf_file = tmp_path / "test.vcf"
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        'chr1\t100\trs1\tA\tT\t30\tPASS\tDP=100;RO=60;AO=40;AF=0.4\n'
+        'chr1\t200\t.\tG\tGC\t30\tPASS\tDP=50;RO=0;AO=50;AF=1\n'
+        'chr1\t300\trs3\tT\tA\t30\tPASS\tDP=0\n'
+        'chr2\t400\t.\tCT\tC\t12.5\tPASS\tDP=10;RO=5;AO=5;AF=0.5\n'
+        'chr2\t500\trs5\tA\tG\t30\tPASS\tDP=7;RO=3;AO=4;AF=0.571\n'
+    )
+    
+    def fake_batch(variants, **kwargs):
+        return [{'gene_id': f'ENSG{pos}', 'gene_symbol': f'G{pos}', 'consequence_terms': 'intron_variant',
+                 'rsid': 'N/A', 'maf': 'N/A'} for _, pos, _, _ in variants]
+    
+    mock_batch = mocker.patch('annotator.get_variant_effects_batch', side_effect=fake_batch)
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
+    
+    full_output = tmp_path / "full.tsv"
+    export_to_tsv(annotate_vcf(str(vcf_file)), str(full_output))
+    
+    mock_batch.reset_mock()
+    stream_output = tmp_path / "stream.tsv"
+    rows = export_stream_to_tsv(iter_annotation_windows(str(vcf_file), window=2), str(stream_output))
+    
+    assert rows == 5
+    assert mock_batch.call_count == 3
+    assert stream_output.read_bytes() == full_output.read_bytes()
+
+
+def test_streaming_export_empty(tmp_path, mocker):
+    vcf_file = tmp_path / "test.vcf"
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+    )
+    output_file = tmp_path / "output.tsv"
+    
+    assert export_stream_to_tsv(iter_annotation_windows(str(vcf_file), window=2), str(output_file)) == 0
+    assert not output_file.exists()
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from annotator import annotate_vcf_async
+from async_vep_client import (
+    AsyncEnsemblClient,
+    fetch_maf_batch_async,
+    get_variant_effects_batch_async,
+    enrich_with_population_maf_async
+)
+from metrics import VARIANTS_PARSED
+from vep_cache import NegativeCache
+
+
+class FakeEnsemblHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+    throttle_next = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        FakeEnsemblHandler.requests_seen.append((self.path, body))
+        
+        if FakeEnsemblHandler.throttle_next:
+            FakeEnsemblHandler.throttle_next -= 1
+            return self._send(429, {'error': 'Too many requests'}, {'Retry-After': '0'})
+        
+        if self.path == '/vep/human/hgvs':
+            payload = []
+            for hgvs in body['hgvs_notations']:
+                if 'del' in hgvs:
+                    payload.append({'input': hgvs, 'error': 'Unable to parse'})
+                else:
+                    payload.append({'input': hgvs, 'colocated_variants': [{'id': 'rs1'}], 'transcript_consequences': [
+                        {'gene_id': 'ENSG1', 'gene_symbol': 'GENE1', 'consequence_terms': ['missense_variant']}
+                    ]})
+            return self._send(200, payload)
+        if self.path == '/vep/human/region':
+            return self._send(200, [{'input': v, 'transcript_consequences': [
+                {'gene_id': 'ENSG2', 'gene_symbol': 'GENE2', 'consequence_terms': ['frameshift_variant']}
+            ]} for v in body['variants']])
+        if self.path == '/variation/human':
+            if 'rs0' in body['ids']:
+                return self._send(400, {'error': 'Bad request'})
+            return self._send(200, {rsid: {'MAF': 0.25} for rsid in body['ids']})
+        self._send(404, {'error': 'Not found'})
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_ensembl(mocker):
+    FakeEnsemblHandler.requests_seen = []
+    FakeEnsemblHandler.throttle_next = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeEnsemblHandler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    mocker.patch('vep_client.BASE_URL', f'http://127.0.0.1:{server.server_address[1]}')
+    mocker.patch('vep_client.negative_cache', NegativeCache())
+    yield FakeEnsemblHandler
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_batch_with_region_fallback(fake_ensembl):
+    variants = [('chr1', 100, 'G', 'A'), ('chr1', 200, 'AT', 'A'), ('chr2', 300, 'C', 'T')]
+    
+    results = asyncio.run(get_variant_effects_batch_async(variants, batch_size=2))
+    
+    assert [r['gene_symbol'] for r in results] == ['GENE1', 'GENE2', 'GENE1']
+    assert [path for path, _ in fake_ensembl.requests_seen].count('/vep/human/hgvs') == 2
+    assert ('/vep/human/region', {'variants': ['1 200 . AT A . . .']}) in fake_ensembl.requests_seen
+
+
+def test_async_client_retries_throttled_requests(fake_ensembl):
+    fake_ensembl.throttle_next = 1
+    
+    async def run():
+        async with AsyncEnsemblClient() as client:
+            results = await get_variant_effects_batch_async([('chr1', 100, 'G', 'A')], client=client)
+            return results, client.retries
+    
+    results, retries = asyncio.run(run())
+    
+    assert results[0]['gene_symbol'] == 'GENE1'
+    assert retries == 1
+
+
+def test_async_client_reuses_connections(fake_ensembl):
+    async def run():
+        async with AsyncEnsemblClient(max_concurrency=1) as client:
+            for _ in range(3):
+                await client.post(f"{__import__('vep_client').BASE_URL}/variation/human", json_body={'ids': ['rs1']})
+            return sum(len(conns) for conns in client._idle.values())
+    
+    assert asyncio.run(run()) == 1
+
+
+def test_async_maf_enrichment(fake_ensembl):
+    annotations = [{'rsid': 'rs1', 'maf': 'N/A'}, {'rsid': 'N/A', 'maf': 'N/A'}, {'rsid': 'rs1', 'maf': 'N/A'}]
+    
+    result = asyncio.run(enrich_with_population_maf_async(annotations))
+    
+    assert [a['maf'] for a in result] == ['0.2500', 'N/A', '0.2500']
+    assert fake_ensembl.requests_seen == [('/variation/human', {'ids': ['rs1']})]
+
+
+def test_async_maf_batch_leaves_out_failed_lookups(fake_ensembl):
+    async def run():
+        async with AsyncEnsemblClient() as client:
+            return await fetch_maf_batch_async(client, ['rs1', 'rs0', 'rs2'])
+    
+    # rs0 fails on its own after the chunk is split, and is not reported as a MAF value
+    assert asyncio.run(run()) == {'rs1': '0.2500', 'rs2': '0.2500'}
+
+
+def test_annotate_vcf_async(tmp_path, fake_ensembl):
+    vcf_file = tmp_path / "test.vcf"
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        'chr1\t100\t.\tG\tA\t30\tPASS\tDP=100;RO=60;AO=40;AF=0.4\n'
+    )
+    
+    VARIANTS_PARSED.reset()
+    annotations = asyncio.run(annotate_vcf_async(str(vcf_file)))
+    
+    assert len(annotations) == 1
+    # The VCF is parsed once even though the client is opened here
+    assert VARIANTS_PARSED.value == 1
+    assert annotations[0]['gene_symbol'] == 'GENE1'
+    assert annotations[0]['rsid'] == 'rs1'
+    assert annotations[0]['maf'] == '0.2500'
+    assert annotations[0]['variant_percentage'] == 40.0
@@ -0,0 +1,28 @@
+import pytest
+from batch_sizing import AdaptiveBatchSizer
+
+
+def test_healthy_batches_grow_additively():
+    sizer = AdaptiveBatchSizer(initial=100, max_size=140, increase_step=25)
+    
+    assert sizer.record(100, latency=1.0) == 125
+    assert sizer.record(125, latency=1.0) == 140
+
+
+def test_timeout_halves_batch_size():
+    sizer = AdaptiveBatchSizer(initial=200, min_size=25)
+    
+    assert sizer.record(200, latency=120.0, timed_out=True) == 100
+
+
+def test_slow_or_failing_batches_shrink_to_lower_bound():
+    sizer = AdaptiveBatchSizer(initial=60, min_size=25, target_latency=10.0, max_error_fraction=0.2)
+    
+    assert sizer.record(60, latency=15.0) == 30
+    assert sizer.record(30, latency=1.0, error_fraction=0.5) == 25
+
+
+def test_initial_size_clamped_to_bounds():
+    assert AdaptiveBatchSizer(initial=1000, max_size=300).size == 300
+    with pytest.raises(ValueError):
+        AdaptiveBatchSizer(min_size=50, max_size=10)
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+import batch_stats
+from batch_stats import calculate_read_statistics_batch, determine_variant_types_batch
+from vcf_parser import calculate_read_statistics, determine_variant_type, parse_info
+
+
+np = pytest.importorskip('numpy')
+
+
+def typed(results):
+    return [{key: (type(value), value) for key, value in result.items()} for result in results]
+
+
+def test_batch_read_statistics_match_scalar():
+    rng = random.Random(7)
+    infos = ['DP=0', 'DP=100;RO=0;AO=0', 'DP=8;RO=7;AO=1;AF=0.125', 'DP=800;AO=1;AF=0.00005',
+             'DP=3;RO=1;AO=2;AF=1', 'DP=10.5;RO=2;AO=3.5;AF=0.33335', 'AF=0.5', 'DP=.;AO=1', 'DP;AO=1', '']
+    for _ in range(2000):
+        dp = rng.randint(0, 1000)
+        infos.append(f"DP={dp};RO={rng.randint(0, dp)};AO={rng.randint(0, dp)};AF={rng.randint(0, 10**6) / 10**6}")
+    variants = [{'info': parse_info(info)} for info in infos]
+    
+    scalar = []
+    for variant in variants:
+        try:
+            scalar.append(calculate_read_statistics(variant))
+        except TypeError:
+            scalar.append(None)
+    batchable = [v for v, s in zip(variants, scalar) if s is not None]
+    
+    assert typed(calculate_read_statistics_batch(batchable)) == typed([s for s in scalar if s is not None])
+
+
+def test_round_like_python_handles_halfway_values():
+    values = [0.125, 2.675, 1.005, 0.375, 12.345, -0.125, 1e6 + 0.005]
+    
+    assert batch_stats.round_like_python(np.array(values), 2) == [round(v, 2) for v in values]
+
+
+def test_batch_variant_types_match_scalar():
+    pairs = [('A', 'T'), ('A', 'AT'), ('AT', 'A'), ('AAA', '<A>'), ('AAA', '[A]'), ('AA', 'TT'), ('<DEL>', 'A')]
+    refs, alts = zip(*pairs)
+    
+    assert determine_variant_types_batch(list(refs), list(alts)) == [determine_variant_type(r, a) for r, a in pairs]
+
+
+def test_batch_functions_fall_back_without_numpy(mocker):
+    mocker.patch('batch_stats.np', None)
+    variants = [{'info': parse_info('DP=8;RO=7;AO=1;AF=0.125')}]
+    
+    assert calculate_read_statistics_batch(variants) == [calculate_read_statistics(variants[0])]
+    assert determine_variant_types_batch(['A'], ['AT']) == ['Insertion']
@@ -0,0 +1,72 @@
+import json
+
+import requests
+
+from benchmarks.bench_parser import CASES, DEFAULT_BASELINE, DEFAULT_SIZES, compare_to_baseline, run_benchmarks
+from benchmarks.bench_throughput import write_synthetic_vcf
+from benchmarks.mock_ensembl import MockEnsemblServer
+from vcf_parser import parse_header, parse_variants
+from vep_cache import NegativeCache
+from vep_client import get_variant_effects_batch
+
+
+def test_mock_server_serves_vep_with_region_fallback(mocker):
+    with MockEnsemblServer(entry_error_rate=1.0) as server:
+        mocker.patch('vep_client.BASE_URL', server.url)
+        mocker.patch('vep_client.negative_cache', NegativeCache())
+        
+        results = get_variant_effects_batch([('1', 100, 'G', 'A'), ('2', 200, 'C', 'T')])
+        stats = server.stats()
+    
+    assert all(result['gene_id'].startswith('ENSG') for result in results)
+    assert stats['requests'] == {'/vep/human/hgvs': 1, '/vep/human/region': 1}
+    assert stats['bytes_sent'] > 0
+
+
+def test_mock_server_errors_and_rate_limit():
+    with MockEnsemblServer(error_rate=1.0) as server:
+        assert requests.post(f'{server.url}/variation/human', json={'ids': ['rs1']}).status_code == 503
+        assert server.stats()['server_errors'] == 1
+    
+    with MockEnsemblServer(rate_limit=1) as server:
+        statuses = [requests.post(f'{server.url}/variation/human', json={'ids': ['rs1']}).status_code for _ in range(2)]
+        assert statuses == [200, 429]
+        assert server.stats()['throttled'] == 1
+
+
+def test_synthetic_vcf_is_sorted_and_parseable(tmp_path):
+    vcf_file = write_synthetic_vcf(str(tmp_path / 'synthetic.vcf'), 500)
+    
+    _, samples = parse_header(vcf_file)
+    variants = list(parse_variants(vcf_file, samples))
+    
+    assert len(variants) == 500
+    keys = [(int(v['chrom']), v['pos']) for v in variants]
+    assert keys == sorted(keys)
+
+
+def test_parser_benchmark_times_every_case():
+    results = run_benchmarks([50], repeat=1)
+    
+    assert set(results) == {f'{name}[50]' for name in CASES}
+    assert all(result['seconds'] > 0 and result['calibration_us'] > 0 for result in results.values())
+
+
+def test_parser_baselines_cover_every_gated_case():
+    with open(DEFAULT_BASELINE) as f:
+        baseline = json.load(f)
+    
+    assert set(baseline) == {f'{name}[{size}]' for name in CASES for size in DEFAULT_SIZES}
+
+
+def test_parser_benchmark_flags_regressions_relative_to_calibration():
+    baseline = {'parse_info[1000]': {'us_per_row': 10.0, 'calibration_us': 2.0}}
+    
+    # Twice as slow on a host twice as slow is not a regression
+    assert compare_to_baseline({'parse_info[1000]': {'us_per_row': 20.0, 'calibration_us': 4.0}}, baseline, 0.25) == []
+    regressions = compare_to_baseline(
+        {'parse_info[1000]': {'us_per_row': 13.0, 'calibration_us': 2.0}, 'new_case[1000]': {'us_per_row': 1.0, 'calibration_us': 2.0}},
+        baseline,
+        0.25
+    )
+    assert len(regressions) == 1 and regressions[0].startswith('parse_info[1000]')
@@ -0,0 +1,108 @@
+import gzip
+
+from bgzf import (
+    BgzfReader,
+    BgzfWriter,
+    TabixIndex,
+    bgzip_and_index,
+    merge_intervals,
+    reg2bin,
+    reg2bins,
+    tabix_fetch
+)
+
+
+HEADER = '##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+
+
+def write_vcf(path, records):
+    lines = [f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t30\tPASS\tDP=10\n" for chrom, pos, ref, alt in records]
+    path.write_text(HEADER + ''.join(lines))
+    return str(path)
+
+
+def test_reg2bin_matches_reg2bins():
+    assert reg2bin(0, 1) == 4681
+    assert reg2bin(0, 1 << 29) == 0
+    for beg, end in [(0, 1), (16383, 16385), (1 << 20, (1 << 20) + 5000)]:
+        assert reg2bin(beg, end) in reg2bins(beg, end)
+
+
+def test_merge_intervals():
+    assert merge_intervals([(50, 60), (1, 10), (5, 20), (21, 30)]) == [(1, 30), (50, 60)]
+
+
+def test_bgzf_writer_output_is_gzip_readable(tmp_path):
+    path = str(tmp_path / 'data.gz')
+    data = b''.join(f"line {i}\n".encode() for i in range(20000))
+    with BgzfWriter(path) as writer:
+        writer.write(data)
+
+    with gzip.open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_bgzf_reader_seeks_to_virtual_offsets(tmp_path):
+    path = str(tmp_path / 'data.gz')
+    offsets = []
+    with BgzfWriter(path) as writer:
+        for i in range(20000):
+            offsets.append(writer.tell())
+            writer.write(f"line {i}\n".encode())
+
+    with BgzfReader(path) as reader:
+        for i in (0, 7000, 19998):
+            reader.seek(offsets[i])
+            assert reader.readline() == f"line {i}\n".encode()
+            assert reader.tell() == offsets[i + 1]
+        reader.seek(offsets[-1])
+        reader.readline()
+        assert reader.readline() == b''
+
+
+def test_bgzip_and_index_round_trip(tmp_path):
+    records = [('1', pos, 'A', 'T') for pos in range(1000, 3000000, 1000)]
+    records += [('2', pos, 'AC', 'A') for pos in range(500, 100000, 500)]
+    vcf = write_vcf(tmp_path / 'in.vcf', records)
+    output = str(tmp_path / 'in.vcf.gz')
+
+    index_file = bgzip_and_index(vcf, output)
+    index = TabixIndex.load(index_file)
+
+    assert index_file == output + '.tbi'
+    assert index.names == ['1', '2']
+    with gzip.open(output, 'rt') as f:
+        assert f.read() == open(vcf).read()
+
+
+def test_tabix_fetch_returns_overlapping_records(tmp_path):
+    records = [('1', pos, 'A', 'T') for pos in range(1000, 3000000, 1000)]
+    records += [('2', 1000, 'ACGTACGTAC', 'A'), ('2', 5000, 'G', 'C')]
+    vcf = write_vcf(tmp_path / 'in.vcf', records)
+    output = str(tmp_path / 'in.vcf.gz')
+    bgzip_and_index(vcf, output)
+
+    lines = list(tabix_fetch(output, [('1', 2500000, 2502000), ('2', 1005, 1005), ('1', 999, 1000)]))
+
+    assert [line.split('\t')[:2] for line in lines] == [
+        ['1', '1000'], ['1', '2500000'], ['1', '2501000'], ['1', '2502000'], ['2', '1000']
+    ]
+
+
+def test_tabix_fetch_resolves_chr_prefix_and_unknown_contigs(tmp_path):
+    vcf = write_vcf(tmp_path / 'in.vcf', [('1', 100, 'A', 'T')])
+    output = str(tmp_path / 'in.vcf.gz')
+    bgzip_and_index(vcf, output)
+
+    assert len(list(tabix_fetch(output, [('chr1', 1, 200)]))) == 1
+    assert list(tabix_fetch(output, [('X', 1, 200)])) == []
+
+
+def test_tabix_fetch_returns_each_record_once(tmp_path):
+    vcf = write_vcf(tmp_path / 'in.vcf', [('1', 100, 'ACGTACGTAC', 'A'), ('1', 200, 'A', 'T')])
+    output = str(tmp_path / 'in.vcf.gz')
+    bgzip_and_index(vcf, output)
+
+    lines = list(tabix_fetch(output, [('1', 101, 102), ('1', 105, 106), ('1', 150, 300)]))
+
+    assert [line.split('\t')[1] for line in lines] == ['100', '200']
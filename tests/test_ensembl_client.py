@@ -0,0 +1,121 @@
+import pytest
+import requests
+import responses
+from ensembl_client import EnsemblClient, parse_seconds
+
+
+URL = 'https://grch37.rest.ensembl.org/vep/human/hgvs'
+
+
+@pytest.fixture
+def mock_sleep(mocker):
+    return mocker.patch('ensembl_client.time.sleep')
+
+
+def test_parse_seconds():
+    assert parse_seconds('1.5') == 1.5
+    assert parse_seconds(None) is None
+    assert parse_seconds('soon') is None
+
+
+def test_session_is_pooled():
+    client = EnsemblClient(pool_size=7)
+    adapter = client.session.get_adapter(URL)
+    assert adapter._pool_maxsize == 7
+    assert client.session.headers['Connection'] == 'keep-alive'
+
+
+@responses.activate
+def test_retry_after_is_honored(mock_sleep):
+    responses.add(responses.POST, URL, status=429, headers={'Retry-After': '2'})
+    responses.add(responses.POST, URL, json=[], status=200)
+    
+    client = EnsemblClient()
+    response = client.post(URL, json={})
+    
+    assert response.status_code == 200
+    assert client.retries == 1
+    mock_sleep.assert_called_once_with(2.0)
+
+
+@responses.activate
+def test_backoff_on_service_unavailable(mock_sleep, mocker):
+    mocker.patch('ensembl_client.random.uniform', side_effect=lambda low, high: high)
+    responses.add(responses.POST, URL, status=503)
+    responses.add(responses.POST, URL, status=503)
+    responses.add(responses.POST, URL, json=[], status=200)
+    
+    client = EnsemblClient(backoff_base=0.5)
+    response = client.post(URL, json={})
+    
+    assert response.status_code == 200
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 1.0]
+
+
+@responses.activate
+def test_gives_up_after_max_retries(mock_sleep):
+    responses.add(responses.POST, URL, status=503)
+    
+    client = EnsemblClient(max_retries=2)
+    response = client.post(URL, json={})
+    
+    assert response.status_code == 503
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_non_retryable_status_returned_immediately(mock_sleep):
+    responses.add(responses.POST, URL, json={'error': 'Bad request'}, status=400)
+    
+    response = EnsemblClient().post(URL, json={})
+    
+    assert response.status_code == 400
+    mock_sleep.assert_not_called()
+
+
+@responses.activate
+def test_connection_errors_are_retried_then_raised(mock_sleep):
+    responses.add(responses.POST, URL, body=requests.exceptions.ConnectionError('reset'))
+    
+    client = EnsemblClient(max_retries=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(URL, json={})
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_exhausted_quota_pauses_next_request(mock_sleep, mocker):
+    mocker.patch('ensembl_client.time.monotonic', return_value=100.0)
+    responses.add(responses.GET, URL, json={}, status=200,
+                  headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '3'})
+    
+    client = EnsemblClient()
+    client.get(URL)
+    mock_sleep.assert_not_called()
+    client.get(URL)
+    
+    mock_sleep.assert_called_once_with(3.0)
+
+
+@responses.activate
+def test_timeouts_can_be_raised_without_retrying(mock_sleep):
+    responses.add(responses.POST, URL, body=requests.exceptions.ReadTimeout('slow'))
+    
+    client = EnsemblClient()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.post(URL, json={}, retry_timeouts=False)
+    assert len(responses.calls) == 1
+    mock_sleep.assert_not_called()
+
+
+@responses.activate
+def test_last_attempt_seconds_excludes_backoff(mock_sleep, mocker):
+    # Each attempt starts and ends on successive clock readings; the backoff sleep is mocked out
+    mocker.patch('ensembl_client.time.monotonic', side_effect=[0.0, 0.0, 1.0, 1.0, 1.0, 1.5])
+    responses.add(responses.POST, URL, status=503)
+    responses.add(responses.POST, URL, json=[], status=200)
+    
+    client = EnsemblClient()
+    client.post(URL, json={})
+    
+    assert client.last_attempt_seconds() == 0.5
@@ -0,0 +1,60 @@
+from journal import Journal, journal_path_for
+
+
+def test_journal_path_for():
+    assert journal_path_for('data/output.tsv') == 'data/output.tsv.journal'
+
+
+def test_journal_resume_restores_records(tmp_path):
+    path = str(tmp_path / 'out.tsv.journal')
+    journal = Journal(path)
+    journal.record_vep({'1:g.100G>A': {'gene_id': 'ENSG1'}})
+    journal.record_maf({'rs1': '0.1000'})
+    journal.close()
+    
+    resumed = Journal(path, resume=True)
+    
+    assert resumed.vep == {'1:g.100G>A': {'gene_id': 'ENSG1'}}
+    assert resumed.maf == {'rs1': '0.1000'}
+
+
+def test_journal_keeps_new_records_on_disk_only(tmp_path):
+    path = str(tmp_path / 'out.tsv.journal')
+    journal = Journal(path)
+    journal.record_vep({'1:g.100G>A': {'gene_id': 'ENSG1'}})
+    journal.record_maf({'rs1': '0.1000'})
+    
+    assert (journal.vep, journal.maf) == ({}, {})
+    journal.close()
+    assert Journal(path, resume=True).maf == {'rs1': '0.1000'}
+
+
+def test_journal_without_resume_starts_fresh(tmp_path):
+    path = str(tmp_path / 'out.tsv.journal')
+    Journal(path).record_maf({'rs1': '0.1000'})
+    
+    assert Journal(path).maf == {}
+    assert Journal(path, resume=True).maf == {}
+
+
+def test_journal_drops_torn_trailing_record(tmp_path):
+    path = tmp_path / 'out.tsv.journal'
+    journal = Journal(str(path))
+    journal.record_maf({'rs1': '0.1000'})
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"type": "maf", "mafs": {"rs2"')
+    
+    resumed = Journal(str(path), resume=True)
+    resumed.record_maf({'rs3': '0.3000'})
+    resumed.close()
+    
+    assert Journal(str(path), resume=True).maf == {'rs1': '0.1000', 'rs3': '0.3000'}
+
+
+def test_journal_remove(tmp_path):
+    path = tmp_path / 'out.tsv.journal'
+    journal = Journal(str(path))
+    journal.remove()
+    
+    assert not path.exists()
@@ -0,0 +1,89 @@
+import pytest
+
+from annotator import annotate_vcf
+from local_engine import GeneIndex, LocalEngine, load_or_build_index, variant_span
+
+
+GTF = ''.join('\t'.join(fields) + '\n' for fields in [
+    ['#!genome-build GRCh37.p13'],
+    ['1', 'ensembl', 'gene', '1000', '5000', '.', '+', '.', 'gene_id "ENSG1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'transcript', '1000', '5000', '.', '+', '.', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'exon', '1000', '1200', '.', '+', '.', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'exon', '3000', '3200', '.', '+', '.', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'exon', '4800', '5000', '.', '+', '.', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'CDS', '1100', '1200', '.', '+', '0', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'CDS', '3000', '3200', '.', '+', '0', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'CDS', '4800', '4900', '.', '+', '0', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'stop_codon', '4901', '4903', '.', '+', '0', 'gene_id "ENSG1"; transcript_id "ENST1"; gene_name "GENEA";'],
+    ['1', 'ensembl', 'exon', '20000', '20100', '.', '-', '.', 'gene_id "ENSG2"; transcript_id "ENST2"; gene_name "GENEB";'],
+    ['1', 'ensembl', 'exon', '20900', '21000', '.', '-', '.', 'gene_id "ENSG2"; transcript_id "ENST2"; gene_name "GENEB";'],
+])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    gtf_file = tmp_path / 'genes.gtf'
+    gtf_file.write_text(GTF)
+    return LocalEngine.from_gtf(str(gtf_file))
+
+
+def test_variant_span_drops_anchor_base():
+    assert variant_span(100, 'A', 'T') == (100, 100)
+    assert variant_span(100, 'GAT', 'G') == (101, 102)
+    assert variant_span(100, 'G', 'GTT') == (100, 101)
+
+
+@pytest.mark.parametrize('chrom, pos, ref, alt, gene_symbol, term', [
+    ('1', 1050, 'A', 'T', 'GENEA', '5_prime_UTR_variant'),
+    ('1', 1150, 'A', 'T', 'GENEA', 'coding_sequence_variant'),
+    ('1', 1199, 'GA', 'G', 'GENEA', 'coding_sequence_variant'),
+    ('1', 1200, 'GA', 'G', 'GENEA', 'intron_variant'),
+    ('1', 4950, 'A', 'T', 'GENEA', '3_prime_UTR_variant'),
+    ('chr1', 500, 'A', 'T', 'GENEA', 'upstream_gene_variant'),
+    ('1', 7000, 'A', 'T', 'GENEA', 'downstream_gene_variant'),
+    ('1', 20050, 'A', 'T', 'GENEB', 'non_coding_transcript_exon_variant'),
+    ('1', 22000, 'A', 'T', 'GENEB', 'upstream_gene_variant'),
+])
+def test_local_engine_consequences(engine, chrom, pos, ref, alt, gene_symbol, term):
+    result = engine.annotate(chrom, pos, ref, alt)
+    
+    assert result['gene_symbol'] == gene_symbol
+    assert result['consequence_terms'] == term
+    assert set(result) == {'gene_id', 'gene_symbol', 'consequence_terms', 'rsid', 'maf'}
+
+
+def test_local_engine_intergenic_and_unknown_chrom(engine):
+    assert engine.annotate('1', 100000, 'A', 'T')['gene_id'] == 'N/A'
+    assert engine.annotate('2', 1150, 'A', 'T')['consequence_terms'] == 'N/A'
+
+
+def test_index_is_saved_and_reloaded(tmp_path, mocker):
+    gtf_file = tmp_path / 'genes.gtf'
+    gtf_file.write_text(GTF)
+    built = load_or_build_index(str(gtf_file))
+    
+    from_gtf = mocker.spy(GeneIndex, 'from_gtf')
+    loaded = load_or_build_index(str(gtf_file))
+    
+    assert from_gtf.call_count == 0
+    assert (tmp_path / 'genes.gtf.idx').exists()
+    assert loaded.genes == built.genes
+    assert LocalEngine(loaded).annotate('1', 3100, 'A', 'T') == LocalEngine(built).annotate('1', 3100, 'A', 'T')
+
+
+def test_annotate_vcf_with_local_engine_skips_vep_api(tmp_path, engine, mocker):
+    vcf_file = tmp_path / 'test.vcf'
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        'chr1\t1150\trs1\tA\tT\t30\tPASS\tDP=100\n'
+    )
+    vep_batch = mocker.patch('annotator.get_variant_effects_batch')
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
+    
+    annotations = annotate_vcf(str(vcf_file), engine=engine)
+    
+    vep_batch.assert_not_called()
+    assert annotations[0]['gene_id'] == 'ENSG1'
+    assert annotations[0]['consequence_terms'] == 'coding_sequence_variant'
+    assert annotations[0]['rsid'] == 'rs1'
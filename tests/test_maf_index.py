@@ -0,0 +1,73 @@
+import pytest
+import responses
+
+from maf_index import MafIndex, build_index, encode_maf, site_maf
+from vep_client import enrich_with_population_maf
+
+
+SITES = (
+    '##fileformat=VCFv4.2\n'
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+    '1\t100\trs1\tA\tG\t.\tPASS\tAC=10;AF=0.1\n'
+    '1\t100\trs2\tA\tAT\t.\tPASS\tAF=0.6\n'
+    '1\t200\trs3;rs33\tC\tT,G\t.\tPASS\tAF=0.2,0.05\n'
+    '2\t50\t.\tG\tA\t.\tPASS\tAC=3\n'
+    'X\t75\trs7\tT\tC\t.\tPASS\tAF=0.00005\n'
+)
+
+
+@pytest.fixture
+def maf_index(tmp_path):
+    sites = tmp_path / 'sites.vcf'
+    sites.write_text(SITES)
+    index_file = str(tmp_path / 'sites.mafidx')
+    counts = build_index(str(sites), index_file)
+    assert counts == {'variants': 5, 'rsids': 5, 'skipped': 1}
+    with MafIndex(index_file) as index:
+        yield index
+
+
+def test_site_maf_and_encoding():
+    assert site_maf([0.6]) == pytest.approx(0.4)
+    assert site_maf([0.2, 0.05]) == 0.2
+    assert encode_maf(0.00005) == 1  # same digits as f'{0.00005:.4f}'
+    assert encode_maf(0.12345678) == 1235
+
+
+def test_lookup_by_allele(maf_index):
+    assert maf_index.lookup_variant('chr1', 100, 'A', 'G') == '0.1000'
+    assert maf_index.lookup_variant('1', 100, 'A', 'AT') == '0.4000'
+    assert maf_index.lookup_variant('1', 200, 'C', 'G') == '0.2000'
+    assert maf_index.lookup_variant('1', 200, 'C', 'A') is None
+    assert maf_index.lookup_variant('2', 50, 'G', 'A') is None
+    assert maf_index.lookup_variant('Y', 1, 'G', 'A') is None
+
+
+def test_lookup_by_rsid(maf_index):
+    assert maf_index.lookup_rsid('rs33') == '0.2000'
+    assert maf_index.lookup_rsid('rs7') == '0.0001'
+    assert maf_index.lookup_rsid('rs4') is None
+    assert maf_index.lookup_rsid('N/A') is None
+    assert maf_index.lookup('1', 999, 'A', 'G', rsid='rs2') == '0.4000'
+
+
+def test_build_rejects_unsorted_sites(tmp_path):
+    sites = tmp_path / 'sites.vcf'
+    sites.write_text('1\t200\t.\tA\tG\t.\tPASS\tAF=0.1\n1\t100\t.\tA\tG\t.\tPASS\tAF=0.1\n')
+    
+    with pytest.raises(ValueError):
+        build_index(str(sites), str(tmp_path / 'sites.mafidx'))
+
+
+@responses.activate
+def test_enrich_with_local_index_makes_no_requests(maf_index):
+    annotations = [
+        {'chromosome': 'chr1', 'position': 100, 'reference': 'A', 'alternate': 'G', 'rsid': 'N/A', 'maf': 'N/A'},
+        {'chromosome': '1', 'position': 500, 'reference': 'A', 'alternate': 'G', 'rsid': 'rs33', 'maf': 'N/A'},
+        {'chromosome': '1', 'position': 600, 'reference': 'A', 'alternate': 'G', 'rsid': 'rs999', 'maf': 'N/A'},
+    ]
+    
+    result = enrich_with_population_maf(annotations, maf_index=maf_index)
+    
+    assert [a['maf'] for a in result] == ['0.1000', '0.2000', 'N/A']
+    assert len(responses.calls) == 0
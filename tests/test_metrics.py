@@ -0,0 +1,140 @@
+import json
+
+import pytest
+import responses
+
+import metrics as metrics_module
+from ensembl_client import EnsemblClient
+from metrics import MetricsRegistry, PeriodicWriter, metrics
+from vep_client import get_variant_effects_batch
+
+
+URL = 'https://grch37.rest.ensembl.org/vep/human/hgvs'
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counter_and_histogram_snapshot():
+    registry = MetricsRegistry()
+    requests_total = registry.counter('requests_total', 'Requests')
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+
+    requests_total.inc()
+    requests_total.inc(2)
+    for value in (0.05, 0.5, 0.7, 5.0):
+        latency.observe(value)
+
+    snapshot = registry.snapshot()
+    assert snapshot['requests_total'] == 3
+    assert snapshot['latency_seconds'] == {
+        'count': 4,
+        'sum': pytest.approx(6.25),
+        'buckets': {'0.1': 1, '1.0': 3, '+Inf': 4}
+    }
+    assert snapshot['cache_hit_ratio'] is None
+    assert registry.counter('requests_total', 'Requests') is requests_total
+
+
+def test_counter_time_adds_elapsed_seconds(mocker):
+    mocker.patch('metrics.time.perf_counter', side_effect=[10.0, 12.5])
+    seconds = MetricsRegistry().counter('stage_seconds_total', 'Stage')
+
+    with seconds.time():
+        pass
+
+    assert seconds.value == 2.5
+
+
+def test_gauge_keeps_latest_value():
+    registry = MetricsRegistry()
+    batch_size = registry.gauge('batch_size', 'Batch size')
+
+    batch_size.set(200)
+    batch_size.set(100)
+
+    assert registry.snapshot()['batch_size'] == 100
+    assert '# TYPE variant_annotator_batch_size gauge\nvariant_annotator_batch_size 100' in registry.to_prometheus()
+
+
+def test_cache_hit_ratio():
+    registry = MetricsRegistry()
+    registry.counter('cache_hits_total', 'Hits').inc(3)
+    registry.counter('cache_misses_total', 'Misses').inc(1)
+
+    assert registry.snapshot()['cache_hit_ratio'] == 0.75
+
+
+def test_prometheus_format():
+    registry = MetricsRegistry()
+    registry.counter('retries_total', 'Retries').inc(2)
+    registry.histogram('latency_seconds', 'Latency', buckets=(1.0,)).observe(0.5)
+
+    text = registry.to_prometheus()
+
+    assert '# TYPE variant_annotator_retries_total counter\nvariant_annotator_retries_total 2.0\n' in text
+    assert 'variant_annotator_latency_seconds_bucket{le="1.0"} 1' in text
+    assert 'variant_annotator_latency_seconds_bucket{le="+Inf"} 1' in text
+    assert 'variant_annotator_latency_seconds_count 1' in text
+
+
+def test_write_picks_format_from_extension(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter('retries_total', 'Retries').inc()
+
+    registry.write(str(tmp_path / 'metrics.json'))
+    registry.write(str(tmp_path / 'metrics.prom'))
+
+    assert json.loads((tmp_path / 'metrics.json').read_text())['metrics']['retries_total'] == 1
+    assert (tmp_path / 'metrics.prom').read_text().startswith('# HELP variant_annotator_retries_total')
+    assert not (tmp_path / 'metrics.json.tmp').exists()
+
+
+def test_periodic_writer_writes_final_values_on_stop(tmp_path):
+    registry = MetricsRegistry()
+    counter = registry.counter('variants_total', 'Variants')
+    path = str(tmp_path / 'metrics.json')
+
+    writer = PeriodicWriter(registry, path, interval=3600).start()
+    counter.inc(5)
+    writer.stop()
+
+    assert json.loads(open(path).read())['metrics']['variants_total'] == 5
+
+
+@responses.activate
+def test_client_counts_requests_retries_and_bytes(mocker):
+    mocker.patch('ensembl_client.time.sleep')
+    responses.add(responses.POST, URL, status=503)
+    responses.add(responses.POST, URL, body='[]', status=200)
+
+    EnsemblClient().post(URL, json={'hgvs_notations': []})
+
+    assert metrics_module.HTTP_REQUESTS.value == 2
+    assert metrics_module.HTTP_RETRIES.value == 1
+    assert metrics_module.HTTP_BYTES_SENT.value == 2 * len(b'{"hgvs_notations": []}')
+    assert metrics_module.HTTP_BYTES_RECEIVED.value == 2
+
+
+@responses.activate
+def test_batch_records_latency_fallback_and_cache_misses(mocker):
+    mocker.patch('vep_client.client.rate_limiter', None)
+    responses.add(responses.POST, URL, json=[
+        {'input': '1:g.100A>G', 'transcript_consequences': [{'gene_id': 'ENSG1', 'consequence_terms': ['x']}]},
+        {'input': '1:g.200_201delinsT', 'error': 'Unable to parse'}
+    ])
+    responses.add(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/region', json=[])
+
+    get_variant_effects_batch([('1', 100, 'A', 'G'), ('1', 200, 'AC', 'T')])
+
+    snapshot = metrics.snapshot()
+    assert snapshot['vep_batches_total'] == 1
+    assert snapshot['vep_batch_size'] == 200
+    assert snapshot['vep_batch_latency_seconds']['count'] == 1
+    assert snapshot['vep_fallback_variants_total'] == 1
+    assert snapshot['cache_misses_total'] == 2
+    assert snapshot['cache_hit_ratio'] == 0.0
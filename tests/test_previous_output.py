@@ -0,0 +1,69 @@
+import pytest
+
+from annotator import annotate_vcf, export_to_tsv
+from previous_output import PreviousOutput
+from vep_client import create_error_response
+
+
+HEADER = '##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+
+
+def fake_effects(variants, **kwargs):
+    return [{'gene_id': f'ENSG{pos}', 'gene_symbol': f'GENE{pos}', 'consequence_terms': 'intron_variant',
+             'rsid': f'rs{pos}', 'maf': 'N/A'} for _, pos, _, _ in variants]
+
+
+def fake_maf(annotations, **kwargs):
+    for annotation in annotations:
+        annotation['maf'] = '0.01'
+    return annotations
+
+
+def write_vcf(path, positions):
+    path.write_text(HEADER + ''.join(
+        f'chr1\t{pos}\t.\tA\tG\t30\tPASS\tDP=10;RO=6;AO=4;AF=0.4\n' for pos in positions
+    ))
+    return str(path)
+
+
+def test_previous_output_skips_api_errors(tmp_path, mocker):
+    mocker.patch('annotator.get_variant_effects_batch',
+                 side_effect=lambda variants, **kwargs: fake_effects(variants[:1]) + [create_error_response()])
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=fake_maf)
+    previous_file = str(tmp_path / 'previous.tsv')
+    export_to_tsv(annotate_vcf(write_vcf(tmp_path / 'old.vcf', [100, 200])), previous_file)
+
+    previous = PreviousOutput(previous_file)
+
+    assert list(previous.results) == [('chr1', 100, 'A', 'G')]
+    assert previous.results[('chr1', 100, 'A', 'G')]['maf'] == '0.01'
+    assert previous.skipped_errors == 1
+
+
+def test_rerun_fetches_only_new_and_failed_variants(tmp_path, mocker):
+    mocker.patch('annotator.get_variant_effects_batch', side_effect=fake_effects)
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=fake_maf)
+    new_vcf = write_vcf(tmp_path / 'new.vcf', [100, 150, 200, 300])
+    expected = annotate_vcf(new_vcf)
+
+    previous_file = tmp_path / 'previous.tsv'
+    export_to_tsv(annotate_vcf(write_vcf(tmp_path / 'old.vcf', [100, 200, 300])), str(previous_file))
+    # Mark the row for position 300 as a failed lookup
+    previous_file.write_text(previous_file.read_text().replace('ENSG300\tGENE300', 'API_ERROR\tAPI_ERROR'))
+
+    effects = mocker.patch('annotator.get_variant_effects_batch', side_effect=fake_effects)
+    maf = mocker.patch('annotator.enrich_with_population_maf', side_effect=fake_maf)
+    previous = PreviousOutput(str(previous_file))
+    annotations = annotate_vcf(new_vcf, previous=previous)
+
+    assert [annotation.as_dict() for annotation in annotations] == [annotation.as_dict() for annotation in expected]
+    assert [v[1] for v in effects.call_args[0][0]] == [150, 300]
+    assert [a['position'] for a in maf.call_args[0][0]] == [150, 300]
+    assert (previous.reused, previous.fetched) == (2, 2)
+
+
+def test_previous_output_rejects_other_files(tmp_path):
+    vcf_file = write_vcf(tmp_path / 'input.vcf', [100])
+
+    with pytest.raises(ValueError, match='not an annotation TSV'):
+        PreviousOutput(vcf_file)
@@ -0,0 +1,45 @@
+from rate_limiter import RateLimiter, TokenBucket
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(10, 1.0)
+    bucket.tokens = 0
+    bucket.updated = 100.0
+    
+    bucket.refill(100.5)
+    assert bucket.tokens == 5
+    bucket.refill(200.0)
+    assert bucket.tokens == 10
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(4, 1.0)
+    bucket.tokens = 0.5
+    assert bucket.wait_time() == 0.125
+
+
+def test_rate_limiter_allows_burst_then_waits(mocker):
+    clock = {'now': 0.0}
+    mocker.patch('rate_limiter.time.monotonic', side_effect=lambda: clock['now'])
+    mock_sleep = mocker.patch('rate_limiter.time.sleep', side_effect=lambda s: clock.update(now=clock['now'] + s))
+    
+    limiter = RateLimiter([(2, 1.0)])
+    limiter.acquire()
+    limiter.acquire()
+    mock_sleep.assert_not_called()
+    
+    limiter.acquire()
+    mock_sleep.assert_called_once_with(0.5)
+
+
+def test_rate_limiter_enforces_every_limit(mocker):
+    clock = {'now': 0.0}
+    mocker.patch('rate_limiter.time.monotonic', side_effect=lambda: clock['now'])
+    mocker.patch('rate_limiter.time.sleep', side_effect=lambda s: clock.update(now=clock['now'] + s))
+    
+    # 10/s but only 3 per minute
+    limiter = RateLimiter([(10, 1.0), (3, 60.0)])
+    for _ in range(4):
+        limiter.acquire()
+    
+    assert clock['now'] >= 20.0
@@ -0,0 +1,37 @@
+import pickle
+
+import pytest
+
+from records import AnnotationRecord, VariantRecord
+
+
+def test_variant_record_dict_view():
+    record = VariantRecord('chr1', 100, 'rs1', 'A', 'T', '30', 'PASS', {'DP': 10})
+    
+    assert record['chrom'] == 'chr1' and record.pos == 100
+    assert record.get('missing', 'default') == 'default'
+    assert list(record.keys()) == ['chrom', 'pos', 'id', 'ref', 'alt', 'qual', 'filter', 'info']
+    assert record == record.as_dict()
+    assert record.as_dict() == record
+    with pytest.raises(KeyError):
+        record['missing']
+
+
+def test_annotation_record_defaults_and_updates():
+    record = AnnotationRecord(chromosome='chr1', rsid='rs1', maf='N/A')
+    record['maf'] = '0.1000'
+    
+    assert record.maf == '0.1000'
+    assert record.gene_id == ''
+    assert record.as_tuple()[list(AnnotationRecord.__slots__).index('rsid')] == 'rs1'
+    with pytest.raises(KeyError):
+        record['extra'] = 1
+    with pytest.raises(TypeError):
+        AnnotationRecord(extra=1)
+
+
+def test_records_have_no_instance_dict_and_pickle():
+    record = VariantRecord('chr1', 100, 'rs1', 'A', 'T', '30', 'PASS', {'DP': 10})
+    
+    assert not hasattr(record, '__dict__')
+    assert pickle.loads(pickle.dumps(record)) == record
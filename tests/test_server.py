@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+import requests
+import responses
+
+from server import AnnotationService, CoalescingCache, create_server
+from vep_cache import VEPCache
+from vep_client import fetch_maf_batch
+
+
+ENDPOINT = 'https://example.org/vep/human/hgvs'
+
+VCF = (
+    '##fileformat=VCFv4.2\n'
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+    'chr1\t100\trs123\tA\tT\t30\tPASS\tDP=100;RO=60;AO=40;AF=0.4\n'
+    'chr2\t200\t.\tG\tC\t40\tPASS\tDP=10;RO=5;AO=5;AF=0.5\n'
+)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = CoalescingCache(max_entries=2)
+    cache.put_many(ENDPOINT, {'a': {'gene_id': 'A'}, 'b': {'gene_id': 'B'}})
+    cache.get_many(ENDPOINT, ['a'])
+    cache.put_many(ENDPOINT, {'c': {'gene_id': 'C'}})
+
+    assert set(cache.get_many(ENDPOINT, ['a', 'c'])) == {'a', 'c'}
+    cache.release()
+    assert len(cache) == 2
+
+
+def test_concurrent_miss_waits_for_the_first_fetch():
+    cache = CoalescingCache()
+    assert cache.get_many(ENDPOINT, ['a', 'b']) == {}
+
+    results = {}
+    waiter = threading.Thread(target=lambda: results.update(cache.get_many(ENDPOINT, ['a', 'b'])))
+    waiter.start()
+    cache.put_many(ENDPOINT, {'a': {'gene_id': 'A'}})
+    # 'b' failed upstream, so releasing the claim lets the waiter fetch it itself
+    cache.release()
+    waiter.join(timeout=5)
+
+    assert results == {'a': {'gene_id': 'A'}}
+    assert cache.coalesced == 1
+
+
+def test_memory_cache_reads_and_writes_through_backing_cache(tmp_path):
+    backing = VEPCache(str(tmp_path))
+    backing.put_many(ENDPOINT, {'a': {'gene_id': 'A'}})
+    cache = CoalescingCache(backing=backing)
+
+    assert cache.get_many(ENDPOINT, ['a', 'b']) == {'a': {'gene_id': 'A'}}
+    cache.put_many(ENDPOINT, {'b': {'gene_id': 'B'}})
+    cache.close()
+
+    assert VEPCache(str(tmp_path)).get_many(ENDPOINT, ['b']) == {'b': {'gene_id': 'B'}}
+
+
+@responses.activate
+def test_failed_maf_lookups_are_not_cached_or_coalesced(tmp_path, mocker):
+    mocker.patch('vep_client.client.rate_limiter', None)
+    endpoint = 'https://grch37.rest.ensembl.org/variation/human'
+    responses.add(responses.POST, endpoint, status=400)
+    cache = CoalescingCache(backing=VEPCache(str(tmp_path)))
+
+    assert fetch_maf_batch(['rs1', 'rs2'], cache=cache) == {}
+
+    # A job waiting on the failed rsIDs gets no value once the claims are released
+    results = {}
+    waiter = threading.Thread(target=lambda: results.update(cache.get_many(endpoint, ['rs1', 'rs2'])))
+    waiter.start()
+    cache.release()
+    waiter.join(timeout=5)
+    cache.close()
+
+    assert results == {} and cache.coalesced == 0
+    assert VEPCache(str(tmp_path)).get_many(endpoint, ['rs1', 'rs2']) == {}
+
+
+@pytest.fixture
+def server_url(mocker):
+    mock_batch = mocker.patch('annotator.get_variant_effects_batch', side_effect=lambda variants, **kwargs: [
+        {'gene_id': 'ENSG1', 'gene_symbol': 'GENE1', 'consequence_terms': 'missense_variant', 'rsid': 'N/A', 'maf': 'N/A'}
+        for _ in variants
+    ])
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
+    service = AnnotationService(CoalescingCache())
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', mock_batch, service
+    server.shutdown()
+    server.server_close()
+
+
+def test_annotate_returns_tsv_and_shares_the_cache(server_url, tmp_path):
+    url, mock_batch, service = server_url
+
+    response = requests.post(f'{url}/annotate', data=VCF, headers={'Content-Type': 'text/plain'})
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0].startswith('depth\tvariant_reads')
+    assert len(lines) == 3
+    assert mock_batch.call_args.kwargs['cache'] is service.cache
+
+    vcf_file = tmp_path / 'job.vcf'
+    vcf_file.write_text(VCF)
+    response = requests.post(f'{url}/annotate', json={'vcf_path': str(vcf_file), 'limit': 1},
+                             headers={'Accept': 'application/json'})
+    assert [row['variant_id'] for row in response.json()['annotations']] == ['rs123']
+    assert requests.get(f'{url}/health').json()['jobs'] == 2
+
+
+def test_annotate_rejects_bad_requests(server_url):
+    url, _, _ = server_url
+
+    assert requests.post(f'{url}/annotate', json={'vcf_path': '/no/such.vcf'}).status_code == 400
+    assert requests.post(f'{url}/annotate', json={'vcf': VCF, 'regions': ['chr1:x-y']}).status_code == 400
+    assert requests.get(f'{url}/nothing').status_code == 404
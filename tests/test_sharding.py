@@ -0,0 +1,64 @@
+import pytest
+
+from annotator import annotate_vcf, export_to_tsv
+from sharding import export_shard_tsv, iter_shard_windows, merge_shard_tsvs, shard_of
+
+
+def fake_effects(variants, **kwargs):
+    return [{'gene_id': f'ENSG{pos}', 'gene_symbol': f'GENE{pos}', 'consequence_terms': 'intron_variant',
+             'rsid': 'N/A', 'maf': 'N/A'} for _, pos, _, _ in variants]
+
+
+@pytest.fixture
+def vcf_file(tmp_path, mocker):
+    mocker.patch('annotator.get_variant_effects_batch', side_effect=fake_effects)
+    mocker.patch('annotator.enrich_with_population_maf', side_effect=lambda x, **kwargs: x)
+    path = tmp_path / 'test.vcf'
+    path.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        + ''.join(f'chr{i % 3 + 1}\t{1000 + i * 250_000}\t.\tA\tG\t30\tPASS\tDP=10;RO=6;AO=4;AF=0.4\n' for i in range(40))
+    )
+    return str(path)
+
+
+def test_shard_of_is_deterministic_and_in_range():
+    variant = {'chrom': 'chr1', 'pos': 1_500_000, 'ref': 'A', 'alt': 'G'}
+
+    assert shard_of(variant, 4) == shard_of(dict(variant), 4)
+    assert 0 <= shard_of(variant, 4, 'region') < 4
+    # The region partition keeps a 1 Mb bin together and ignores the chr prefix
+    assert shard_of(variant, 4, 'region') == shard_of({**variant, 'chrom': '1', 'pos': 1_999_999, 'alt': 'T'}, 4, 'region')
+    with pytest.raises(ValueError):
+        shard_of(variant, 4, 'random')
+
+
+@pytest.mark.parametrize('partition', ['hash', 'region'])
+def test_shards_merge_back_to_unsharded_output(vcf_file, tmp_path, partition):
+    expected = tmp_path / 'expected.tsv'
+    export_to_tsv(annotate_vcf(vcf_file), str(expected))
+
+    shard_files = []
+    for index in range(3):
+        shard_file = str(tmp_path / f'shard-{index}.tsv')
+        export_shard_tsv(iter_shard_windows(vcf_file, 3, index, partition=partition, window=4), shard_file)
+        shard_files.append(shard_file)
+
+    merged = tmp_path / 'merged.tsv'
+    assert merge_shard_tsvs(list(reversed(shard_files)), str(merged)) == 40
+    assert merged.read_bytes() == expected.read_bytes()
+
+
+def test_merge_rejects_overlapping_shards(vcf_file, tmp_path):
+    shard_file = str(tmp_path / 'shard.tsv')
+    export_shard_tsv(iter_shard_windows(vcf_file, 1, 0), shard_file)
+
+    with pytest.raises(ValueError, match='more than one shard'):
+        merge_shard_tsvs([shard_file, shard_file], str(tmp_path / 'merged.tsv'))
+    with pytest.raises(ValueError, match='not a shard TSV'):
+        merge_shard_tsvs([vcf_file], str(tmp_path / 'merged.tsv'))
+
+
+def test_shard_index_out_of_range(vcf_file):
+    with pytest.raises(ValueError):
+        next(iter_shard_windows(vcf_file, 2, 2))
@@ -1,8 +1,22 @@
+import gzip
+
+import pytest
+
+from bgzf import bgzip_and_index
 from vcf_parser import (
+    LazyInfo,
+    READ_STAT_INFO_KEYS,
+    VCFReader,
+    find_info_value,
     parse_info,
     parse_variant_line,
     parse_header,
     parse_variants,
+    parse_variants_parallel,
+    split_byte_ranges,
+    parse_region,
+    read_bed_regions,
+    read_variants,
     calculate_read_statistics,
     determine_variant_type
 )
@@ -17,6 +31,32 @@ def test_parse_info():
     assert parse_info('GENE=BRCA2;DP=100')['GENE'] == 'BRCA2'
 
 
+def test_find_info_value():
+    info = 'MDP=5;DP=100;DB;AF=0.5,0.3'
+    assert find_info_value(info, 'DP') == '100'
+    assert find_info_value(info, 'DB') is True
+    assert find_info_value(info, 'AF') == '0.5,0.3'
+    assert find_info_value(info, 'AO') is None
+    assert find_info_value('DPB=3', 'DP') is None
+
+
+def test_parse_info_with_keys_is_lazy():
+    info = parse_info('ABP=3.1;DP=100;RO=40;AO=60;AF=0.5,0.3;TYPE=snp', READ_STAT_INFO_KEYS)
+    
+    assert isinstance(info, LazyInfo)
+    assert info['DP'] == 100 and info['AF'] == 0.5
+    assert info.get('MISSING') is None
+    assert info['TYPE'] == 'snp'
+    assert dict(info) == parse_info('ABP=3.1;DP=100;RO=40;AO=60;AF=0.5,0.3;TYPE=snp')
+
+
+def test_lazy_info_missing_required_key_does_not_parse_rest():
+    info = parse_info('ABP=3.1;DP=100', READ_STAT_INFO_KEYS)
+    
+    assert info.get('RO', 0) == 0
+    assert not info._complete
+
+
 def test_parse_variant_line_basic():
     line = 'chr1\t100\trs123\tA\tT\t30\tPASS\tDP=100;AF=0.5'
     samples = []
@@ -150,3 +190,139 @@ def test_determine_variant_type():
     assert determine_variant_type('AAA', '<A>') == "Structural variant"
     assert determine_variant_type('AAA', '[A]') == "CNV"
     assert determine_variant_type('AA', 'TT') == "Indel"
+
+
+def test_parse_gzipped_vcf(tmp_path):
+    vcf_file = tmp_path / "test.vcf.gz"
+    with gzip.open(vcf_file, 'wt') as f:
+        f.write(
+            '##fileformat=VCFv4.2\n'
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n'
+            'chr1\t100\trs1\tA\tT\t30\tPASS\tDP=100\n'
+        )
+    
+    header, samples = parse_header(str(vcf_file))
+    variants = list(parse_variants(str(vcf_file), samples))
+    
+    assert samples == ['S1']
+    assert variants[0]['id'] == 'rs1'
+
+
+def test_parse_region():
+    assert parse_region('chr1:1,000-2,000') == ('chr1', 1000, 2000)
+    assert parse_region('X')[:2] == ('X', 1)
+    with pytest.raises(ValueError):
+        parse_region('chr1:200-100')
+
+
+def test_read_bed_regions(tmp_path):
+    bed_file = tmp_path / "regions.bed"
+    bed_file.write_text('track name=test\nchr1\t99\t200\tgeneA\n2\t0\t10\n')
+    
+    assert read_bed_regions(str(bed_file)) == [('chr1', 100, 200), ('2', 1, 10)]
+
+
+def test_parse_variants_regions_with_and_without_index(tmp_path):
+    vcf_file = tmp_path / "test.vcf"
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        '1\t100\trs1\tACGT\tA\t30\tPASS\tDP=100\n'
+        '1\t200\trs2\tG\tC\t40\tPASS\tDP=200\n'
+        '2\t300\trs3\tT\tA\t50\tPASS\tDP=300\n'
+    )
+    regions = [('chr1', 102, 150), ('2', 1, 1000)]
+    indexed_file = str(tmp_path / "test.vcf.gz")
+    bgzip_and_index(str(vcf_file), indexed_file)
+    
+    scanned = [v['id'] for v in parse_variants(str(vcf_file), [], regions=regions)]
+    indexed = [v['id'] for v in parse_variants(indexed_file, [], regions=regions)]
+    
+    assert scanned == indexed == ['rs1', 'rs3']
+    assert list(parse_variants(indexed_file, [], regions=[])) == []
+
+
+def write_many_variants(vcf_file, count):
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        + ''.join(f'chr1\t{i}\trs{i}\tA\tT\t30\tPASS\tDP={i};AF=0.5\n' for i in range(1, count + 1))
+    )
+
+
+def test_split_byte_ranges_cover_data_section(tmp_path):
+    vcf_file = tmp_path / "test.vcf"
+    write_many_variants(vcf_file, 50)
+    
+    ranges = split_byte_ranges(str(vcf_file), chunk_size=100)
+    
+    assert ranges[0][0] == len('##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+    assert ranges[-1][1] == vcf_file.stat().st_size
+    assert all(prev[1] == cur[0] for prev, cur in zip(ranges, ranges[1:]))
+
+
+def test_parse_variants_parallel_matches_serial(tmp_path):
+    vcf_file = tmp_path / "test.vcf"
+    write_many_variants(vcf_file, 500)
+    
+    serial = list(parse_variants(str(vcf_file), []))
+    parallel = list(parse_variants_parallel(str(vcf_file), [], workers=2, chunk_size=97))
+    
+    assert parallel == serial
+    assert len(parallel) == 500
+    projected = parse_variants_parallel(str(vcf_file), [], workers=2, chunk_size=97, info_keys=READ_STAT_INFO_KEYS)
+    assert [calculate_read_statistics(v) for v in projected] == [calculate_read_statistics(v) for v in serial]
+
+
+def test_parse_variants_parallel_filters_regions(tmp_path):
+    vcf_file = tmp_path / "test.vcf"
+    write_many_variants(vcf_file, 100)
+    
+    variants = parse_variants_parallel(str(vcf_file), [], workers=2, chunk_size=200, regions=[('1', 10, 12)])
+    
+    assert [v['pos'] for v in variants] == [10, 11, 12]
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_vcf_reader_reads_header_and_records_in_one_pass(tmp_path, use_mmap):
+    vcf_file = tmp_path / "test.vcf"
+    vcf_file.write_text(
+        '##fileformat=VCFv4.2\n'
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n'
+        'chr1\t100\trs1\tA\tT\t30\tPASS\tDP=100;AF=0.5\tGT\t0/1\n'
+        'chr1\t200\trs2\tG\tC\t40\tPASS\tDP=200\r\n'
+    )
+    
+    with VCFReader(str(vcf_file), use_mmap=use_mmap) as reader:
+        assert reader.header == ['##fileformat=VCFv4.2', '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1']
+        assert reader.samples == ['S1']
+        variants = list(reader)
+    
+    assert [v['id'] for v in variants] == ['rs1', 'rs2']
+    assert variants[0]['info'] == {'DP': 100, 'AF': 0.5}
+    assert variants[1]['info'] == {'DP': 200}
+    assert variants == [parse_variant_line(line, ['S1']) for line in vcf_file.read_text().splitlines()[2:]]
+
+
+def test_vcf_reader_mmap_matches_buffered(tmp_path):
+    vcf_file = tmp_path / "test.vcf"
+    write_many_variants(vcf_file, 300)
+    regions = [('1', 10, 20)]
+    
+    with VCFReader(str(vcf_file), regions=regions, use_mmap=True) as mapped:
+        with VCFReader(str(vcf_file), regions=regions, buffer_size=64) as buffered:
+            assert list(mapped) == list(buffered)
+    assert len(list(read_variants(str(vcf_file), use_mmap=True))) == 300
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_vcf_reader_without_records(tmp_path, use_mmap):
+    empty_file = tmp_path / "empty.vcf"
+    empty_file.write_text('')
+    meta_only = tmp_path / "meta.vcf"
+    meta_only.write_text('##fileformat=VCFv4.2\n')
+    
+    with VCFReader(str(empty_file), use_mmap=use_mmap) as reader:
+        assert (reader.header, reader.samples, list(reader)) == ([], [], [])
+    with VCFReader(str(meta_only), use_mmap=use_mmap) as reader:
+        assert (reader.header, list(reader)) == (['##fileformat=VCFv4.2'], [])
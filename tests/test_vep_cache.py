@@ -0,0 +1,78 @@
+from vep_cache import NegativeCache, VEPCache
+
+
+ENDPOINT = 'https://grch37.rest.ensembl.org/vep/human/hgvs'
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = VEPCache(str(tmp_path))
+    cache.put_many(ENDPOINT, {'1:g.100G>A': {'gene_id': 'ENSG1', 'gene_symbol': 'TEST'}})
+    
+    result = cache.get_many(ENDPOINT, ['1:g.100G>A', '2:g.200C>T'])
+    
+    assert result == {'1:g.100G>A': {'gene_id': 'ENSG1', 'gene_symbol': 'TEST'}}
+
+
+def test_cache_persists_across_instances(tmp_path):
+    VEPCache(str(tmp_path)).put_many(ENDPOINT, {'1:g.100G>A': {'gene_id': 'ENSG1'}})
+    
+    assert VEPCache(str(tmp_path)).get_many(ENDPOINT, ['1:g.100G>A']) == {'1:g.100G>A': {'gene_id': 'ENSG1'}}
+
+
+def test_cache_keyed_by_endpoint_and_assembly(tmp_path):
+    VEPCache(str(tmp_path), assembly='GRCh37').put_many(ENDPOINT, {'1:g.100G>A': {'gene_id': 'ENSG1'}})
+    
+    assert VEPCache(str(tmp_path), assembly='GRCh38').get_many(ENDPOINT, ['1:g.100G>A']) == {}
+    assert VEPCache(str(tmp_path)).get_many('http://other/vep/human/hgvs', ['1:g.100G>A']) == {}
+
+
+def test_cache_ttl_expiry(tmp_path, mocker):
+    cache = VEPCache(str(tmp_path), ttl=60)
+    mock_time = mocker.patch('vep_cache.time.time', return_value=1000.0)
+    cache.put_many(ENDPOINT, {'1:g.100G>A': {'gene_id': 'ENSG1'}})
+    
+    mock_time.return_value = 1030.0
+    assert '1:g.100G>A' in cache.get_many(ENDPOINT, ['1:g.100G>A'])
+    mock_time.return_value = 1100.0
+    assert cache.get_many(ENDPOINT, ['1:g.100G>A']) == {}
+
+
+def test_cache_zero_ttl_expires_immediately(tmp_path, mocker):
+    cache = VEPCache(str(tmp_path), ttl=0)
+    mock_time = mocker.patch('vep_cache.time.time', return_value=1000.0)
+    cache.put_many(ENDPOINT, {'1:g.100G>A': {'gene_id': 'ENSG1'}})
+    
+    mock_time.return_value = 1000.5
+    assert cache.get_many(ENDPOINT, ['1:g.100G>A']) == {}
+    assert VEPCache(str(tmp_path), ttl=None).get_many(ENDPOINT, ['1:g.100G>A']) != {}
+
+
+def test_cache_lru_eviction(tmp_path, mocker):
+    cache = VEPCache(str(tmp_path), max_entries=2)
+    mock_time = mocker.patch('vep_cache.time.time', return_value=1000.0)
+    cache.put_many(ENDPOINT, {'a': {'v': 1}})
+    mock_time.return_value = 1001.0
+    cache.put_many(ENDPOINT, {'b': {'v': 2}})
+    
+    # Touch 'a' so 'b' becomes least recently used
+    mock_time.return_value = 1002.0
+    cache.get_many(ENDPOINT, ['a'])
+    mock_time.return_value = 1003.0
+    cache.put_many(ENDPOINT, {'c': {'v': 3}})
+    
+    assert len(cache) == 2
+    assert set(cache.get_many(ENDPOINT, ['a', 'b', 'c'])) == {'a', 'c'}
+
+
+def test_negative_cache_is_bounded_lru_with_ttl(mocker):
+    mock_time = mocker.patch('vep_cache.time.time', return_value=1000.0)
+    cache = NegativeCache(max_entries=2, ttl=60)
+    cache['a'] = {'gene_id': 'REF_MISMATCH'}
+    cache['b'] = {'gene_id': 'REF_MISMATCH'}
+    cache.get('a')
+    cache['c'] = {'gene_id': 'REF_MISMATCH'}
+    
+    assert len(cache) == 2 and cache.get('b') is None
+    assert cache.get('a') == {'gene_id': 'REF_MISMATCH'}
+    mock_time.return_value = 1100.0
+    assert cache.get('c') is None
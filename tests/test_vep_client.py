@@ -1,4 +1,5 @@
 import pytest
+import requests
 import responses
 from vep_client import (
     build_variant_region,
@@ -8,8 +9,13 @@ from vep_client import (
     parse_batch_vep_response,
     handle_vep_error,
     get_variant_effects,
-    get_variant_effects_batch
+    get_variant_effects_batch,
+    get_variant_effects_region_batch,
+    build_vcf_variant_string,
+    fetch_maf_batch,
+    enrich_with_population_maf
 )
+from vep_cache import NegativeCache
 
 
 def test_build_variant_region():
@@ -22,6 +28,30 @@ def test_build_hgvs_notation():
     assert build_hgvs_notation('2', 200, 'C', 'T') == '2:g.200C>T'
 
 
+def test_build_hgvs_notation_deletion():
+    assert build_hgvs_notation('1', 100, 'AT', 'A') == '1:g.101del'
+    assert build_hgvs_notation('1', 100, 'ATGC', 'A') == '1:g.101_103del'
+
+
+def test_build_hgvs_notation_insertion():
+    assert build_hgvs_notation('1', 100, 'A', 'AGC') == '1:g.100_101insGC'
+    assert build_hgvs_notation('1', 100, 'A', 'AA') == '1:g.100dup'
+    assert build_hgvs_notation('1', 100, 'AGC', 'AGCGC') == '1:g.101_102dup'
+
+
+def test_build_hgvs_notation_delins_and_mnv():
+    assert build_hgvs_notation('2', 200, 'ATTTT', 'GTTTC') == '2:g.200_204delinsGTTTC'
+    assert build_hgvs_notation('1', 100, 'AT', 'GC') == '1:g.100_101delinsGC'
+    assert build_hgvs_notation('1', 100, 'AT', 'GCA') == '1:g.100_101delinsGCA'
+    assert build_hgvs_notation('1', 100, 'ATG', 'ACG') == '1:g.101T>C'
+    assert build_hgvs_notation('1', 100, 'ATG', 'AC') == '1:g.101_102delinsC'
+
+
+def test_build_hgvs_notation_symbolic_alleles_unchanged():
+    assert build_hgvs_notation('1', 100, 'A', '<DEL>') == '1:g.100A><DEL>'
+    assert build_hgvs_notation('1', 100, 'A', 'T,G') == '1:g.100A>T,G'
+
+
 def test_create_error_response():
     result = create_error_response('API_ERROR')
     assert result['gene_id'] == 'API_ERROR'
@@ -105,8 +135,8 @@ def test_api_call_with_error_response():
 def test_api_call_with_network_error(mocker):
     import requests
     
-    mock_get = mocker.patch('requests.get')
-    mock_get.side_effect = requests.exceptions.RequestException('Network error')
+    mock_request = mocker.patch('vep_client.client.session.request')
+    mock_request.side_effect = requests.exceptions.RequestException('Network error')
     
     result = get_variant_effects('chr1', 100, 'G', 'A')
     assert result['gene_id'] == 'API_ERROR'
@@ -175,7 +205,7 @@ def test_get_variant_effects_batch_success():
 
 
 @responses.activate
-def test_get_variant_effects_batch_with_fallback(mocker):
+def test_get_variant_effects_batch_with_fallback():
     """Test batch API falls back to individual calls for failed variants"""
     # Batch response with one success and one error
     responses.add(
@@ -192,22 +222,26 @@ def test_get_variant_effects_batch_with_fallback(mocker):
                 'strand': 1
             }]
         }, {
-            'input': '2:g.200ATTTT>GTTTC',
+            'input': '2:g.200_204delinsGTTTC',
             'error': 'Unable to parse HGVS notation'
         }],
         status=200
     )
     
-    # Mock individual call for the failed variant
-    mock_get_individual = mocker.patch('vep_client.get_variant_effects')
-    mock_get_individual.return_value = {
-        'gene_id': 'ENSG00000002',
-        'gene_symbol': 'TEST2',
-        'biotype': 'protein_coding',
-        'consequence_terms': 'frameshift_variant',
-        'impact': 'HIGH',
-        'strand': 1
-    }
+    # Region fallback for the failed variant
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/region',
+        json=[{
+            'input': '2 200 . ATTTT GTTTC . . .',
+            'transcript_consequences': [{
+                'gene_id': 'ENSG00000002',
+                'gene_symbol': 'TEST2',
+                'consequence_terms': ['frameshift_variant']
+            }]
+        }],
+        status=200
+    )
     
     variants = [('chr1', 100, 'G', 'A'), ('chr2', 200, 'ATTTT', 'GTTTC')]
     results = get_variant_effects_batch(variants)
@@ -215,4 +249,330 @@ def test_get_variant_effects_batch_with_fallback(mocker):
     assert len(results) == 2
     assert results[0]['gene_symbol'] == 'TEST1'
     assert results[1]['gene_symbol'] == 'TEST2'  # From fallback
-    mock_get_individual.assert_called_once()
+    assert len(responses.calls) == 2
+    import json
+    assert json.loads(responses.calls[1].request.body) == {'variants': ['2 200 . ATTTT GTTTC . . .']}
+
+
+@responses.activate
+def test_get_variant_effects_batch_uses_cache(tmp_path):
+    """Test a rerun against a warm cache makes no API calls"""
+    from vep_cache import VEPCache
+    
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/hgvs',
+        json=[{
+            'input': '1:g.100G>A',
+            'transcript_consequences': [{
+                'gene_id': 'ENSG00000001',
+                'gene_symbol': 'TEST1',
+                'consequence_terms': ['missense_variant']
+            }]
+        }, {
+            'input': '2:g.200C>T',
+            'error': 'Unable to parse HGVS notation'
+        }],
+        status=200
+    )
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/region',
+        json={'error': 'Server error'},
+        status=500
+    )
+    
+    cache = VEPCache(str(tmp_path))
+    variants = [('chr1', 100, 'G', 'A'), ('chr2', 200, 'C', 'T')]
+    get_variant_effects_batch(variants, cache=cache)
+    calls_after_first_run = len(responses.calls)
+    
+    results = get_variant_effects_batch(variants[:1], cache=cache)
+    
+    assert results[0]['gene_symbol'] == 'TEST1'
+    assert len(responses.calls) == calls_after_first_run
+    # Errors are not cached
+    assert cache.get_many('https://grch37.rest.ensembl.org/vep/human/hgvs', ['2:g.200C>T']) == {}
+
+
+@responses.activate
+def test_get_variant_effects_batch_concurrent_preserves_order():
+    """Test concurrent batches return results in input order"""
+    def callback(request):
+        import json
+        notations = json.loads(request.body)['hgvs_notations']
+        return (200, {}, json.dumps([{
+            'input': hgvs,
+            'transcript_consequences': [{'gene_id': hgvs, 'gene_symbol': hgvs, 'consequence_terms': []}]
+        } for hgvs in notations]))
+    
+    responses.add_callback(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/hgvs', callback=callback)
+    
+    variants = [('chr1', 100 + i, 'G', 'A') for i in range(10)]
+    results = get_variant_effects_batch(variants, batch_size=3, workers=4)
+    
+    assert len(responses.calls) == 4
+    assert [r['gene_id'] for r in results] == [f'1:g.{100 + i}G>A' for i in range(10)]
+
+
+@responses.activate
+def test_fetch_maf_batch_posts_unique_rsids():
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/variation/human',
+        json={'rs1': {'MAF': 0.12345}, 'rs2': {'MAF': None}},
+        status=200
+    )
+    
+    mafs = fetch_maf_batch(['rs1', 'rs2', 'rs1', 'COSV1', 'N/A'])
+    
+    assert mafs == {'rs1': '0.1235', 'rs2': 'N/A'}
+    assert len(responses.calls) == 1
+    import json
+    assert json.loads(responses.calls[0].request.body) == {'ids': ['rs1', 'rs2']}
+
+
+@responses.activate
+def test_fetch_maf_batch_splits_failed_chunks():
+    import json
+    
+    def callback(request):
+        ids = json.loads(request.body)['ids']
+        if 'rs3' in ids and len(ids) > 1:
+            return (500, {}, json.dumps({'error': 'Server error'}))
+        if ids == ['rs3']:
+            return (400, {}, json.dumps({'error': 'Bad request'}))
+        return (200, {}, json.dumps({rsid: {'MAF': 0.5} for rsid in ids}))
+    
+    responses.add_callback(responses.POST, 'https://grch37.rest.ensembl.org/variation/human', callback=callback)
+    
+    mafs = fetch_maf_batch(['rs1', 'rs2', 'rs3', 'rs4'])
+    
+    # The rsID whose lookup failed is left out rather than reported as having no MAF
+    assert mafs == {'rs1': '0.5000', 'rs2': '0.5000', 'rs4': '0.5000'}
+
+
+@responses.activate
+def test_fetch_maf_batch_does_not_journal_failed_lookups(tmp_path):
+    from journal import Journal
+    
+    responses.add(responses.POST, 'https://grch37.rest.ensembl.org/variation/human', status=400)
+    path = str(tmp_path / 'out.tsv.journal')
+    journal = Journal(path)
+    
+    assert fetch_maf_batch(['rs1', 'rs2'], journal=journal) == {}
+    journal.close()
+    assert Journal(path, resume=True).maf == {}
+
+
+def test_enrich_with_population_maf_maps_back_to_annotations(mocker):
+    mock_batch = mocker.patch('vep_client.fetch_maf_batch', return_value={'rs1': '0.2000', 'rs2': 'N/A'})
+    annotations = [
+        {'rsid': 'rs1', 'maf': 'N/A'},
+        {'rsid': 'N/A', 'maf': 'N/A'},
+        {'rsid': 'rs2', 'maf': 'N/A'},
+        {'rsid': 'rs1', 'maf': 'N/A'},
+        {'rsid': 'rs3', 'maf': '0.0100'},
+    ]
+    
+    result = enrich_with_population_maf(annotations)
+    
+    mock_batch.assert_called_once_with(['rs1', 'rs2', 'rs1'], journal=None, cache=None)
+    assert [a['maf'] for a in result] == ['0.2000', 'N/A', 'N/A', '0.2000', '0.0100']
+
+
+def test_build_vcf_variant_string():
+    assert build_vcf_variant_string('chr1', 100, 'G', 'A') == '1 100 . G A . . .'
+
+
+@responses.activate
+def test_region_batch_splits_and_classifies_errors():
+    """Test a failing region request is bisected down to the offending variant"""
+    import json
+    
+    def callback(request):
+        inputs = json.loads(request.body)['variants']
+        if any(' 300 ' in v for v in inputs):
+            return (400, {}, json.dumps({'error': 'Input reference allele matches reference'}))
+        return (200, {}, json.dumps([{
+            'input': v,
+            'transcript_consequences': [{'gene_id': 'ENSG1', 'gene_symbol': 'G1', 'consequence_terms': []}]
+        } for v in inputs]))
+    
+    responses.add_callback(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/region', callback=callback)
+    
+    variants = [(0, '1', 100, 'A', 'T'), (1, '1', 200, 'C', 'G'), (2, '1', 300, 'G', 'G'), (3, '1', 400, 'T', 'A')]
+    results = get_variant_effects_region_batch(variants, workers=2)
+    
+    assert results[0]['gene_id'] == 'ENSG1'
+    assert results[1]['gene_id'] == 'ENSG1'
+    assert results[2]['gene_id'] == 'REF_MISMATCH'
+    assert results[3]['gene_id'] == 'ENSG1'
+
+
+@responses.activate
+def test_ref_mismatch_is_never_retried(mocker):
+    """Test deterministic fallback failures are negatively cached"""
+    mocker.patch('vep_client.negative_cache', NegativeCache())
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/hgvs',
+        json=[{'input': '1:g.100G>G', 'error': 'Reference allele matches'}],
+        status=200
+    )
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/region',
+        json={'error': 'Input reference allele matches reference'},
+        status=400
+    )
+    
+    first = get_variant_effects_batch([('chr1', 100, 'G', 'G')])
+    calls_after_first_run = len(responses.calls)
+    second = get_variant_effects_batch([('chr1', 100, 'G', 'G')])
+    
+    assert first[0]['gene_id'] == second[0]['gene_id'] == 'REF_MISMATCH'
+    assert calls_after_first_run == 2
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_get_variant_effects_batch_adaptive_sizing():
+    """Test batches are cut at the size recommended by the batch sizer"""
+    import json
+    from batch_sizing import AdaptiveBatchSizer
+    
+    def callback(request):
+        notations = json.loads(request.body)['hgvs_notations']
+        return (200, {}, json.dumps([{'input': hgvs, 'transcript_consequences': []} for hgvs in notations]))
+    
+    responses.add_callback(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/hgvs', callback=callback)
+    
+    sizer = AdaptiveBatchSizer(initial=2, min_size=1, max_size=10, increase_step=1)
+    variants = [('chr1', 100 + i, 'G', 'A') for i in range(9)]
+    results = get_variant_effects_batch(variants, workers=1, batch_sizer=sizer)
+    
+    sizes = [len(json.loads(call.request.body)['hgvs_notations']) for call in responses.calls]
+    assert sizes == [2, 3, 4]
+    assert len(results) == 9 and all(r['gene_id'] == 'N/A' for r in results)
+
+
+@responses.activate
+def test_timed_out_batch_is_not_retried_and_shrinks_batches(mocker):
+    """Test a batch timeout reaches the batch sizer at once instead of after the client's retries"""
+    from batch_sizing import AdaptiveBatchSizer
+    
+    mocker.patch('vep_client.client.rate_limiter', None)
+    responses.add(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/hgvs',
+                  body=requests.exceptions.ReadTimeout('slow'))
+    responses.add(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/region', json=[])
+    record = mocker.spy(AdaptiveBatchSizer, 'record')
+    
+    sizer = AdaptiveBatchSizer(initial=4, min_size=1)
+    results = get_variant_effects_batch([('chr1', 100, 'G', 'A')], workers=1, batch_sizer=sizer)
+    
+    assert results[0]['gene_id'] == 'API_ERROR'
+    assert [call.request.url for call in responses.calls].count('https://grch37.rest.ensembl.org/vep/human/hgvs') == 1
+    assert record.call_args.kwargs['timed_out'] is True
+    assert sizer.size < 4
+
+
+@responses.activate
+def test_get_variant_effects_batch_resumes_from_journal(tmp_path):
+    """Test journaled results are reused and new batches are journaled"""
+    import json
+    from journal import Journal
+    
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/hgvs',
+        json=[{'input': '2:g.200C>T', 'transcript_consequences': [
+            {'gene_id': 'ENSG2', 'gene_symbol': 'TEST2', 'consequence_terms': []}
+        ]}],
+        status=200
+    )
+    
+    path = str(tmp_path / 'out.tsv.journal')
+    journal = Journal(path)
+    journal.record_vep({'1:g.100G>A': {'gene_id': 'ENSG1', 'gene_symbol': 'TEST1'}})
+    journal.close()
+    
+    resumed = Journal(path, resume=True)
+    results = get_variant_effects_batch([('chr1', 100, 'G', 'A'), ('chr2', 200, 'C', 'T')], journal=resumed)
+    resumed.close()
+    
+    assert [r['gene_symbol'] for r in results] == ['TEST1', 'TEST2']
+    assert json.loads(responses.calls[0].request.body) == {'hgvs_notations': ['2:g.200C>T']}
+    assert set(Journal(path, resume=True).vep) == {'1:g.100G>A', '2:g.200C>T'}
+
+
+@responses.activate
+def test_get_variant_effects_batch_reports_cache_only_when_used(tmp_path, capsys):
+    from journal import Journal
+    
+    responses.add(responses.POST, 'https://grch37.rest.ensembl.org/vep/human/hgvs', json=[])
+    journal = Journal(str(tmp_path / 'out.tsv.journal'))
+    
+    get_variant_effects_batch([('chr1', 100, 'G', 'A')], journal=journal)
+    journal.close()
+    
+    assert 'Cache:' not in capsys.readouterr().err
+
+
+def test_fetch_maf_batch_skips_journaled_rsids(tmp_path, mocker):
+    from journal import Journal
+    
+    mock_chunk = mocker.patch('vep_client._fetch_maf_chunk', return_value={'rs2': '0.2000'})
+    path = str(tmp_path / 'out.tsv.journal')
+    journal = Journal(path)
+    journal.record_maf({'rs1': '0.1000'})
+    journal.close()
+    
+    resumed = Journal(path, resume=True)
+    mafs = fetch_maf_batch(['rs1', 'rs2'], journal=resumed)
+    resumed.close()
+    
+    assert mafs == {'rs1': '0.1000', 'rs2': '0.2000'}
+    mock_chunk.assert_called_once_with(['rs2'])
+    # Appended records are kept on disk, not in memory
+    assert resumed.maf == {'rs1': '0.1000'}
+    assert Journal(path, resume=True).maf == {'rs1': '0.1000', 'rs2': '0.2000'}
+
+
+def test_fetch_maf_batch_reuses_and_fills_cache(tmp_path, mocker):
+    from vep_cache import VEPCache
+    
+    mock_chunk = mocker.patch('vep_client._fetch_maf_chunk', return_value={'rs2': '0.2000'})
+    cache = VEPCache(str(tmp_path))
+    endpoint = 'https://grch37.rest.ensembl.org/variation/human'
+    cache.put_many(endpoint, {'rs1': '0.1000'})
+    
+    mafs = fetch_maf_batch(['rs1', 'rs2'], cache=cache)
+    
+    assert mafs == {'rs1': '0.1000', 'rs2': '0.2000'}
+    mock_chunk.assert_called_once_with(['rs2'])
+    assert cache.get_many(endpoint, ['rs2']) == {'rs2': '0.2000'}
+
+
+@responses.activate
+def test_get_variant_effects_batch_deduplicates_identical_variants():
+    """Test duplicate sites are queried once and fanned back out to every row"""
+    import json
+    
+    responses.add(
+        responses.POST,
+        'https://grch37.rest.ensembl.org/vep/human/hgvs',
+        json=[{'input': '1:g.100G>A', 'transcript_consequences': [
+            {'gene_id': 'ENSG1', 'gene_symbol': 'TEST1', 'consequence_terms': []}
+        ]}, {'input': '2:g.200C>T', 'transcript_consequences': [
+            {'gene_id': 'ENSG2', 'gene_symbol': 'TEST2', 'consequence_terms': []}
+        ]}],
+        status=200
+    )
+    
+    variants = [('chr1', 100, 'G', 'A'), ('chr2', 200, 'C', 'T'), ('1', 100, 'G', 'A'), ('chr1', 100, 'G', 'A')]
+    results = get_variant_effects_batch(variants)
+    
+    assert json.loads(responses.calls[0].request.body) == {'hgvs_notations': ['1:g.100G>A', '2:g.200C>T']}
+    assert [r['gene_symbol'] for r in results] == ['TEST1', 'TEST2', 'TEST1', 'TEST1']
+    assert results[0] is not results[2]
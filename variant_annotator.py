@@ -1,45 +1,418 @@
 #!/usr/bin/env python3
 import argparse
+import cProfile
+import pstats
+import sys
+from typing import Callable, Dict, List, Optional
 
-from annotator import annotate_vcf, export_to_tsv
+from annotator import DEFAULT_WINDOW, annotate_vcf, export_to_tsv, iter_annotation_windows, export_stream_to_tsv
+from journal import Journal, journal_path_for
+from local_engine import LocalEngine
+from maf_index import MafIndex
+from metrics import DEFAULT_WRITE_INTERVAL, PeriodicWriter, metrics
+from previous_output import PreviousOutput
+from batch_sizing import AdaptiveBatchSizer, DEFAULT_MIN_BATCH_SIZE, DEFAULT_MAX_BATCH_SIZE, DEFAULT_TARGET_LATENCY
+from server import DEFAULT_HOST, DEFAULT_MEMORY_ENTRIES, DEFAULT_PORT, AnnotationService, CoalescingCache, serve
+from sharding import PARTITIONS, export_shard_tsv, iter_shard_windows, merge_shard_tsvs
+from vep_cache import VEPCache, DEFAULT_CACHE_DIR, DEFAULT_TTL_DAYS
+from vep_client import ASSEMBLY
+from vcf_parser import parse_region, read_bed_regions
 
 
-def main():
-    """Main entry point for the variant annotator CLI."""
-    parser = argparse.ArgumentParser(
-        description="Annotate variants from a VCF file",
-        formatter_class=argparse.RawDescriptionHelpFormatter
-    )
-    
+# Functions listed in the --profile summary
+PROFILE_TOP_FUNCTIONS = 25
+
+
+def add_annotation_arguments(parser: argparse.ArgumentParser, default_output: Optional[str] = 'output.tsv') -> None:
+    """Options shared by a plain run and the shard subcommand."""
     parser.add_argument(
         'vcf_file',
-        help='Input VCF file path'
+        help='Input VCF file path (plain text, gzip or bgzip)'
     )
     parser.add_argument(
         '--output',
-        default='output.tsv',
-        help='Output TSV file path (default: output.tsv)'
+        default=default_output,
+        help=f'Output TSV file path (default: {default_output or "shard-<index>-of-<shards>.tsv"})'
     )
     parser.add_argument(
         '--limit',
         type=int,
         help='Limit number of variants to process (for testing)'
     )
+    parser.add_argument(
+        '--region',
+        action='append',
+        help='Only annotate variants overlapping chrom:start-end (repeatable); '
+             'uses the tabix index when the VCF is bgzipped and indexed'
+    )
+    parser.add_argument(
+        '--regions-bed',
+        help='Only annotate variants overlapping the regions in this BED file'
+    )
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=1,
+        help='Processes used to parse an uncompressed VCF in parallel byte ranges (default: 1)'
+    )
+    parser.add_argument(
+        '--mmap',
+        action='store_true',
+        help='Memory-map an uncompressed VCF instead of reading it through a buffer'
+    )
+    parser.add_argument(
+        '--window',
+        type=int,
+        help='Stream the VCF in windows of N variants, writing rows as each window completes'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Number of VEP batches to keep in flight concurrently (default: 4)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=200,
+        help='Variants per VEP batch request, or the starting size with --adaptive-batching (default: 200)'
+    )
+    parser.add_argument(
+        '--adaptive-batching',
+        action='store_true',
+        help='Grow or shrink the batch size based on observed latency, timeouts and error rate'
+    )
+    parser.add_argument(
+        '--min-batch-size',
+        type=int,
+        default=DEFAULT_MIN_BATCH_SIZE,
+        help=f'Lower bound for adaptive batch sizes (default: {DEFAULT_MIN_BATCH_SIZE})'
+    )
+    parser.add_argument(
+        '--max-batch-size',
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help=f'Upper bound for adaptive batch sizes (default: {DEFAULT_MAX_BATCH_SIZE})'
+    )
+    parser.add_argument(
+        '--target-latency',
+        type=float,
+        default=DEFAULT_TARGET_LATENCY,
+        help=f'Batch latency in seconds above which adaptive batches shrink (default: {DEFAULT_TARGET_LATENCY:.0f})'
+    )
+    parser.add_argument(
+        '--engine',
+        choices=['ensembl', 'local'],
+        default='ensembl',
+        help='Annotate genes and consequences via the Ensembl VEP API or offline from --gtf (default: ensembl)'
+    )
+    parser.add_argument(
+        '--gtf',
+        help='Ensembl GTF (plain or gzipped) for --engine local; its binary index is built on first use'
+    )
+    parser.add_argument(
+        '--gtf-index',
+        help='Path of the binary gene index (default: <gtf>.idx)'
+    )
+    parser.add_argument(
+        '--maf-source',
+        default='ensembl',
+        help='Where MAF comes from: "ensembl" (Variation API, default) or "local:PATH" for an index '
+             'built with maf_index.py'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume an interrupted run, skipping work recorded in the journal next to the output'
+    )
+    parser.add_argument(
+        '--previous',
+        help='Previous output TSV of this VCF; its rows are reused by chromosome, position, reference '
+             'and alternate, and only new variants and API_ERROR rows are fetched (may be the --output file)'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help=f'Directory for the persistent VEP annotation cache (default: {DEFAULT_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=DEFAULT_TTL_DAYS,
+        help=f'Days before cached annotations expire; must be positive, use --no-cache to disable '
+             f'caching (default: {DEFAULT_TTL_DAYS})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable the persistent VEP annotation cache'
+    )
+    parser.add_argument(
+        '--metrics-out',
+        help='Write stage timings, request and cache metrics here, periodically and at exit '
+             '(Prometheus textfile format for .prom paths, JSON otherwise)'
+    )
+    parser.add_argument(
+        '--metrics-interval',
+        type=float,
+        default=DEFAULT_WRITE_INTERVAL,
+        help=f'Seconds between --metrics-out writes during the run (default: {DEFAULT_WRITE_INTERVAL:.0f})'
+    )
+    parser.add_argument(
+        '--profile',
+        help='Profile the run with cProfile, saving stats to this path and printing the top functions'
+    )
+
+
+def run_annotation(parser: argparse.ArgumentParser, args: argparse.Namespace, annotate: Callable[[Dict], None]) -> None:
+    """Set up caches, engines, journal, metrics and profiling from args, then call annotate(options)."""
+    regions = None
+    if args.region or args.regions_bed:
+        try:
+            regions = [parse_region(region) for region in args.region or []]
+        except ValueError as e:
+            parser.error(str(e))
+        if args.regions_bed:
+            try:
+                regions.extend(read_bed_regions(args.regions_bed))
+            except (OSError, ValueError) as e:
+                parser.error(f'Cannot read --regions-bed: {e}')
+    
+    if args.engine == 'local' and not args.gtf:
+        parser.error('--engine local requires --gtf')
+    engine = LocalEngine.from_gtf(args.gtf, args.gtf_index) if args.engine == 'local' else None
+    
+    maf_index = None
+    if args.maf_source.startswith('local:'):
+        maf_index = MafIndex(args.maf_source[len('local:'):])
+    elif args.maf_source != 'ensembl':
+        parser.error(f'Invalid --maf-source: {args.maf_source}')
+    
+    previous = None
+    if args.previous:
+        try:
+            previous = PreviousOutput(args.previous)
+        except (OSError, ValueError) as e:
+            parser.error(f'Cannot use --previous: {e}')
+    
+    if args.cache_ttl <= 0:
+        parser.error('--cache-ttl must be positive; use --no-cache to disable caching')
+    cache = None
+    if not args.no_cache:
+        cache = VEPCache(args.cache_dir, ttl=args.cache_ttl * 86400, assembly=ASSEMBLY)
+    
+    batch_sizer = None
+    if args.adaptive_batching:
+        batch_sizer = AdaptiveBatchSizer(
+            initial=args.batch_size,
+            min_size=args.min_batch_size,
+            max_size=args.max_batch_size,
+            target_latency=args.target_latency
+        )
+    
+    # Completed batches are journaled next to the output so an interrupted run can resume
+    journal = Journal(journal_path_for(args.output), resume=args.resume)
+    if args.resume:
+        print(f"Resuming from {journal.path}: {len(journal.vep)} VEP results, "
+              f"{len(journal.maf)} MAF lookups already done", file=sys.stderr)
+    
+    options = {
+        'limit': args.limit,
+        'cache': cache,
+        'workers': args.workers,
+        'batch_size': args.batch_size,
+        'batch_sizer': batch_sizer,
+        'journal': journal,
+        'regions': regions,
+        'parse_workers': args.parse_workers,
+        'use_mmap': args.mmap,
+        'engine': engine,
+        'maf_index': maf_index,
+        'previous': previous
+    }
+    
+    metrics_writer = PeriodicWriter(metrics, args.metrics_out, args.metrics_interval).start() if args.metrics_out else None
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    
+    try:
+        annotate(options)
+    except KeyboardInterrupt:
+        journal.close()
+        print(f"\nInterrupted. Progress saved to {journal.path}; rerun with --resume to continue.", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile saved to {args.profile}; top functions by cumulative time:", file=sys.stderr)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        if cache is not None:
+            cache.close()
+        if maf_index is not None:
+            maf_index.close()
+    
+    journal.remove()
+    
+    if previous is not None:
+        print(f"Reused {previous.reused} rows from {previous.path}; fetched {previous.fetched}", file=sys.stderr)
+    print(f"Done! Output saved to {args.output}")
+
+
+def annotate_main(argv: List[str]) -> None:
+    """Annotate a whole VCF into one TSV."""
+    parser = argparse.ArgumentParser(
+        description="Annotate variants from a VCF file",
+        epilog="Subcommands: 'shard' annotates one slice of a VCF, 'merge' combines shard outputs, "
+               "'serve' runs a long-lived annotation server (see '%(prog)s <subcommand> --help')",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    add_annotation_arguments(parser)
+    args = parser.parse_args(argv)
     
-    args = parser.parse_args()
+    def annotate(options: Dict) -> None:
+        if args.window:
+            # Stream windows of annotations straight to the TSV
+            windows = iter_annotation_windows(args.vcf_file, window=args.window, **options)
+            export_stream_to_tsv(windows, args.output)
+        else:
+            # Annotate variants
+            annotations = annotate_vcf(args.vcf_file, **options)
+            
+            # Export to TSV
+            export_to_tsv(annotations, args.output)
     
-    # Annotate variants
-    annotations = annotate_vcf(
-        args.vcf_file,
-        limit=args.limit
+    run_annotation(parser, args, annotate)
+
+
+def shard_main(argv: List[str]) -> None:
+    """Annotate the variants of one shard into a shard TSV for merge."""
+    parser = argparse.ArgumentParser(
+        prog='variant_annotator.py shard',
+        description="Annotate one shard of a VCF's variants; run every index from 0 to N-1 "
+                    "(e.g. one per node) with the same input and filters, then merge the outputs"
     )
+    parser.add_argument('--shards', type=int, required=True, help='Total number of shards')
+    parser.add_argument('--index', type=int, required=True, help='Shard to annotate, from 0 to shards-1')
+    parser.add_argument(
+        '--partition',
+        choices=PARTITIONS,
+        default='hash',
+        help='Assign variants to shards by hash of their HGVS key or by 1 Mb genomic region (default: hash)'
+    )
+    add_annotation_arguments(parser, default_output=None)
+    args = parser.parse_args(argv)
+    if args.shards < 1 or not 0 <= args.index < args.shards:
+        parser.error('--index must be between 0 and --shards - 1')
+    args.output = args.output or f"shard-{args.index}-of-{args.shards}.tsv"
+    
+    def annotate(options: Dict) -> None:
+        windows = iter_shard_windows(
+            args.vcf_file,
+            args.shards,
+            args.index,
+            partition=args.partition,
+            window=args.window or DEFAULT_WINDOW,
+            **options
+        )
+        export_shard_tsv(windows, args.output)
     
-    # Export to TSV
-    export_to_tsv(annotations, args.output)
+    run_annotation(parser, args, annotate)
+
+
+def merge_main(argv: List[str]) -> None:
+    """Merge shard TSVs back into VCF order."""
+    parser = argparse.ArgumentParser(
+        prog='variant_annotator.py merge',
+        description='Merge the TSVs written by every shard into one TSV in original VCF order'
+    )
+    parser.add_argument('shard_files', nargs='+', help='Shard TSVs, in any order')
+    parser.add_argument('--output', default='output.tsv', help='Merged TSV file path (default: output.tsv)')
+    args = parser.parse_args(argv)
     
+    try:
+        merge_shard_tsvs(args.shard_files, args.output)
+    except ValueError as e:
+        parser.error(str(e))
     print(f"Done! Output saved to {args.output}")
 
 
+def serve_main(argv: List[str]) -> None:
+    """Serve annotation jobs over HTTP with caches kept warm between jobs."""
+    parser = argparse.ArgumentParser(
+        prog='variant_annotator.py serve',
+        description='Run a long-lived annotation server. POST a VCF (or JSON with "vcf_path") to /annotate; '
+                    'GET /health and /metrics report status'
+    )
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'TCP port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', help='Listen on this Unix socket instead of a TCP port')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Number of VEP batches each job keeps in flight concurrently (default: 4)'
+    )
+    parser.add_argument('--batch-size', type=int, default=200, help='Variants per VEP batch request (default: 200)')
+    parser.add_argument(
+        '--memory-cache-entries',
+        type=int,
+        default=DEFAULT_MEMORY_ENTRIES,
+        help=f'VEP and MAF results kept in memory between jobs (default: {DEFAULT_MEMORY_ENTRIES})'
+    )
+    parser.add_argument('--engine', choices=['ensembl', 'local'], default='ensembl',
+                        help='Annotate via the Ensembl VEP API or offline from --gtf (default: ensembl)')
+    parser.add_argument('--gtf', help='Ensembl GTF for --engine local')
+    parser.add_argument('--gtf-index', help='Path of the binary gene index (default: <gtf>.idx)')
+    parser.add_argument('--maf-source', default='ensembl',
+                        help='"ensembl" (Variation API, default) or "local:PATH" for a maf_index.py index')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f'Directory for the persistent VEP annotation cache behind the memory cache '
+                             f'(default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL_DAYS,
+                        help=f'Days before cached annotations expire; must be positive (default: {DEFAULT_TTL_DAYS})')
+    parser.add_argument('--no-cache', action='store_true', help='Keep results in memory only')
+    args = parser.parse_args(argv)
+    
+    if args.engine == 'local' and not args.gtf:
+        parser.error('--engine local requires --gtf')
+    engine = LocalEngine.from_gtf(args.gtf, args.gtf_index) if args.engine == 'local' else None
+    
+    maf_index = None
+    if args.maf_source.startswith('local:'):
+        maf_index = MafIndex(args.maf_source[len('local:'):])
+    elif args.maf_source != 'ensembl':
+        parser.error(f'Invalid --maf-source: {args.maf_source}')
+    
+    if args.cache_ttl <= 0:
+        parser.error('--cache-ttl must be positive; use --no-cache to keep results in memory only')
+    backing = None if args.no_cache else VEPCache(args.cache_dir, ttl=args.cache_ttl * 86400, assembly=ASSEMBLY)
+    cache = CoalescingCache(args.memory_cache_entries, backing=backing)
+    service = AnnotationService(cache, workers=args.workers, batch_size=args.batch_size, engine=engine, maf_index=maf_index)
+    try:
+        serve(service, host=args.host, port=args.port, socket_path=args.socket)
+    finally:
+        cache.close()
+        if maf_index is not None:
+            maf_index.close()
+
+
+def main():
+    """Main entry point for the variant annotator CLI."""
+    argv = sys.argv[1:]
+    if argv and argv[0] == 'shard':
+        shard_main(argv[1:])
+    elif argv and argv[0] == 'merge':
+        merge_main(argv[1:])
+    elif argv and argv[0] == 'serve':
+        serve_main(argv[1:])
+    else:
+        annotate_main(argv)
+
+
 if __name__ == '__main__':
     main()
 
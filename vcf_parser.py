@@ -1,74 +1,400 @@
-from typing import Dict, List, Iterator, Tuple
+import gzip
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Iterator, Optional, TextIO, Tuple
 
+from bgzf import has_tabix_index, tabix_fetch
+from records import VariantRecord
 
-def parse_info(info_str: str) -> Dict:
-    """Parse VCF INFO field string into a dictionary."""
+
+GZIP_MAGIC = b'\x1f\x8b'
+# End coordinate used for regions given as a bare chromosome name
+MAX_POSITION = 2 ** 29
+# Bytes of VCF text parsed per task by parse_variants_parallel
+DEFAULT_PARSE_CHUNK_BYTES = 4 * 1024 * 1024
+# Read buffer of VCFReader for uncompressed files
+DEFAULT_READ_BUFFER = 1024 * 1024
+
+
+# INFO keys used by calculate_read_statistics
+READ_STAT_INFO_KEYS = frozenset({'DP', 'RO', 'AO', 'AF'})
+
+
+def convert_info_value(value: str):
+    """Convert a raw INFO value, keeping only the first of comma-separated values."""
+    # Handle comma-separated values (take first value)
+    if ',' in value:
+        value = value.split(',')[0]
+    
+    # Try to convert to appropriate type
+    clean_value = value.replace('.', '').replace('-', '')
+    if clean_value.isdigit():
+        if '.' in value:
+            return float(value)
+        return int(value)
+    return value
+
+
+def find_info_value(info_str: str, key: str):
+    """Return the raw value of one INFO key, True for a flag, or None when absent."""
+    start = 0
+    while True:
+        i = info_str.find(key, start)
+        if i < 0:
+            return None
+        end = i + len(key)
+        if i == 0 or info_str[i - 1] == ';':
+            if end == len(info_str) or info_str[end] == ';':
+                return True
+            if info_str[end] == '=':
+                value_end = info_str.find(';', end)
+                return info_str[end + 1:] if value_end < 0 else info_str[end + 1:value_end]
+        start = end
+
+
+class LazyInfo(Mapping):
+    """Read-only INFO mapping that parses only the requested keys up front.
+    
+    The remaining keys stay in the raw INFO string and are parsed in full
+    the first time any other key is looked up or the mapping is iterated.
+    """
+    
+    __slots__ = ('raw', '_keys', '_values', '_complete')
+    
+    def __init__(self, raw: str, keys: Iterable[str]):
+        self.raw = raw
+        self._keys = frozenset(keys)
+        self._values = {}
+        for key in self._keys:
+            value = find_info_value(raw, key)
+            if value is True:
+                self._values[key] = True
+            elif value is not None:
+                self._values[key] = convert_info_value(value)
+        self._complete = False
+    
+    def __getitem__(self, key: str):
+        if key in self._values:
+            return self._values[key]
+        if key in self._keys:
+            raise KeyError(key)
+        return self._parse_all()[key]
+    
+    def __iter__(self):
+        return iter(self._parse_all())
+    
+    def __len__(self) -> int:
+        return len(self._parse_all())
+    
+    def __repr__(self) -> str:
+        return f"LazyInfo({self.raw!r})"
+    
+    def _parse_all(self) -> Dict:
+        if not self._complete:
+            self._values = parse_info(self.raw)
+            self._complete = True
+        return self._values
+
+
+def parse_info(info_str: str, keys: Optional[Iterable[str]] = None) -> Mapping:
+    """Parse VCF INFO field string into a dictionary.
+    
+    With `keys`, only those keys are extracted and converted; the result is a
+    LazyInfo that parses any other key on first access.
+    """
+    if keys is not None:
+        return LazyInfo(info_str, keys)
+    
     info_dict = {}
     for item in info_str.split(';'):
         if '=' in item:
             key, value = item.split('=', 1)
-            # Handle comma-separated values (take first value)
-            if ',' in value:
-                value = value.split(',')[0]
-            
-            # Try to convert to appropriate type
-            clean_value = value.replace('.', '').replace('-', '')
-            if clean_value.isdigit():
-                if '.' in value:
-                    info_dict[key] = float(value)
-                else:
-                    info_dict[key] = int(value)
-            else:
-                info_dict[key] = value
+            info_dict[key] = convert_info_value(value)
         else:
             info_dict[item] = True
     return info_dict
 
 
-def parse_variant_line(line: str, samples: List[str]) -> Dict:
-    """Parse a single VCF variant line into a dictionary."""
+def parse_variant_line(line: str, samples: List[str], info_keys: Optional[Iterable[str]] = None) -> VariantRecord:
+    """Parse a single VCF variant line into a VariantRecord.
+    
+    `info_keys` limits eager INFO parsing to those keys (see parse_info).
+    """
     fields = line.split('\t')
     
-    variant = {
-        'chrom': fields[0],
-        'pos': int(fields[1]),
-        'id': fields[2],
-        'ref': fields[3],
-        'alt': fields[4],
-        'qual': fields[5],
-        'filter': fields[6],
-        'info': parse_info(fields[7])
-    }
+    return VariantRecord(
+        fields[0],  # chrom
+        int(fields[1]),  # pos
+        fields[2],  # id
+        fields[3],  # ref
+        fields[4],  # alt
+        fields[5],  # qual
+        fields[6],  # filter
+        parse_info(fields[7], info_keys)
+    )
+
+
+def is_gzipped(vcf_file: str) -> bool:
+    """Whether the file is gzip or BGZF compressed."""
+    with open(vcf_file, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def open_vcf(vcf_file: str) -> TextIO:
+    """Open a plain, gzipped or BGZF-compressed VCF file for reading as text."""
+    if is_gzipped(vcf_file):
+        return gzip.open(vcf_file, 'rt')
+    return open(vcf_file, 'r')
+
+
+def normalize_chrom(chrom: str) -> str:
+    """Chromosome name without a 'chr' prefix, with chrM mapped to Ensembl's MT."""
+    chrom = chrom.removeprefix('chr')
+    return 'MT' if chrom == 'M' else chrom
+
+
+def parse_region(region: str) -> Tuple[str, int, int]:
+    """Parse a 'chrom:start-end' (or bare 'chrom') region into a 1-based inclusive interval."""
+    chrom, sep, span = region.rpartition(':')
+    if not sep:
+        return region, 1, MAX_POSITION
+    try:
+        start, _, end = span.replace(',', '').partition('-')
+        start = int(start)
+        end = int(end) if end else MAX_POSITION
+    except ValueError:
+        raise ValueError(f"Invalid region: {region}")
+    if not chrom or start < 1 or end < start:
+        raise ValueError(f"Invalid region: {region}")
+    return chrom, start, end
+
+
+def read_bed_regions(bed_file: str) -> List[Tuple[str, int, int]]:
+    """Read regions from a BED file, converting to 1-based inclusive intervals."""
+    regions = []
+    with open_vcf(bed_file) as f:
+        for line in f:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.split('\t')
+            regions.append((fields[0], int(fields[1]) + 1, int(fields[2])))
+    return regions
+
+
+def overlaps_regions(chrom: str, pos: int, ref: str, regions: List[Tuple[str, int, int]]) -> bool:
+    """Whether the variant's reference span overlaps any region.
     
-    return variant
+    Chromosome names match with or without a 'chr' prefix.
+    """
+    end = pos + len(ref) - 1
+    chrom = chrom.removeprefix('chr')
+    return any(
+        region_chrom.removeprefix('chr') == chrom and region_start <= end and pos <= region_end
+        for region_chrom, region_start, region_end in regions
+    )
+
+
+class VCFReader:
+    """Reads the header and then streams records in one pass over a binary VCF handle.
+    
+    Plain files are read through a large buffer, or memory-mapped with
+    `use_mmap`; gzip and BGZF files are decompressed as they are read. Each
+    record line is split only up to the INFO column, so FORMAT and sample
+    columns are never split or decoded, and only the eight fixed columns
+    are decoded to text.
+    """
+    
+    def __init__(
+        self,
+        vcf_file: str,
+        regions: Optional[List[Tuple[str, int, int]]] = None,
+        info_keys: Optional[Iterable[str]] = None,
+        use_mmap: bool = False,
+        buffer_size: int = DEFAULT_READ_BUFFER
+    ):
+        self.path = vcf_file
+        self.regions = regions
+        self.info_keys = info_keys
+        self.header: List[str] = []
+        self.samples: List[str] = []
+        self._map = None
+        if is_gzipped(vcf_file):
+            self._file = gzip.open(vcf_file, 'rb')
+        else:
+            self._file = open(vcf_file, 'rb', buffering=buffer_size)
+            if use_mmap and os.fstat(self._file.fileno()).st_size:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._source = self._map if self._map is not None else self._file
+        # First data line, read while looking for the end of the header
+        self._first_line = self._read_header()
+    
+    def _read_header(self) -> bytes:
+        readline = self._source.readline
+        while True:
+            line = readline()
+            if not line.startswith(b'#'):
+                return line
+            text = line.decode().strip()
+            self.header.append(text)
+            if text.startswith('#CHROM'):
+                # Header line with sample names
+                self.samples = text.split('\t')[9:]
+                return readline()
+    
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+    
+    def __enter__(self) -> 'VCFReader':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def __iter__(self) -> Iterator[VariantRecord]:
+        """Variant records in file order, filtered to `regions` when given."""
+        if self.regions is not None and has_tabix_index(self.path):
+            for line in tabix_fetch(self.path, self.regions):
+                yield parse_variant_line(line, self.samples, self.info_keys)
+            return
+        
+        regions, info_keys = self.regions, self.info_keys
+        line = self._first_line
+        readline = self._source.readline
+        while line:
+            if line[0] != 35:  # '#'
+                fields = line.split(b'\t', 8)
+                chrom, pos, ref = fields[0].decode(), int(fields[1]), fields[3].decode()
+                if regions is None or overlaps_regions(chrom, pos, ref, regions):
+                    info = fields[7] if len(fields) > 8 else fields[7].rstrip()
+                    yield VariantRecord(
+                        chrom, pos, fields[2].decode(), ref, fields[4].decode(),
+                        fields[5].decode(), fields[6].decode(), parse_info(info.decode(), info_keys)
+                    )
+            line = readline()
 
 
 def parse_header(vcf_file: str) -> Tuple[List[str], List[str]]:
     """Parse VCF file header and extract sample names."""
-    header = []
-    samples = []
+    with VCFReader(vcf_file) as reader:
+        return reader.header, reader.samples
+
+
+def read_variants(
+    vcf_file: str,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    info_keys: Optional[Iterable[str]] = None,
+    use_mmap: bool = False
+) -> Iterator[VariantRecord]:
+    """Stream variants from a VCF file in a single pass, closing it when exhausted."""
+    with VCFReader(vcf_file, regions=regions, info_keys=info_keys, use_mmap=use_mmap) as reader:
+        yield from reader
+
+
+def parse_variants(
+    vcf_file: str,
+    samples: List[str],
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    info_keys: Optional[Iterable[str]] = None
+) -> Iterator[VariantRecord]:
+    """Parse variants from a VCF file, optionally only those overlapping `regions`.
     
-    with open(vcf_file, 'r') as f:
+    Regions are 1-based inclusive (chrom, start, end) tuples. A bgzipped VCF
+    with a tabix index next to it is queried through the index; otherwise the
+    whole file is scanned and filtered.
+    """
+    return read_variants(vcf_file, regions=regions, info_keys=info_keys)
+
+
+def find_data_offset(vcf_file: str) -> int:
+    """Byte offset of the first data line (just past the header) in a plain-text VCF."""
+    offset = 0
+    with open(vcf_file, 'rb') as f:
         for line in f:
-            if line.startswith('##'):
-                header.append(line.strip())
-            elif line.startswith('#CHROM'):
-                # Header line with sample names
-                fields = line.strip().split('\t')
-                samples = fields[9:] if len(fields) > 9 else []
-                header.append(line.strip())
-                return header, samples
+            if not line.startswith(b'#'):
+                break
+            offset += len(line)
+    return offset
+
+
+def split_byte_ranges(vcf_file: str, chunk_size: int = DEFAULT_PARSE_CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """Split the data section of a plain-text VCF into byte ranges of about `chunk_size` bytes.
     
-    return header, samples
+    Ranges need not fall on line boundaries: a line belongs to the range
+    containing its first byte.
+    """
+    start = find_data_offset(vcf_file)
+    size = os.path.getsize(vcf_file)
+    return [(offset, min(offset + chunk_size, size)) for offset in range(start, size, chunk_size)]
 
 
-def parse_variants(vcf_file: str, samples: List[str]) -> Iterator[Dict]:
-    """Parse all variants from a VCF file."""
-    with open(vcf_file, 'r') as f:
-        # Skip header lines
-        for line in f:
-            if not line.startswith('#'):
-                yield parse_variant_line(line.strip(), samples)
+def _parse_byte_range(
+    vcf_file: str,
+    start: int,
+    end: int,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    info_keys: Optional[Iterable[str]] = None
+) -> List[Tuple]:
+    """Parse the lines starting within [start, end) into compact variant tuples."""
+    records = []
+    with open(vcf_file, 'rb') as f:
+        if start > 0:
+            # Skip the tail of a line that began in the previous range
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.startswith(b'#'):
+                continue
+            fields = line.split(b'\t', 8)
+            chrom, pos, ref = fields[0].decode(), int(fields[1]), fields[3].decode()
+            if regions is not None and not overlaps_regions(chrom, pos, ref, regions):
+                continue
+            info = fields[7] if len(fields) > 8 else fields[7].rstrip()
+            records.append((
+                chrom, pos, fields[2].decode(), ref, fields[4].decode(),
+                fields[5].decode(), fields[6].decode(), parse_info(info.decode(), info_keys)
+            ))
+    return records
+
+
+def parse_variants_parallel(
+    vcf_file: str,
+    samples: List[str],
+    workers: int = 2,
+    chunk_size: int = DEFAULT_PARSE_CHUNK_BYTES,
+    regions: Optional[List[Tuple[str, int, int]]] = None,
+    info_keys: Optional[Iterable[str]] = None
+) -> Iterator[VariantRecord]:
+    """Parse variants across a process pool, yielding them in file order.
+    
+    The file is split into newline-aligned byte ranges that are parsed in
+    worker processes and returned as compact tuples; at most two ranges per
+    worker are in flight so memory stays bounded. Compressed input falls
+    back to the serial parse_variants.
+    """
+    if workers <= 1 or is_gzipped(vcf_file):
+        yield from parse_variants(vcf_file, samples, regions=regions, info_keys=info_keys)
+        return
+    
+    ranges = deque(split_byte_ranges(vcf_file, chunk_size))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < workers * 2:
+                start, end = ranges.popleft()
+                pending.append(executor.submit(_parse_byte_range, vcf_file, start, end, regions, info_keys))
+            for record in pending.popleft().result():
+                yield VariantRecord(*record)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
 def calculate_read_statistics(variant: Dict) -> Dict:
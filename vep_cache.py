@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'variant-annotator')
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 1_000_000
+# Deterministic failures remembered in memory by NegativeCache
+DEFAULT_NEGATIVE_ENTRIES = 100_000
+CACHE_FILENAME = 'vep_cache.sqlite'
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+class VEPCache:
+    """Persistent SQLite cache of annotation results with TTL and LRU eviction.
+
+    Entries are keyed on (endpoint, assembly, key), where key is typically the
+    HGVS notation sent to the VEP batch endpoint. Entries older than `ttl`
+    seconds expire; a ttl of None keeps them until evicted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        ttl: Optional[float] = DEFAULT_TTL_DAYS * 86400,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        assembly: str = 'GRCh37'
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, CACHE_FILENAME)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.assembly = assembly
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' endpoint TEXT NOT NULL,'
+            ' assembly TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' accessed REAL NOT NULL,'
+            ' PRIMARY KEY (endpoint, assembly, key))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+        self._conn.commit()
+
+    def get_many(self, endpoint: str, keys: Iterable[str]) -> Dict[str, Dict]:
+        """Return cached values for the given keys, skipping misses and expired entries."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[i:i + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, value, created FROM entries'
+                    f' WHERE endpoint = ? AND assembly = ? AND key IN ({placeholders})',
+                    [endpoint, self.assembly, *chunk]
+                ).fetchall()
+                for key, value, created in rows:
+                    if self.ttl is not None and now - created > self.ttl:
+                        continue
+                    found[key] = json.loads(value)
+
+            if found:
+                self._touch(endpoint, list(found), now)
+                self._conn.commit()
+
+        return found
+
+    def put_many(self, endpoint: str, items: Dict[str, Dict]) -> None:
+        """Store values for the given keys, evicting least recently used entries if full."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(endpoint, self.assembly, key, json.dumps(value), now, now) for key, value in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries (endpoint, assembly, key, value, created, accessed)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._expire(now)
+            self._evict()
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _touch(self, endpoint: str, keys: List[str], now: float) -> None:
+        for i in range(0, len(keys), _QUERY_CHUNK):
+            chunk = keys[i:i + _QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            self._conn.execute(
+                f'UPDATE entries SET accessed = ?'
+                f' WHERE endpoint = ? AND assembly = ? AND key IN ({placeholders})',
+                [now, endpoint, self.assembly, *chunk]
+            )
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is not None:
+            self._conn.execute('DELETE FROM entries WHERE created < ?', (now - self.ttl,))
+
+    def _evict(self) -> None:
+        count = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM entries WHERE rowid IN'
+                ' (SELECT rowid FROM entries ORDER BY accessed ASC LIMIT ?)',
+                (excess,)
+            )
+
+
+class NegativeCache:
+    """In-memory LRU of deterministic failures (e.g. REF_MISMATCH) that are not worth retrying.
+
+    Bounded by `max_entries` and expiring after `ttl` seconds like VEPCache
+    entries, so a long-running server does not grow without limit.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_NEGATIVE_ENTRIES, ttl: Optional[float] = DEFAULT_TTL_DAYS * 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The stored failure for key, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,9 +1,32 @@
+import os
 import sys
 import requests
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
 
+from batch_sizing import AdaptiveBatchSizer
+from ensembl_client import EnsemblClient
+from journal import Journal
+from maf_index import MafIndex
+from metrics import (
+    CACHE_HITS, CACHE_MISSES, MAF_REQUESTS, MAF_RSIDS, VEP_BATCH_LATENCY, VEP_BATCH_SIZE, VEP_BATCHES,
+    VEP_FALLBACK_VARIANTS
+)
+from rate_limiter import RateLimiter, ENSEMBL_RATE_LIMITS
+from vep_cache import NegativeCache, VEPCache
 
-BASE_URL = "https://grch37.rest.ensembl.org"
+
+# Override with ENSEMBL_REST_URL to point at a mirror or a local mock server
+BASE_URL = os.environ.get('ENSEMBL_REST_URL', "https://grch37.rest.ensembl.org")
+ASSEMBLY = "GRCh37"
+NUCLEOTIDES = set('ACGTN')
+
+# Shared by every request to Ensembl so concurrent workers stay within the rate limits
+rate_limiter = RateLimiter(ENSEMBL_RATE_LIMITS)
+client = EnsemblClient(rate_limiter=rate_limiter)
+
+# HGVS notations with deterministic failures (e.g. REF_MISMATCH), not retried until they expire
+negative_cache = NegativeCache()
 
 
 def build_variant_region(chrom: str, pos: int, alt: str) -> str:
@@ -12,10 +35,49 @@ def build_variant_region(chrom: str, pos: int, alt: str) -> str:
     return f"{formatted_chrom}:{pos}-{pos}/{alt}"
 
 
+def is_sequence_allele(allele: str) -> bool:
+    """Check whether an allele is a plain nucleotide sequence (not symbolic or multi-allelic)."""
+    return bool(allele) and set(allele.upper()) <= NUCLEOTIDES
+
+
 def build_hgvs_notation(chrom: str, pos: int, ref: str, alt: str) -> str:
-    """Build HGVS notation string for VEP batch API."""
+    """Build HGVS notation string for VEP batch API.
+    
+    Substitutions use `pos ref>alt`. Indels and MNVs are left-trimmed of
+    shared anchor bases (then right-trimmed) and emitted as del, ins, dup
+    or delins so the batch endpoint can resolve them.
+    """
     formatted_chrom = chrom[3:] if chrom.startswith('chr') else chrom
-    return f"{formatted_chrom}:g.{pos}{ref}>{alt}"
+    if (len(ref) == len(alt) == 1) or not (is_sequence_allele(ref) and is_sequence_allele(alt)) or ref == alt:
+        return f"{formatted_chrom}:g.{pos}{ref}>{alt}"
+    
+    # Left-trim shared anchor bases, remembering them as context for dup detection
+    prefix_len = 0
+    while prefix_len < min(len(ref), len(alt)) and ref[prefix_len] == alt[prefix_len]:
+        prefix_len += 1
+    left_context = ref[:prefix_len]
+    start = pos + prefix_len
+    ref, alt = ref[prefix_len:], alt[prefix_len:]
+    
+    # Right-trim shared trailing bases
+    while ref and alt and ref[-1] == alt[-1]:
+        ref, alt = ref[:-1], alt[:-1]
+    
+    end = start + len(ref) - 1
+    span = f"{start}" if start == end else f"{start}_{end}"
+    
+    if len(ref) == len(alt) == 1:
+        return f"{formatted_chrom}:g.{start}{ref}>{alt}"
+    if not alt:
+        return f"{formatted_chrom}:g.{span}del"
+    if not ref:
+        # Insertion between start - 1 and start; a copy of the preceding bases is a duplication
+        if left_context.endswith(alt):
+            dup_start = start - len(alt)
+            dup_span = f"{dup_start}" if len(alt) == 1 else f"{dup_start}_{start - 1}"
+            return f"{formatted_chrom}:g.{dup_span}dup"
+        return f"{formatted_chrom}:g.{start - 1}_{start}ins{alt}"
+    return f"{formatted_chrom}:g.{span}delins{alt}"
 
 
 def create_error_response(error_type: str = 'API_ERROR') -> Dict:
@@ -86,12 +148,12 @@ def get_variant_effects(
     endpoint = f"{BASE_URL}/vep/human/region/{variant_region}"
     params = {
         "content-type": "application/json",
-        "assembly": "GRCh37"
+        "assembly": ASSEMBLY
     }
     headers = {"Content-Type": "application/json"}
     
     try:
-        response = requests.get(endpoint, headers=headers, params=params, timeout=10)
+        response = client.get(endpoint, headers=headers, params=params, timeout=10)
         data = response.json()
         
         if "error" in data:
@@ -104,91 +166,319 @@ def get_variant_effects(
         return create_error_response('API_ERROR')
 
 
+def is_cacheable_result(result: Dict) -> bool:
+    """Check whether an annotation result is a definitive answer worth caching.
+    
+    REF_MISMATCH is deterministic and is cached negatively so it is never retried.
+    """
+    return result.get('gene_id') != 'API_ERROR'
+
+
+def build_vcf_variant_string(chrom: str, pos: int, ref: str, alt: str) -> str:
+    """Build VCF-style variant string for the VEP region POST API."""
+    formatted_chrom = chrom[3:] if chrom.startswith('chr') else chrom
+    return f"{formatted_chrom} {pos} . {ref} {alt} . . ."
+
+
+def map_region_response(
+    chunk: List[Tuple[int, str, int, str, str]],
+    variant_strings: List[str],
+    data: list
+) -> Dict[int, Dict]:
+    """Map a VEP region POST response back to results keyed by variant index."""
+    input_to_entry = {entry.get('input', ''): entry for entry in data}
+    
+    results = {}
+    for (variant_idx, *_), variant_string in zip(chunk, variant_strings):
+        if variant_string in input_to_entry:
+            results[variant_idx] = parse_batch_vep_response(input_to_entry[variant_string])
+        else:
+            results[variant_idx] = create_error_response('API_ERROR')
+    return results
+
+
+def _fetch_region_chunk(chunk: List[Tuple[int, str, int, str, str]]) -> Dict[int, Dict]:
+    """Annotate a chunk of variants via the VEP region POST API, splitting the chunk on failure."""
+    endpoint = f"{BASE_URL}/vep/human/region"
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    variant_strings = [build_vcf_variant_string(chrom, pos, ref, alt) for _, chrom, pos, ref, alt in chunk]
+    
+    try:
+        response = client.post(endpoint, headers=headers, json={"variants": variant_strings}, timeout=60)
+        
+        if len(chunk) == 1 and response.status_code == 400:
+            try:
+                error_msg = response.json().get('error', '')
+            except ValueError:
+                error_msg = ''
+            variant_idx, chrom, pos, ref, alt = chunk[0]
+            return {variant_idx: handle_vep_error(error_msg, variant_strings[0], chrom, pos, ref, alt)}
+        
+        response.raise_for_status()
+        return map_region_response(chunk, variant_strings, response.json())
+        
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if len(chunk) == 1:
+            return {chunk[0][0]: create_error_response('API_ERROR')}
+        
+        mid = len(chunk) // 2
+        print(f"  Region request for {len(chunk)} variants failed ({e}), retrying as two halves...", file=sys.stderr)
+        return {**_fetch_region_chunk(chunk[:mid]), **_fetch_region_chunk(chunk[mid:])}
+
+
+def get_variant_effects_region_batch(
+    variants: List[Tuple[int, str, int, str, str]],
+    batch_size: int = 200,
+    workers: int = 1
+) -> Dict[int, Dict]:
+    """Annotate (index, chrom, pos, ref, alt) variants in bulk via the VEP region POST API.
+    
+    Up to `workers` chunks are kept in flight at once. Returns results keyed by index.
+    """
+    chunks = [variants[i:i + batch_size] for i in range(0, len(variants), batch_size)]
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for chunk_results in executor.map(_fetch_region_chunk, chunks):
+            results.update(chunk_results)
+    return results
+
+
+def map_batch_response(
+    batch_indices: List[int],
+    batch_hgvs: List[str],
+    batch_data: list
+) -> Tuple[Dict[int, Dict], List[int]]:
+    """Map a VEP batch response back to results keyed by variant index.
+    
+    Also returns the indices of variants that failed and need the region fallback.
+    """
+    # Create mapping from HGVS to results
+    hgvs_to_result = {}
+    for entry in batch_data:
+        input_hgvs = entry.get('input', '')
+        hgvs_to_result[input_hgvs] = entry
+    
+    results = {}
+    failed_variants = []
+    for variant_idx, hgvs in zip(batch_indices, batch_hgvs):
+        if hgvs in hgvs_to_result:
+            entry = hgvs_to_result[hgvs]
+            result = parse_batch_vep_response(entry)
+            results[variant_idx] = result
+            
+            # Check if this variant failed (API_ERROR response)
+            if result.get('gene_id') == 'API_ERROR':
+                failed_variants.append(variant_idx)
+        else:
+            results[variant_idx] = create_error_response('API_ERROR')
+            failed_variants.append(variant_idx)
+    
+    return results, failed_variants
+
+
+def _process_batch(
+    batch_idx: int,
+    total_batches: int,
+    batch_indices: List[int],
+    hgvs_list: List[str]
+) -> Tuple[Dict[int, Dict], List[int], float, bool]:
+    """Annotate one batch via the VEP batch API.
+    
+    Returns results keyed by variant index, the indices of variants that
+    failed and need the region fallback, the request latency in seconds and
+    whether the request timed out. A timed-out batch is not retried, so the
+    batch sizer hears about it at once, and the latency covers only the
+    final HTTP attempt, not rate-limit or backoff waits.
+    """
+    endpoint = f"{BASE_URL}/vep/human/hgvs"
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    batch_hgvs = [hgvs_list[i] for i in batch_indices]
+    data = {"hgvs_notations": batch_hgvs}
+    results = {}
+    failed_variants = []
+    timed_out = False
+    
+    try:
+        print(f"Batch {batch_idx}/{total_batches}: Processing {len(batch_hgvs)} variants...", file=sys.stderr)
+        
+        response = client.post(
+            endpoint,
+            headers=headers,
+            json=data,
+            timeout=120,
+            retry_timeouts=False
+        )
+        # Raise HTTPError for 4xx/5xx responses
+        response.raise_for_status()
+        
+        batch_data = response.json()
+        results, failed_variants = map_batch_response(batch_indices, batch_hgvs, batch_data)
+        
+        print(f"Batch {batch_idx}/{total_batches} completed", file=sys.stderr)
+        
+    except requests.exceptions.RequestException as e:
+        print(f"Error: Batch API request failed: {e}", file=sys.stderr)
+        timed_out = isinstance(e, requests.exceptions.Timeout)
+        # Return error responses for this batch
+        for variant_idx in batch_indices:
+            results[variant_idx] = create_error_response('API_ERROR')
+    
+    latency = client.last_attempt_seconds()
+    VEP_BATCHES.inc()
+    VEP_BATCH_LATENCY.observe(latency)
+    return results, failed_variants, latency, timed_out
+
+
+def group_variants_by_hgvs(
+    variants: List[Tuple[str, int, str, str]]
+) -> Tuple[List[str], Dict[str, List[int]]]:
+    """Group variant indices by HGVS notation.
+    
+    Returns the unique HGVS notations in first-seen order and a mapping from
+    each notation to the indices of every variant that shares it.
+    """
+    hgvs_to_variant_indices: Dict[str, List[int]] = {}
+    for idx, (chrom, pos, ref, alt) in enumerate(variants):
+        hgvs = build_hgvs_notation(chrom, pos, ref, alt)
+        hgvs_to_variant_indices.setdefault(hgvs, []).append(idx)
+    return list(hgvs_to_variant_indices), hgvs_to_variant_indices
+
+
+def fan_out_results(
+    unique_results: List[Dict],
+    hgvs_to_variant_indices: Dict[str, List[int]],
+    total: int
+) -> List[Dict]:
+    """Copy each unique result back to every variant index that shares its HGVS key."""
+    results: List[Optional[Dict]] = [None] * total
+    for result, indices in zip(unique_results, hgvs_to_variant_indices.values()):
+        results[indices[0]] = result
+        for idx in indices[1:]:
+            results[idx] = dict(result)
+    return results
+
+
 def get_variant_effects_batch(
     variants: List[Tuple[str, int, str, str]],
-    batch_size: int = 200
+    batch_size: int = 200,
+    cache: Optional[VEPCache] = None,
+    workers: int = 1,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    journal: Optional[Journal] = None
 ) -> List[Dict]:
-    """Get variant effects for multiple variants using VEP batch API."""
+    """Get variant effects for multiple variants using VEP batch API.
+    
+    Up to `workers` batches are kept in flight at once; results are returned
+    in input order regardless of completion order. Variants that fail in the
+    batch response are collected across batches and retried in bulk via the
+    region API. If `batch_sizer` is given, each batch is cut at the size it
+    currently recommends instead of `batch_size`, and it is fed the outcome
+    of every batch. Results already in `journal` are reused, and every
+    completed batch is appended to it.
+    """
     total = len(variants)
     if total == 0:
         return []
     
-    print(f"Processing {total} variants (batches of {batch_size})...", file=sys.stderr)
+    endpoint = f"{BASE_URL}/vep/human/hgvs"
     
-    all_results = []
+    # Collapse identical HGVS keys so each unique variant is queried once
+    hgvs_list, hgvs_to_variant_indices = group_variants_by_hgvs(variants)
+    unique_variants = [variants[indices[0]] for indices in hgvs_to_variant_indices.values()]
+    unique_total = len(hgvs_list)
+    if unique_total < total:
+        print(f"Deduplication: {total} variants -> {unique_total} unique HGVS keys "
+              f"({total - unique_total} lookups saved)", file=sys.stderr)
+    all_results: List[Optional[Dict]] = [None] * unique_total
     
-    # Build HGVS notation list and mapping
-    hgvs_list = []
-    hgvs_to_variant_idx = {}
-    for idx, (chrom, pos, ref, alt) in enumerate(variants):
-        hgvs = build_hgvs_notation(chrom, pos, ref, alt)
-        hgvs_list.append(hgvs)
-        hgvs_to_variant_idx[hgvs] = idx
-    
-    # Process in batches
-    total_batches = (total + batch_size - 1) // batch_size
-    for batch_num in range(0, total, batch_size):
-        batch_hgvs = hgvs_list[batch_num:batch_num + batch_size]
-        batch_idx = batch_num // batch_size + 1
+    # Serve what we can from the journal and caches so only misses reach the network
+    journaled = journal.vep if journal is not None else {}
+    cached = cache.get_many(endpoint, hgvs_list) if cache is not None else {}
+    pending = []
+    for idx, hgvs in enumerate(hgvs_list):
+        result = journaled.get(hgvs) or cached.get(hgvs) or negative_cache.get(hgvs)
+        if result is not None:
+            all_results[idx] = result
+        else:
+            pending.append(idx)
+    CACHE_HITS.inc(unique_total - len(pending))
+    CACHE_MISSES.inc(len(pending))
+    if cache is not None or journaled:
+        print(f"Cache: {unique_total - len(pending)} hits, {len(pending)} misses", file=sys.stderr)
+    
+    def store(results: Dict[int, Dict]) -> None:
+        completed = {hgvs_list[i]: result for i, result in results.items() if is_cacheable_result(result)}
+        if cache is not None:
+            cache.put_many(endpoint, completed)
+        if journal is not None:
+            journal.record_vep(completed)
+    
+    sizing = "adaptive batches" if batch_sizer is not None else f"batches of {batch_size}"
+    print(f"Processing {len(pending)} variants ({sizing}, {workers} workers)...", file=sys.stderr)
+    
+    # Cut batches as they are dispatched, keeping up to `workers` batches in flight
+    failed_variants = []
+    next_start = 0
+    batches_started = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def submit_next_batch():
+            nonlocal next_start, batches_started
+            size = batch_sizer.size if batch_sizer is not None else batch_size
+            VEP_BATCH_SIZE.set(size)
+            batch_indices = pending[next_start:next_start + size]
+            next_start += len(batch_indices)
+            batches_started += 1
+            total_batches = batches_started + (len(pending) - next_start + size - 1) // size
+            in_flight.add(executor.submit(
+                _process_batch, batches_started, total_batches, batch_indices, hgvs_list
+            ))
         
-        endpoint = f"{BASE_URL}/vep/human/hgvs"
-        headers = {"Content-Type": "application/json", "Accept": "application/json"}
-        data = {"hgvs_notations": batch_hgvs}
+        while next_start < len(pending) and len(in_flight) < max(1, workers):
+            submit_next_batch()
         
-        try:
-            print(f"Batch {batch_idx}/{total_batches}: Processing {len(batch_hgvs)} variants...", file=sys.stderr)
-            
-            response = requests.post(
-                endpoint,
-                headers=headers,
-                json=data,
-                timeout=120
-            )
-            # Raise HTTPError for 4xx/5xx responses
-            response.raise_for_status()
-            
-            batch_data = response.json()
-            
-            # Create mapping from HGVS to results
-            hgvs_to_result = {}
-            for entry in batch_data:
-                input_hgvs = entry.get('input', '')
-                hgvs_to_result[input_hgvs] = entry
-            
-            failed_variants = []
-            for i, hgvs in enumerate(batch_hgvs):
-                variant_idx = batch_num + i
-                chrom, pos, ref, alt = variants[variant_idx]
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                batch_results, batch_failed, latency, timed_out = future.result()
+                for variant_idx, result in batch_results.items():
+                    all_results[variant_idx] = result
+                failed_variants.extend(batch_failed)
                 
-                if hgvs in hgvs_to_result:
-                    entry = hgvs_to_result[hgvs]
-                    result = parse_batch_vep_response(entry)
-                    all_results.append(result)
-                    
-                    # Check if this variant failed (API_ERROR response)
-                    if result.get('gene_id') == 'API_ERROR':
-                        failed_variants.append((variant_idx, chrom, pos, ref, alt))
-                else:
-                    all_results.append(create_error_response('API_ERROR'))
-                    failed_variants.append((variant_idx, chrom, pos, ref, alt))
-            
-            # Fall back to single API calls for failed variants (complex variants)
-            if failed_variants:
-                print(f"  Falling back to individual calls for {len(failed_variants)} failed variants...", file=sys.stderr)
-                for variant_idx, chrom, pos, ref, alt in failed_variants:
-                    individual_result = get_variant_effects(chrom, pos, ref, alt)
-                    all_results[variant_idx] = individual_result
-            
-            print(f"Batch {batch_idx}/{total_batches} completed", file=sys.stderr)
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Error: Batch API request failed: {e}", file=sys.stderr)
-            # Return error responses for this batch
-            for hgvs in batch_hgvs:
-                all_results.append(create_error_response('API_ERROR'))
+                if batch_sizer is not None:
+                    errors = sum(1 for result in batch_results.values() if result.get('gene_id') == 'API_ERROR')
+                    batch_sizer.record(
+                        len(batch_results),
+                        latency,
+                        timed_out=timed_out,
+                        error_fraction=errors / len(batch_results)
+                    )
+                
+                failed = set(batch_failed)
+                store({i: result for i, result in batch_results.items() if i not in failed})
+                
+                if next_start < len(pending):
+                    submit_next_batch()
+    
+    # Fall back to the region API in bulk for failed variants (complex variants)
+    if failed_variants:
+        failed_variants.sort()
+        VEP_FALLBACK_VARIANTS.inc(len(failed_variants))
+        print(f"  Falling back to region API for {len(failed_variants)} failed variants...", file=sys.stderr)
+        fallback_results = get_variant_effects_region_batch(
+            [(idx, *unique_variants[idx]) for idx in failed_variants],
+            workers=workers
+        )
+        for variant_idx, result in fallback_results.items():
+            all_results[variant_idx] = result
+            if result.get('gene_id') == 'REF_MISMATCH':
+                negative_cache[hgvs_list[variant_idx]] = result
+        store(fallback_results)
     
-    print(f"Completed processing {len(all_results)}/{total} variants", file=sys.stderr)
-    return all_results
+    print(f"Completed processing {total}/{total} variants", file=sys.stderr)
+    print(f"Fallback path used for {len(failed_variants)}/{len(pending)} variants sent to the batch API", file=sys.stderr)
+    return fan_out_results(all_results, hgvs_to_variant_indices, total)
 
 
 def parse_batch_vep_response(entry: dict) -> Dict:
@@ -223,30 +513,123 @@ def parse_batch_vep_response(entry: dict) -> Dict:
     }
 
 
+def format_maf(data: Dict) -> str:
+    """Format the MAF from a Variation API record, or 'N/A' if absent."""
+    if 'MAF' in data and data['MAF'] is not None:
+        return f"{float(data['MAF']):.4f}"
+    
+    return 'N/A'
+
+
+def is_valid_rsid(rsid: Optional[str]) -> bool:
+    """Check whether an identifier can be looked up in the Variation API."""
+    return bool(rsid) and rsid != 'N/A' and rsid.startswith('rs')
+
+
 def fetch_maf_from_variation_api(rsid: str) -> str:
     """Fetch Minor Allele Frequency (MAF) from Ensembl Variation API."""
-    if rsid == 'N/A' or not rsid.startswith('rs'):
+    if not is_valid_rsid(rsid):
         return 'N/A'
     
     endpoint = f"{BASE_URL}/variation/human/{rsid}?pops=1"
     headers = {"Accept": "application/json"}
     
     try:
-        response = requests.get(endpoint, headers=headers, timeout=10)
+        response = client.get(endpoint, headers=headers, timeout=10)
         response.raise_for_status()
         data = response.json()
         
-        if 'MAF' in data and data['MAF'] is not None:
-            return f"{float(data['MAF']):.4f}"
-        
-        return 'N/A'
+        return format_maf(data)
         
     except Exception as e:
         return 'N/A'
 
 
-def enrich_with_population_maf(annotations: List[Dict]) -> List[Dict]:
-    """Enrich annotations with MAF data from Ensembl Variation API."""
+def _fetch_maf_chunk(rsids: List[str]) -> Dict[str, Optional[str]]:
+    """Fetch MAF for a chunk of rsIDs, splitting the chunk in half on failure.
+    
+    rsIDs whose lookup failed map to None, unlike 'N/A' for an rsID without MAF.
+    """
+    endpoint = f"{BASE_URL}/variation/human"
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    
+    MAF_REQUESTS.inc()
+    MAF_RSIDS.inc(len(rsids))
+    try:
+        response = client.post(endpoint, headers=headers, json={"ids": rsids}, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+        
+        return {rsid: format_maf(data.get(rsid) or {}) for rsid in rsids}
+        
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if len(rsids) == 1:
+            return {rsids[0]: None}
+        
+        mid = len(rsids) // 2
+        print(f"  Variation request for {len(rsids)} rsIDs failed ({e}), retrying as two halves...", file=sys.stderr)
+        return {**_fetch_maf_chunk(rsids[:mid]), **_fetch_maf_chunk(rsids[mid:])}
+
+
+def fetch_maf_batch(
+    rsids: List[str],
+    batch_size: int = 200,
+    journal: Optional[Journal] = None,
+    cache: Optional[VEPCache] = None
+) -> Dict[str, str]:
+    """Fetch MAF for many rsIDs using the Variation POST endpoint, batch_size IDs per request.
+    
+    rsIDs already in `journal` or `cache` are not fetched again, and each
+    completed chunk is appended to both. rsIDs whose lookup failed are
+    left out of the result and are not recorded, so a later run retries them.
+    """
+    endpoint = f"{BASE_URL}/variation/human"
+    journaled = journal.maf if journal is not None else {}
+    unique_rsids = [rsid for rsid in dict.fromkeys(rsids) if is_valid_rsid(rsid)]
+    
+    mafs = {rsid: journaled[rsid] for rsid in unique_rsids if rsid in journaled}
+    to_fetch = [rsid for rsid in unique_rsids if rsid not in journaled]
+    if cache is not None and to_fetch:
+        mafs.update(cache.get_many(endpoint, to_fetch))
+        to_fetch = [rsid for rsid in to_fetch if rsid not in mafs]
+    for start in range(0, len(to_fetch), batch_size):
+        chunk_mafs = {
+            rsid: maf for rsid, maf in _fetch_maf_chunk(to_fetch[start:start + batch_size]).items() if maf is not None
+        }
+        mafs.update(chunk_mafs)
+        if journal is not None:
+            journal.record_maf(chunk_mafs)
+        if cache is not None:
+            cache.put_many(endpoint, chunk_mafs)
+    
+    return mafs
+
+
+def enrich_with_population_maf(
+    annotations: List[Dict],
+    journal: Optional[Journal] = None,
+    maf_index: Optional[MafIndex] = None,
+    cache: Optional[VEPCache] = None
+) -> List[Dict]:
+    """Enrich annotations with MAF data from Ensembl Variation API.
+    
+    With a local MafIndex, MAF is looked up by allele (then rsID) for every
+    annotation, with no network calls. Otherwise rsIDs found in `cache` are
+    not fetched again.
+    """
+    if maf_index is not None:
+        found = 0
+        for annotation in annotations:
+            maf = maf_index.lookup(
+                annotation['chromosome'], annotation['position'],
+                annotation['reference'], annotation['alternate'], annotation.get('rsid')
+            )
+            if maf is not None:
+                annotation['maf'] = maf
+                found += 1
+        print(f"MAF found in {maf_index.path} for {found}/{len(annotations)} variants", file=sys.stderr)
+        return annotations
+    
     variants_with_rsid = [(i, ann) for i, ann in enumerate(annotations) 
                           if ann.get('rsid') and ann.get('rsid') != 'N/A']
     
@@ -255,13 +638,16 @@ def enrich_with_population_maf(annotations: List[Dict]) -> List[Dict]:
     
     print(f"\nFetching MAF from Variation API for {len(variants_with_rsid)} variants with rsIDs...", file=sys.stderr)
     
-    for idx, (ann_idx, ann) in enumerate(variants_with_rsid):
-        # Skip if MAF already populated
-        if ann.get('maf') != 'N/A':
-            continue
-        
-        rsid = ann['rsid']
-        maf = fetch_maf_from_variation_api(rsid)
+    # Skip if MAF already populated
+    to_fetch = [(ann_idx, ann['rsid']) for ann_idx, ann in variants_with_rsid if ann.get('maf') == 'N/A']
+    unique_rsids = len({rsid for _, rsid in to_fetch})
+    if unique_rsids < len(to_fetch):
+        print(f"Deduplication: {len(to_fetch)} MAF lookups -> {unique_rsids} unique rsIDs "
+              f"({len(to_fetch) - unique_rsids} lookups saved)", file=sys.stderr)
+    mafs = fetch_maf_batch([rsid for _, rsid in to_fetch], journal=journal, cache=cache)
+    
+    for ann_idx, rsid in to_fetch:
+        maf = mafs.get(rsid, 'N/A')
         
         if maf != 'N/A':
             annotations[ann_idx]['maf'] = maf